@@ -1,29 +1,315 @@
-from openai import OpenAI as gpt
-
-
-class OpenAI:
-    def __init__(self, api_key=""):
-        self.api_key = api_key
-        self.client = gpt(
-            api_key=api_key
-        )
-
-    def reword(self, text):
-        if self.api_key == "":
-            return text
-
-        message = (("You are a skilled chess player, reword the following sentence to make it sound more natural and "
-                    "chess-like, such that a chess player can understand why that move is the best. If the "
-                    "game is won say that probability is 100%, if the game is drawn or stalemate, say the chance in 0. ")
-                   + text)
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": message
-                }
-            ],
-            model="gpt-4",
-        )
-
-        return chat_completion.choices[0].message.content
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI as gpt
+
+from back.utils.metrics import MetricsRegistry
+from back.utils.timing import Timing
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAI:
+    """
+    Class used to reword explanations with a chat model
+    Rewordings are remembered by the hash of their text, and any failure falls back to the text itself
+
+    """
+
+    PROMPT = ("You are a skilled chess player, reword the following sentence to make it sound more natural and "
+              "chess-like, such that a chess player can understand why that move is the best. If the "
+              "game is won say that probability is 100%, if the game is drawn or stalemate, say the chance in 0. ")
+
+    BATCH_PROMPT = ("You are a skilled chess player, reword each of the following numbered sentences to make it sound "
+                    "more natural and chess-like, such that a chess player can understand the move it explains. If "
+                    "the game is won say that probability is 100%, if the game is drawn or stalemate, say the chance "
+                    "in 0. Answer only with a JSON array of strings, holding the reworded sentences in the same "
+                    "order.\n")
+
+    latency = MetricsRegistry.default.histogram("reword_request_seconds", "Duration of the rewording requests")
+
+    # clients shared by all the explainers, by api key, base url and model
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, api_key="", base_url=None, model="gpt-4", timeout=30.0, cache_size=1024, max_batch=20):
+        """
+        Constructor for OpenAI class
+        The HTTP client is created the first time a text is reworded. Rewording is opt-in: without an api key texts
+        are not reworded, use from_environment to take the key from the OPENAI_API_KEY environment variable
+
+        :param api_key: api key of the service. Default is none, texts are not reworded
+        :param base_url: url of the service, e.g. a local server for testing. Default is the OPENAI_BASE_URL
+                         environment variable, or the OpenAI api
+        :param model: chat model used for rewording
+        :param timeout: time limit in seconds of a request without a deadline
+        :param cache_size: maximum number of rewordings kept in memory
+        :param max_batch: maximum number of texts reworded by a single request
+        """
+
+        self.api_key = api_key or ""
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.max_batch = max_batch
+
+        self._client = None
+        self._executor = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, api_key="", base_url=None, model="gpt-4"):
+        """
+        Get the instance shared by every caller with the same settings, so its connections and rewordings are reused
+
+        :param api_key: api key of the service. Default is none, texts are not reworded
+        :param base_url: url of the service. Default is the OPENAI_BASE_URL environment variable, or the OpenAI api
+        :param model: chat model used for rewording
+        :return: OpenAI instance
+        """
+
+        key = (api_key or "", base_url, model)
+        with cls._shared_lock:
+            instance = cls._shared.get(key)
+            if instance is None:
+                instance = cls._shared[key] = cls(*key)
+            return instance
+
+    @classmethod
+    def from_environment(cls, base_url=None, model="gpt-4"):
+        """
+        Get the shared instance rewording with the api key of the OPENAI_API_KEY environment variable
+
+        :param base_url: url of the service. Default is the OPENAI_BASE_URL environment variable, or the OpenAI api
+        :param model: chat model used for rewording
+        :return: OpenAI instance, texts are not reworded if the variable is not set
+        """
+
+        return cls.shared(os.environ.get("OPENAI_API_KEY", ""), base_url, model)
+
+    @property
+    def enabled(self):
+        """
+        Check if texts can be reworded
+
+        :return: True if an api key is set, False otherwise
+        """
+
+        return self.api_key != ""
+
+    @property
+    def client(self):
+        """
+        Get the HTTP client, which keeps its connections open between requests
+
+        :return: openai.OpenAI instance
+        """
+
+        with self._lock:
+            if self._client is None:
+                self._client = gpt(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=1)
+            return self._client
+
+    def reword(self, text, deadline=None):
+        """
+        Reword a text
+
+        :param text: text to be reworded
+        :param deadline: time limit in seconds of the request. Default is the timeout of the instance
+        :return: reworded text, the text itself if it cannot be reworded in time
+        """
+
+        if not self.enabled:
+            return text
+
+        reworded = self._cached(text)
+        if reworded is not None:
+            return reworded
+
+        try:
+            reworded = self._complete(self.PROMPT + text, deadline)
+        except Exception as error:
+            logger.warning("Rewording failed: %s", error)
+            return text
+
+        if not reworded:
+            return text
+        self._remember(text, reworded)
+        return reworded
+
+    async def reword_async(self, text, deadline=None):
+        """
+        Reword a text without blocking the event loop
+        A request still running at the deadline is not cancelled, its rewording is remembered for the next call
+
+        :param text: text to be reworded
+        :param deadline: time to wait for the rewording, in seconds. Default is the timeout of the instance
+        :return: reworded text, the text itself if it cannot be reworded in time
+        """
+
+        if not self.enabled:
+            return text
+
+        reworded = self._cached(text)
+        if reworded is not None:
+            return reworded
+
+        # the request thread adds its spans to the timing report of the caller
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._worker(), contextvars.copy_context().run, self.reword, text)
+        with Timing.span("reword.wait"):
+            try:
+                return await asyncio.wait_for(future, deadline)
+            except asyncio.TimeoutError:
+                Timing.count("reword.deadline_missed")
+                return text
+
+    def reword_batch(self, texts, deadline=None):
+        """
+        Reword many texts with as few requests as possible, at most max_batch texts per request
+
+        :param texts: texts to be reworded
+        :param deadline: time limit in seconds of each request. Default is the timeout of the instance
+        :return: List of the reworded texts, in the order of the texts. A text that cannot be reworded is kept
+        """
+
+        texts = list(texts)
+        if not self.enabled:
+            return texts
+
+        reworded = {text: self._cached(text) for text in texts}
+        missing = [text for text, value in reworded.items() if value is None]
+
+        for start in range(0, len(missing), self.max_batch):
+            batch = missing[start:start + self.max_batch]
+            for text, value in zip(batch, self._reword_batch(batch, deadline)):
+                if value:
+                    self._remember(text, value)
+                    reworded[text] = value
+
+        return [reworded[text] or text for text in texts]
+
+    def _reword_batch(self, texts, deadline):
+        """
+        Reword texts with a single request
+
+        :param texts: texts to be reworded
+        :param deadline: time limit in seconds of the request
+        :return: List of the reworded texts, None for each text if the answer cannot be used
+        """
+
+        if len(texts) == 1:
+            reworded = self.reword(texts[0], deadline)
+            return [reworded if reworded != texts[0] else None]
+
+        message = self.BATCH_PROMPT + "\n".join(f"{index}. {text}" for index, text in enumerate(texts, 1))
+        try:
+            answer = self._complete(message, deadline)
+            # the array may be wrapped in a code block or in a sentence
+            reworded = json.loads(answer[answer.index("["):answer.rindex("]") + 1])
+        except Exception as error:
+            logger.warning("Rewording of %d texts failed: %s", len(texts), error)
+            return [None] * len(texts)
+
+        if not isinstance(reworded, list) or len(reworded) != len(texts):
+            return [None] * len(texts)
+        return [value if isinstance(value, str) and value else None for value in reworded]
+
+    def _complete(self, message, deadline):
+        """
+        Send a message to the chat model
+
+        :param message: content of the message
+        :param deadline: time limit in seconds of the request, None for the timeout of the instance
+        :return: answer of the model
+        """
+
+        client = self.client
+        if deadline is not None:
+            # a retry would not fit in the deadline
+            client = client.with_options(timeout=deadline, max_retries=0)
+
+        with Timing.span("reword.request", self.latency):
+            chat_completion = client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": message
+                    }
+                ],
+                model=self.model,
+            )
+
+        return chat_completion.choices[0].message.content
+
+    def _worker(self):
+        """
+        Get the threads running the requests of reword_async, so slow requests do not hold the default executor
+
+        :return: ThreadPoolExecutor instance
+        """
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="openai")
+            return self._executor
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    def _cached(self, text):
+        """
+        Get the remembered rewording of a text
+
+        :param text: text to be reworded
+        :return: reworded text, None if the text was not reworded yet
+        """
+
+        key = self._key(text)
+        with self._lock:
+            reworded = self._cache.get(key)
+            if reworded is not None:
+                self._cache.move_to_end(key)
+
+        if reworded is not None:
+            Timing.count("reword.cache_hit")
+        return reworded
+
+    def _remember(self, text, reworded):
+        """
+        Remember the rewording of a text, dropping the least recently used ones above the cache size
+
+        :param text: text that was reworded
+        :param reworded: reworded text
+        :return: None
+        """
+
+        with self._lock:
+            self._cache[self._key(text)] = reworded
+            self._cache.move_to_end(self._key(text))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def close(self):
+        """
+        Close the HTTP client and the request threads
+
+        :return: None
+        """
+
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
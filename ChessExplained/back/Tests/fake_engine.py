@@ -0,0 +1,61 @@
+"""
+UCI engine standing in for Stockfish in the tests
+It answers every search at once with depth 1. The score is the material balance for the side to move plus the most
+valuable piece it can capture, the best move is that capture, or the first legal move in UCI order without captures
+"""
+import sys
+
+import chess
+
+VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+
+def material(board):
+    return sum(VALUES[piece.piece_type] * (1 if piece.color == board.turn else -1)
+               for piece in board.piece_map().values())
+
+
+def search(board):
+    moves = sorted(board.legal_moves, key=chess.Move.uci)
+    captures = [move for move in moves if board.is_capture(move) and not board.is_en_passant(move)]
+    if not captures:
+        return material(board), moves[0]
+    best = max(captures, key=lambda move: VALUES[board.piece_type_at(move.to_square)])
+    return material(board) + VALUES[board.piece_type_at(best.to_square)], best
+
+
+def main():
+    board = chess.Board()
+
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+
+        command = tokens[0]
+        if command == "uci":
+            print("id name FakeEngine")
+            print("option name Threads type spin default 1 min 1 max 512")
+            print("option name Hash type spin default 16 min 1 max 33554432")
+            print("option name MultiPV type spin default 1 min 1 max 500")
+            print("uciok", flush=True)
+        elif command == "isready":
+            print("readyok", flush=True)
+        elif command == "position":
+            moves = tokens.index("moves") if "moves" in tokens else len(tokens)
+            board = chess.Board() if tokens[1] == "startpos" else chess.Board(" ".join(tokens[2:moves]))
+            for move in tokens[moves + 1:]:
+                board.push_uci(move)
+        elif command == "go":
+            if board.is_game_over():
+                print("bestmove (none)", flush=True)
+                continue
+            score, move = search(board)
+            print(f"info depth 1 seldepth 1 multipv 1 score cp {score} nodes 1 nps 1000 time 1 pv {move.uci()}")
+            print(f"bestmove {move.uci()}", flush=True)
+        elif command == "quit":
+            return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import chess
+import chess.engine
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.stockfish_tools.analysis_cache import AnalysisCache
+
+
+def info(depth, time=0.5, nodes=1000, move="e2e4"):
+    return {"score": chess.engine.PovScore(chess.engine.Cp(20), chess.WHITE), "pv": [chess.Move.from_uci(move)],
+            "depth": depth, "time": time, "nodes": nodes}
+
+
+@pytest.mark.parametrize("time_limit, depth, nodes, covered", [
+    (None, None, None, True),
+    (0.3, None, None, True),
+    (1.0, None, None, False),
+    (None, 8, None, True),
+    (None, 12, None, False),
+    (None, None, 2000, False),
+    # any limit the search reached is enough
+    (1.0, 8, None, True),
+])
+def test_covers(time_limit, depth, nodes, covered):
+    entry = AnalysisCache.entry(info(10))
+
+    assert AnalysisCache.covers(entry, time_limit, depth, nodes) is covered
+
+
+def test_put_never_replaces_a_deeper_search():
+    cache = AnalysisCache()
+    board = chess.Board()
+
+    cache.put(board, info(12, move="d2d4"))
+    assert cache.put(board, info(8))["best_move"] == chess.Move.from_uci("d2d4")
+    assert cache.get(board)["depth"] == 12
+
+    cache.put(board, info(14))
+    assert cache.get(board)["depth"] == 14
+    assert cache.get(board, depth=15) is None
+
+
+def test_positions_are_found_by_transposition():
+    cache = AnalysisCache()
+    cache.put(chess.Board(), info(10))
+
+    # the knights went out and back, the position is the same
+    board = chess.Board()
+    for move_san in ("Nf3", "Nf6", "Ng1", "Ng8"):
+        board.push_san(move_san)
+    assert cache.get(board)["depth"] == 10
+
+    # the same pieces without the castling rights are another position
+    assert cache.get(chess.Board(chess.STARTING_FEN.replace("KQkq", "-"))) is None
+
+
+def test_least_recently_used_positions_are_dropped():
+    cache = AnalysisCache(max_size=2)
+    boards = [chess.Board(), chess.Board(), chess.Board()]
+    boards[1].push_san("e4")
+    boards[2].push_san("d4")
+
+    cache.put(boards[0], info(10))
+    cache.put(boards[1], info(10))
+    cache.get(boards[0])
+    cache.put(boards[2], info(10))
+
+    assert len(cache) == 2
+    assert cache.get(boards[0]) is not None
+    assert cache.get(boards[1]) is None
@@ -0,0 +1,106 @@
+import os
+import shutil
+import sys
+
+import chess
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.detectors import MoveContext, TechniquesDetector
+from back.detectors.detector_registry import CHEAP, ENGINE
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+# engine used by the engine detectors, the tests needing it are skipped without one
+STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH") or shutil.which("stockfish")
+
+
+def fixture_board(*path):
+    """
+    Get the board of a fixture, the first FEN of the file
+
+    :param path: path of the fixture inside the Tests folder
+    :return: chess.Board
+    """
+
+    with open(os.path.join(TESTS, *path)) as file:
+        return chess.Board(file.readline().strip())
+
+
+def detect(board, move_san, max_tier=CHEAP, stockfish=None):
+    return TechniquesDetector(stockfish).detect(MoveContext(board, move_san), max_tier=max_tier)
+
+
+@pytest.mark.parametrize("path, move_san, pinned, defended, kind", [
+    (("pin", "absolute_pin"), "Re4", "Knight", "King", "absolute"),
+    (("pin", "pin_queen"), "Rhf1", "Queen", "King", "absolute"),
+    (("pin", "relative_pin"), "Bd4+", "Knight", "Rook", "relative"),
+])
+def test_pin(path, move_san, pinned, defended, kind):
+    pin = detect(fixture_board(*path), move_san)["pin"]
+
+    assert pin == {"enable": True, "type": kind, "pinned": pinned, "defended": defended}
+
+
+def test_pin_needs_a_sliding_piece():
+    # the king moves, nothing can be pinned
+    assert detect(fixture_board("pin", "absolute_pin"), "Kg1")["pin"] == {"enable": False}
+
+
+@pytest.mark.parametrize("path, move_san, moved, attacker", [
+    (("battery", "battery_rooks"), "Rff3", "Rook", "Rook"),
+    (("battery", "battery_bishop_queen"), "Bc1", "Bishop", "Queen"),
+    (("battery", "battery_bishop_queen"), "Qc1", "Queen", "Bishop"),
+])
+def test_battery(path, move_san, moved, attacker):
+    battery = detect(fixture_board(*path), move_san)["battery"]
+
+    assert battery == {"enable": True, "moved": moved, "attacker": attacker}
+
+
+def test_skewer_prefilter():
+    board = fixture_board("skewer")
+    detector = TechniquesDetector(None)
+
+    # the bishop attacks the queen with the rook behind it, the other bishop move attacks nothing behind
+    assert detector._can_skewer(MoveContext(board, "Bc4"))
+    assert not detector._can_skewer(MoveContext(board, "Bf3"))
+
+    # without the engine tier the skewer is reported as not used
+    assert detect(board, "Bc4")["skewer"] == {"enable": False}
+
+
+@pytest.mark.skipif(STOCKFISH_PATH is None, reason="no Stockfish engine, set STOCKFISH_PATH")
+def test_skewer():
+    from back.stockfish_tools import Stockfish
+
+    with Stockfish(STOCKFISH_PATH) as stockfish:
+        skewer = detect(fixture_board("skewer"), "Bc4", max_tier=ENGINE, stockfish=stockfish)["skewer"]
+
+    assert skewer == {"enable": True, "attacker": "Bishop", "attacked": "Queen", "captured": "Rook"}
+
+
+def test_more_forks():
+    board = fixture_board("forks", "more forks")
+
+    fork = detect(board, "Ne6+")["fork"]
+    assert fork["enable"]
+    assert set(fork["forked"]) == {"Bishop", "Rook", "Queen", "King"}
+
+    # the bishop attacks the rook and the king, but it is taken for free by Bxd4
+    assert not detect(board, "Bd4")["fork"]["enable"]
+
+
+def test_engine_detectors_only_run_when_no_cheap_technique_fired():
+    from back.stockfish_tools import ExplanationBuilder
+
+    board = chess.Board("rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2")
+
+    # the capture explains the move, neither the skewer nor the forced checkmate is searched
+    capture = detect(board, "exd5", max_tier=ENGINE)
+    builder = ExplanationBuilder(capture)
+    assert not builder.consult_engine and builder.any_technique()
+    assert "It captures the Pawn" in builder.build_explanation()
+    assert not capture.is_evaluated("skewer") and not capture.is_evaluated("forced_checkmate")
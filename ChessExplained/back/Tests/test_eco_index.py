@@ -0,0 +1,71 @@
+import mmap
+import os
+import sys
+
+import chess
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.detectors.eco_index import EcoIndex
+
+LINES = [
+    ("C40", "King's Knight Opening", ["e4", "e5", "Nf3"]),
+    ("C44", "King's Knight Opening: Normal Variation", ["e4", "e5", "Nf3", "Nc6"]),
+    ("C50", "Italian Game", ["e4", "e5", "Nf3", "Nc6", "Bc4"]),
+    # reaches the Italian Game by transposition, the first line names it
+    ("C50", "Transposed Italian", ["Nf3", "Nc6", "e4", "e5", "Bc4"]),
+]
+
+
+def board_after(*moves):
+    board = chess.Board()
+    for move_san in moves:
+        board.push_san(move_san)
+    return board
+
+
+def test_lookup():
+    index = EcoIndex(EcoIndex.build(LINES))
+
+    assert len(index) == 3
+    assert index.lookup(board_after("e4", "e5", "Nf3")) == {"eco": "C40", "name": "King's Knight Opening",
+                                                            "variation": ""}
+    assert index.lookup(board_after("e4", "e5", "Nf3", "Nc6")) == {"eco": "C44", "name": "King's Knight Opening",
+                                                                   "variation": "Normal Variation"}
+    assert index.lookup(board_after("Nf3", "Nc6", "e4", "e5", "Bc4"))["name"] == "Italian Game"
+    assert board_after("e4") not in index
+
+
+def test_empty_index():
+    index = EcoIndex(EcoIndex.build([]))
+
+    assert len(index) == 0
+    assert index.lookup(chess.Board()) is None
+
+
+def test_load_builds_the_index_once(tmp_path):
+    with open(tmp_path / "openings.tsv", "w", encoding="utf-8") as file:
+        file.write("eco\tname\tpgn\n")
+        for eco, name, moves in LINES:
+            file.write(f"{eco}\t{name}\t{' '.join(moves)}\n")
+
+    index = EcoIndex.load(str(tmp_path))
+    assert os.path.exists(tmp_path / "eco.idx")
+    assert isinstance(index._data, mmap.mmap)
+    assert index.lookup(board_after("e4", "e5", "Nf3"))["eco"] == "C40"
+    index.close()
+
+    # an index newer than the data is mapped again without being rebuilt
+    built = os.path.getmtime(tmp_path / "eco.idx")
+    index = EcoIndex.load(str(tmp_path))
+    assert os.path.getmtime(tmp_path / "eco.idx") == built
+    assert len(index) == 3
+    index.close()
+
+
+def test_move_numbers_are_skipped(tmp_path):
+    path = tmp_path / "openings.tsv"
+    path.write_text("eco\tname\tpgn\nC40\tKing's Knight Opening\t1. e4 e5 2. Nf3\n", encoding="utf-8")
+
+    assert list(EcoIndex.read_lines([str(path)])) == [("C40", "King's Knight Opening", ["e4", "e5", "Nf3"])]
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import chess.engine
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.stockfish_tools.engine_pool import EnginePool
+
+# UCI engine answering at once, started with the running interpreter
+FAKE_ENGINE = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_engine.py")]
+
+
+@pytest.fixture
+def pool():
+    pool = EnginePool(FAKE_ENGINE, size=2, timeout=5.0)
+    yield pool
+    pool.close()
+
+
+def test_engines_are_started_lazily_up_to_size(pool):
+    assert pool._engines == []
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    assert len(pool._engines) == 2
+
+    # released engines are leased again, the most recently released first
+    pool.release(first)
+    pool.release(second)
+    assert pool.acquire() is second
+    assert pool.acquire() is first
+    assert len(pool._engines) == 2
+
+
+def test_acquire_times_out_when_every_engine_is_leased(pool):
+    pool.acquire()
+    pool.acquire()
+
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.1)
+
+
+def test_lease_discards_a_terminated_engine(pool):
+    with pytest.raises(chess.engine.EngineTerminatedError):
+        with pool.lease() as engine:
+            raise chess.engine.EngineTerminatedError("engine crashed")
+
+    assert engine not in pool._engines
+
+    # a fresh engine takes its place
+    with pool.lease() as replacement:
+        assert replacement is not engine
+        assert replacement.ping() is None
+
+
+def test_release_with_check_replaces_a_dead_engine(pool):
+    engine = pool.acquire()
+    engine.quit()
+
+    pool.release(engine, check=True)
+    assert engine not in pool._engines
+
+    replacement = pool.acquire()
+    assert replacement is not engine
+    assert replacement.ping() is None
+
+
+def test_release_with_check_keeps_a_live_engine(pool):
+    engine = pool.acquire()
+
+    pool.release(engine, check=True)
+    assert pool.acquire() is engine
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.stockfish_tools import Stockfish
+from back.stockfish_tools.game_annotator import GameAnnotator
+
+# UCI engine scoring the material and the best capture, started with the running interpreter
+FAKE_ENGINE = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_engine.py")]
+
+GAME = "1. e4 d5 2. exd5 Qxd5 3. Nc3"
+
+
+@pytest.fixture
+def stockfish():
+    with Stockfish(FAKE_ENGINE, pool_size=2) as stockfish:
+        yield stockfish
+
+
+def summary(annotations):
+    return [(record["ply"], record["move"], record["loss"]) for record in annotations]
+
+
+def test_annotate(stockfish):
+    annotations = list(GameAnnotator(stockfish, limits=0.1).annotate(GAME))
+
+    # d5 leaves a pawn to be taken, taking it back with Qxd5 loses nothing, Nc3 leaves the queen out of reach
+    assert summary(annotations) == [(1, "e4", 0), (2, "d5", 100), (3, "exd5", 100), (4, "Qxd5", 0), (5, "Nc3", 100)]
+
+    # the position after the last move is searched for the loss of Nc3, but it has no move to annotate
+    boards, moves = GameAnnotator.replay(GAME)
+    assert len(boards) == len(moves) + 1 == len(annotations) + 1
+    assert annotations[-1]["fen"] == boards[-2].fen()
+    assert annotations[2]["best_move"] == "exd5"
+    assert annotations[2]["techniques"]["capture"] == {"enable": True, "captured": "Pawn", "exchange": 0}
+
+
+def test_annotate_parallel(stockfish):
+    annotator = GameAnnotator(stockfish, limits=0.1)
+    annotations = list(annotator.annotate(GAME, parallel=True))
+
+    assert summary(annotations) == summary(annotator.annotate(GAME))
+
+    # the workers run the deferred engine detectors, and each shard searched with a single engine
+    assert all(record["techniques"].is_evaluated(name) for record in annotations for name in record["techniques"])
+    assert len(stockfish.pool._engines) <= stockfish.pool.size
+
+
+def test_annotate_moves_in_san(stockfish):
+    annotations = list(GameAnnotator(stockfish, limits=0.1).annotate("e4 d5 exd5 Qxd5 Nc3", pgn=False))
+
+    assert summary(annotations) == [(1, "e4", 0), (2, "d5", 100), (3, "exd5", 100), (4, "Qxd5", 0), (5, "Nc3", 100)]
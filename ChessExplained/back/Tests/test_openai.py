@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.OpenAI import OpenAI
+from back.utils.timing import Timing
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Chat completions endpoint answering with the text prefixed by 'R:', or a JSON array for the batch prompt
+    A text holding 'SLOW' is answered after a second
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = body["messages"][0]["content"]
+        self.server.requests.append(content)
+
+        if "SLOW" in content:
+            time.sleep(1.0)
+
+        if content.startswith(OpenAI.BATCH_PROMPT):
+            lines = content[len(OpenAI.BATCH_PROMPT):].split("\n")
+            answer = "```json\n" + json.dumps(["R:" + line.split(". ", 1)[1] for line in lines]) + "\n```"
+        else:
+            answer = "R:" + content[len(OpenAI.PROMPT):]
+
+        data = json.dumps({"id": "stand-in", "object": "chat.completion", "created": 0, "model": body["model"],
+                           "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                                        "finish_reason": "stop"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def openai(server):
+    openai = OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    yield openai
+    openai.close()
+
+
+def test_rewording_is_opt_in(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "from-environment")
+
+    assert not OpenAI().enabled
+    assert not OpenAI.shared().enabled
+    assert OpenAI().reword("text") == "text"
+    assert OpenAI.from_environment().api_key == "from-environment"
+
+
+def test_reword_is_remembered(openai, server):
+    assert openai.reword("hello") == "R:hello"
+    assert openai.reword("hello") == "R:hello"
+    assert len(server.requests) == 1
+
+
+def test_reword_batch(openai, server):
+    reworded = openai.reword_batch(["a", "b", "a", "c"])
+
+    assert reworded == ["R:a", "R:b", "R:a", "R:c"]
+    assert len(server.requests) == 1
+
+
+def test_reword_async_deadline(openai, server):
+    async def reword():
+        with Timing.report("reword") as report:
+            late = await openai.reword_async("SLOW text", 0.2)
+            # the request goes on after the deadline and its answer is kept for the next call
+            await asyncio.sleep(1.2)
+            remembered = await openai.reword_async("SLOW text", 0.2)
+        return late, remembered, report
+
+    late, remembered, report = asyncio.run(reword())
+
+    assert late == "SLOW text"
+    assert remembered == "R:SLOW text"
+    assert len(server.requests) == 1
+    # the request thread reports its spans to the report of the caller
+    assert report.count("reword.request") == 1
+
+
+def test_unreachable_server_keeps_the_text():
+    openai = OpenAI(api_key="test", base_url="http://127.0.0.1:9/v1")
+
+    assert openai.reword("text", 0.5) == "text"
+    assert openai.reword_batch(["a", "b"], 0.5) == ["a", "b"]
+    openai.close()
@@ -0,0 +1,72 @@
+import os
+import random
+import sys
+
+import chess
+import chess.polyglot
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.detectors.opening_tracker import OpeningTracker
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_hash_matches_zobrist_hash(seed):
+    # random games go through captures, castlings, en passant captures and promotions
+    generator = random.Random(seed)
+    board = chess.Board()
+    tracker = OpeningTracker(board)
+
+    while not board.is_game_over() and len(board.move_stack) < 200:
+        tracker.push(generator.choice(list(board.legal_moves)))
+        assert tracker.hash() == chess.polyglot.zobrist_hash(board)
+
+    while board.move_stack:
+        tracker.pop()
+        assert tracker.hash() == chess.polyglot.zobrist_hash(board)
+
+
+@pytest.mark.parametrize("moves", [
+    ["e4", "a6", "e5", "d5", "exd6"],
+    ["e4", "e5", "Nf3", "Nc6", "Bc4", "Bc5", "O-O", "Nf6"],
+    ["d4", "d5", "Nc3", "Nc6", "Bf4", "Bf5", "Qd2", "Qd7", "O-O-O", "O-O-O"],
+    ["h4", "g5", "hxg5", "h6", "gxh6", "Nf6", "h7", "Rg8", "hxg8=N"],
+])
+def test_special_moves(moves):
+    board = chess.Board()
+    tracker = OpeningTracker(board)
+
+    for move_san in moves:
+        tracker.push(board.parse_san(move_san))
+        assert tracker.hash() == chess.polyglot.zobrist_hash(board)
+
+
+def test_moves_pushed_without_the_tracker():
+    board = chess.Board()
+    tracker = OpeningTracker(board)
+    tracker.push(board.parse_san("e4"))
+
+    board.push_san("e5")
+    assert tracker.hash() == chess.polyglot.zobrist_hash(board)
+    assert len(tracker) == 2
+
+
+def test_opening():
+    board = chess.Board()
+    tracker = OpeningTracker(board)
+    assert tracker.opening() is None and tracker.left_theory() is None
+
+    for move_san in ("e4", "e5", "Nf3", "Nc6", "Nc3", "Nf6"):
+        tracker.push(board.parse_san(move_san))
+    assert tracker.opening()["name"] == "Four Knights Game"
+    assert tracker.opening()["ply"] == 6
+    assert tracker.left_theory() is None
+
+    tracker.push(board.parse_san("a3"))
+    assert tracker.opening()["ply"] == 6
+    assert tracker.left_theory() == 7
+
+    tracker.pop()
+    assert tracker.left_theory() is None
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import chess
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.detectors.opening_tree import OpeningTree
+
+GAMES = [
+    "e4 e5 Nf3 1-0",
+    "e4 c5 0-1",
+    "e4 e5 1/2-1/2",
+    "d4 d5 *",
+    # won by the side giving mate
+    "f3 e5 g4 Qh4#",
+]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    source = tmp_path / "games.txt"
+    source.write_text("\n".join(GAMES) + "\n")
+
+    tree = OpeningTree.build(str(source), str(tmp_path / "tree.sqlite"))
+    yield tree
+    tree.close()
+
+
+def test_statistics(tree):
+    board = chess.Board()
+
+    assert tree.statistics(board, "e4") == {"move": "e4", "games": 3, "white": 1, "draws": 1, "black": 1,
+                                            "score": 0.5}
+    # games with an unknown result do not count in the score
+    assert tree.statistics(board, "d4")["score"] is None
+    assert tree.statistics(board, "c4") is None
+
+    board.push_san("e4")
+    # the score is for the player making the move
+    assert tree.statistics(board, "e5") == {"move": "e5", "games": 2, "white": 1, "draws": 1, "black": 0,
+                                            "score": 0.25}
+
+
+def test_a_checkmate_wins_the_game(tree):
+    board = chess.Board()
+    board.push_san("f3")
+
+    assert tree.statistics(board, "e5")["score"] == 1.0
+
+
+def test_continuations(tree):
+    continuations = tree.continuations(chess.Board())
+
+    assert [entry["move"] for entry in continuations] == ["e4", "d4", "f3"]
+    assert tree.metadata()["games"] == "5"
+
+
+def test_rare_continuations_are_left_out(tmp_path):
+    source = tmp_path / "games.txt"
+    source.write_text("\n".join(GAMES) + "\n")
+
+    tree = OpeningTree.build(str(source), str(tmp_path / "tree.sqlite"), min_games=2)
+    assert [entry["move"] for entry in tree.continuations(chess.Board())] == ["e4"]
+    assert tree.statistics(chess.Board(), "d4") is None
+    tree.close()
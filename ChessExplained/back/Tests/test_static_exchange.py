@@ -0,0 +1,36 @@
+import os
+import sys
+
+import chess
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.utils.static_exchange import StaticExchange
+
+
+@pytest.mark.parametrize("fen, move_san, gain", [
+    # a free knight
+    ("4k3/8/8/3n4/4P3/8/8/4K3 w - - 0 1", "exd5", 300),
+    # the queen takes a pawn defended by a pawn
+    ("4k3/4p3/3p4/8/8/8/8/3QK3 w - - 0 1", "Qxd6", -800),
+    # the rook behind the first one takes back, x-raying through it
+    ("3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1", "Rxd5", 100),
+    ("3rk3/8/8/3p4/8/8/8/3RK3 w - - 0 1", "Rxd5", -400),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "exd6", 100),
+    # a quiet move to a square only the king attacks, the king takes it
+    ("4k3/8/8/8/8/8/8/3QK3 w - - 0 1", "Qd7+", -900),
+    ("4k3/8/8/8/8/8/8/3QK3 w - - 0 1", "Qe2", 0),
+])
+def test_evaluate(fen, move_san, gain):
+    board = chess.Board(fen)
+
+    assert StaticExchange.evaluate(board, board.parse_san(move_san)) == gain
+
+
+def test_the_king_does_not_take_a_defended_piece():
+    # the bishop on g4 defends d7, the queen is safe there
+    board = chess.Board("4k3/8/8/8/6B1/8/8/3QK3 w - - 0 1")
+
+    assert StaticExchange.evaluate(board, board.parse_san("Qd7+")) == 0
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+
+import chess
+import chess.polyglot
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.stockfish_tools import Stockfish
+
+# UCI engine scoring the material and the best capture, started with the running interpreter
+FAKE_ENGINE = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_engine.py")]
+
+# white can take the pawn on d5
+CAPTURE_FEN = "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+
+
+@pytest.fixture
+def stockfish():
+    with Stockfish(FAKE_ENGINE) as stockfish:
+        yield stockfish
+
+
+def test_async_methods_take_the_arguments_of_the_blocking_ones(stockfish):
+    board = chess.Board(CAPTURE_FEN)
+
+    async def search():
+        try:
+            return await stockfish.best_move_async(0.1, board), await stockfish.analyse_async(0.1, board)
+        finally:
+            await stockfish.async_pool.close()
+
+    best_move, entry = asyncio.run(search())
+
+    assert best_move == stockfish.best_move(0.1, board) == "exd5"
+    assert entry["best_move"] == stockfish.analyse(0.1, board)["best_move"]
+
+
+def test_principal_variation_leases_an_engine_only_to_extend_the_line(stockfish):
+    board = chess.Board(CAPTURE_FEN)
+    assert stockfish.principal_variation(1, 0.1, board)["pv"] == ["exd5"]
+
+    # the only engine is leased elsewhere, the cached line is long enough and answers without it
+    engine = stockfish.pool.acquire()
+    stockfish.pool.acquire_timeout = 0.1
+    try:
+        assert stockfish.principal_variation(1, 0.1, board)["pv"] == ["exd5"]
+        with pytest.raises(TimeoutError):
+            stockfish.principal_variation(3, 0.1, board)
+    finally:
+        stockfish.pool.release(engine)
+
+    # the engine lines hold one move, the rest of the line is searched from the position it ends in
+    assert stockfish.principal_variation(3, 0.1, board)["pv"] == ["exd5", "Qxd5", "a3"]
+
+
+def test_board_edits_restart_the_opening(stockfish):
+    stockfish.move("e4")
+    stockfish.move("e5")
+
+    stockfish.remove_piece_at(chess.E5)
+    assert stockfish.openings.hash() == chess.polyglot.zobrist_hash(stockfish.board)
+    assert len(stockfish.openings) == 0
+
+    stockfish.add_piece_at(chess.Piece(chess.QUEEN, chess.BLACK), chess.D5)
+    assert stockfish.openings.hash() == chess.polyglot.zobrist_hash(stockfish.board)
+
+    stockfish.switch_turn()
+    assert stockfish.board.turn == chess.BLACK
+    assert stockfish.openings.hash() == chess.polyglot.zobrist_hash(stockfish.board)
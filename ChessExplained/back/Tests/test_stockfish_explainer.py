@@ -0,0 +1,42 @@
+import os
+import sys
+
+import chess
+import pytest
+
+# the tests run from any directory, the back package is two folders up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from back.stockfish_tools import Stockfish
+from back.stockfish_tools.stockfish_explainer import StockfishExplainer
+
+# UCI engine scoring the material and the best capture, started with the running interpreter
+FAKE_ENGINE = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_engine.py")]
+
+# white can take the pawn on d5
+CAPTURE_FEN = "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+
+
+@pytest.fixture
+def explainer():
+    with Stockfish(FAKE_ENGINE) as stockfish:
+        yield StockfishExplainer(stockfish)
+
+
+def test_explain_candidates_of_a_given_board(explainer):
+    board = chess.Board(CAPTURE_FEN)
+
+    candidates = explainer.explain_candidates(1, board=board)
+
+    assert [candidate["move"] for candidate in candidates] == ["exd5"]
+    assert "It captures the Pawn." in candidates[0]["explanation"]
+    # neither the given board nor the board of the Stockfish instance is changed
+    assert board.fen() == CAPTURE_FEN
+    assert explainer.stockfish.board.fen() == chess.STARTING_FEN
+
+
+def test_explain_a_given_board(explainer):
+    board, explanation = explainer.explain(board=chess.Board(CAPTURE_FEN))
+
+    assert board.fen() == CAPTURE_FEN
+    assert explanation.startswith("The best move is exd5. ")
@@ -1,4 +1,10 @@
+from back.detectors.detector_registry import DetectorRegistry, TechniqueResults
+from back.detectors.eco_index import EcoIndex
+from back.detectors.move_context import MoveContext
+from back.detectors.opening_tracker import OpeningTracker
+from back.detectors.opening_tree import OpeningTree
 from back.detectors.openings_detector import OpeningsDetector
 from back.detectors.techniques_detector import TechniquesDetector
 
-__all__ = ["OpeningsDetector", "TechniquesDetector"]
+__all__ = ["DetectorRegistry", "EcoIndex", "MoveContext", "OpeningTracker", "OpeningTree", "OpeningsDetector",
+           "TechniqueResults", "TechniquesDetector"]
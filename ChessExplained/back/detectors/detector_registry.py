@@ -0,0 +1,195 @@
+from collections.abc import Mapping
+
+from back.utils.metrics import MetricsRegistry
+from back.utils.timing import Timing
+
+# cost tiers of the detectors, cheaper tiers run first
+CHEAP = 0
+ENGINE = 1
+
+
+class Detector:
+    """
+    Class used to describe a registered technique detector
+
+    """
+
+    __slots__ = ("name", "function", "tier", "prefilter", "span", "latency", "prefiltered")
+
+    def __init__(self, name, function, tier=CHEAP, prefilter=None):
+        """
+        Constructor for Detector class
+
+        :param name: name of the technique, used as key of the results
+        :param function: function called with the detector instance and the MoveContext of the move
+        :param tier: cost tier, CHEAP for board inspection, ENGINE if the engine is searched
+        :param prefilter: function called with the detector instance and the MoveContext, returning False if the
+                          technique cannot happen. Default is always running the detector
+        """
+
+        self.name = name
+        self.function = function
+        self.tier = tier
+        self.prefilter = prefilter
+        self.span = f"detector.{name}"
+
+        metrics = MetricsRegistry.default
+        self.latency = metrics.histogram("detector_seconds", "Time spent detecting a technique, prefilter included",
+                                         ("detector",)).labels(name)
+        self.prefiltered = metrics.counter("detector_prefiltered_total",
+                                           "Detections skipped because the prefilter ruled the technique out",
+                                           ("detector",)).labels(name)
+
+    def detect(self, owner, context):
+        """
+        Run the detector on a move, skipping it if the prefilter rules the technique out
+
+        :param owner: instance the detector functions belong to
+        :param context: MoveContext of the move
+        :return: Dictionary with key 'enable' and the details of the technique
+        """
+
+        with Timing.span(self.span, self.latency):
+            if self.prefilter is not None and not self.prefilter(owner, context):
+                self.prefiltered.inc()
+                return dict({"enable": False})
+            return self.function(owner, context)
+
+    def __repr__(self):
+        return f"Detector({self.name}, tier={self.tier})"
+
+
+class DetectorRegistry:
+    """
+    Class used to keep the technique detectors, with their cost tiers and prefilters
+
+    """
+
+    def __init__(self):
+        """
+        Constructor for DetectorRegistry class
+        """
+
+        self._detectors = {}
+
+    def register(self, name, tier=CHEAP, prefilter=None):
+        """
+        Register a detector, used as decorator of the detector function
+
+        :param name: name of the technique
+        :param tier: cost tier of the detector
+        :param prefilter: function ruling the technique out before the detector runs
+        :return: decorator returning the function unchanged
+        """
+
+        def decorator(function):
+            if name in self._detectors:
+                raise ValueError(f"Detector already registered: {name}")
+            self._detectors[name] = Detector(name, function, tier, prefilter)
+            return function
+
+        return decorator
+
+    def names(self):
+        """
+        Get the names of the registered techniques
+
+        :return: List of names, in registration order
+        """
+
+        return list(self._detectors)
+
+    def select(self, names=None):
+        """
+        Get the detectors of some techniques
+
+        :param names: names of the techniques. Default is all the registered techniques
+        :return: List of Detector, in the requested order
+        """
+
+        if names is None:
+            return list(self._detectors.values())
+
+        unknown = [name for name in names if name not in self._detectors]
+        if unknown:
+            raise ValueError(f"Unknown techniques: {', '.join(unknown)}")
+        return [self._detectors[name] for name in names]
+
+
+class TechniqueResults(Mapping):
+    """
+    Class used to hold the techniques of a move
+    Cheap detectors run when the results are built, engine detectors run the first time their result is read
+
+    """
+
+    def __init__(self, owner, context, detectors, max_tier=ENGINE):
+        """
+        Constructor for TechniqueResults class
+
+        :param owner: instance the detector functions belong to
+        :param context: MoveContext of the move
+        :param detectors: List of Detector to be run
+        :param max_tier: most expensive tier that is run, the techniques of the tiers above are reported as not used.
+                         Default is every tier
+        """
+
+        self.owner = owner
+        self.context = context
+        self._detectors = {detector.name: detector for detector in detectors}
+        self._results = {}
+
+        for detector in sorted(detectors, key=lambda item: item.tier):
+            if detector.tier > max_tier:
+                self._results[detector.name] = dict({"enable": False})
+            elif detector.tier == CHEAP:
+                self._results[detector.name] = detector.detect(owner, context)
+
+    def is_evaluated(self, name):
+        """
+        Check if the detector of a technique already ran
+
+        :param name: name of the technique
+        :return: True if the result is known, False if it is still deferred
+        """
+
+        return name in self._results
+
+    def tier(self, name):
+        """
+        Get the cost tier of the detector of a technique
+
+        :param name: name of the technique
+        :return: CHEAP or ENGINE
+        """
+
+        return self._detectors[name].tier
+
+    def evaluate_all(self):
+        """
+        Run the deferred detectors now, e.g. in a worker thread before the results are handed to another thread
+
+        :return: the results, with every technique evaluated
+        """
+
+        for name, detector in self._detectors.items():
+            if name not in self._results:
+                self._results[name] = detector.detect(self.owner, self.context)
+        return self
+
+    def __getitem__(self, name):
+        if name not in self._results:
+            # raises KeyError for techniques that were not requested
+            detector = self._detectors[name]
+            self._results[name] = detector.detect(self.owner, self.context)
+        return self._results[name]
+
+    def __iter__(self):
+        return iter(self._detectors)
+
+    def __len__(self):
+        return len(self._detectors)
+
+    def __repr__(self):
+        results = {name: self._results.get(name, "<deferred>") for name in self._detectors}
+        return f"TechniqueResults({results})"
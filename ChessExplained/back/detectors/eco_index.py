@@ -0,0 +1,211 @@
+import glob
+import mmap
+import os
+import re
+import struct
+import threading
+
+import chess
+import chess.polyglot
+
+
+class EcoIndex:
+    """
+    Class used to look up the ECO classification of a position in a memory-mapped hash table
+
+    The index file holds a header, a table of slots (Zobrist hash, offset and length of the record) with linear
+    probing, and the records as UTF-8 text 'eco<TAB>name<TAB>variation'. A lookup reads one or a few slots and one
+    record, the table itself is never loaded into Python objects.
+
+    """
+
+    MAGIC = b"ECOIDX01"
+    # magic, number of slots, number of positions
+    HEADER = struct.Struct("<8sII")
+    # Zobrist hash, offset of the record, length of the record
+    SLOT = struct.Struct("<QII")
+    EMPTY = 0xFFFFFFFF
+
+    # move numbers of the PGN column, e.g. '1.' or '12...'
+    MOVE_NUMBER = re.compile(r"^\d+\.+$")
+
+    def __init__(self, data, file=None):
+        """
+        Constructor for EcoIndex class, use EcoIndex.open or EcoIndex.load instead
+
+        :param data: bytes or mmap holding the index
+        :param file: open file backing the mmap, closed with the index
+        """
+
+        magic, self.slot_count, self.position_count = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC:
+            raise ValueError("Not an ECO index")
+
+        self._data = data
+        self._file = file
+        self._mask = self.slot_count - 1
+
+    @classmethod
+    def open(cls, index_path):
+        """
+        Map an index file in memory
+
+        :param index_path: path of the index file
+        :return: EcoIndex instance
+        """
+
+        file = open(index_path, "rb")
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            file.close()
+            raise
+        return cls(data, file)
+
+    @classmethod
+    def load(cls, source_path, index_path=None):
+        """
+        Open the index of ECO data files, building it first if it is missing or older than the data files
+
+        :param source_path: TSV file, or directory of TSV files, with the columns 'eco', 'name' and 'pgn'
+        :param index_path: path of the index file. Default is 'eco.idx' next to the data files
+        :return: EcoIndex instance
+        """
+
+        sources = cls._sources(source_path)
+        if index_path is None:
+            directory = source_path if os.path.isdir(source_path) else os.path.dirname(source_path)
+            index_path = os.path.join(directory, "eco.idx")
+
+        newest = max((os.path.getmtime(path) for path in sources), default=0)
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= newest:
+            return cls.open(index_path)
+
+        data = cls.build(cls.read_lines(sources))
+        try:
+            # write to a temporary file first, so a reader never maps a partial index
+            temporary = f"{index_path}.{os.getpid()}.{threading.get_ident()}"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, index_path)
+        except OSError:
+            # a read-only installation keeps the index in memory
+            return cls(data)
+        return cls.open(index_path)
+
+    @staticmethod
+    def _sources(source_path):
+        if os.path.isdir(source_path):
+            return sorted(glob.glob(os.path.join(source_path, "*.tsv")))
+        return [source_path]
+
+    @classmethod
+    def read_lines(cls, sources):
+        """
+        Read the named lines of ECO data files
+
+        :param sources: paths of TSV files with the columns 'eco', 'name' and 'pgn'
+        :return: generator of tuples (eco, name, list of moves in SAN notation)
+        """
+
+        for path in sources:
+            with open(path, "r", encoding="utf-8") as file:
+                for number, line in enumerate(file):
+                    columns = line.rstrip("\n").split("\t")
+                    if len(columns) < 3 or (number == 0 and columns[0] == "eco"):
+                        continue
+                    moves = [token for token in columns[2].split() if not cls.MOVE_NUMBER.match(token)]
+                    yield columns[0], columns[1], moves
+
+    @classmethod
+    def build(cls, lines):
+        """
+        Build an index from named lines
+        When several lines reach the same position, the first one names it
+
+        :param lines: iterable of tuples (eco, name, list of moves in SAN notation)
+        :return: index as bytes
+        """
+
+        records = {}
+        for eco, name, moves in lines:
+            board = chess.Board()
+            for move_san in moves:
+                board.push_san(move_san)
+
+            key = chess.polyglot.zobrist_hash(board)
+            if key not in records:
+                family, _, variation = name.partition(": ")
+                records[key] = f"{eco}\t{family}\t{variation}".encode("utf-8")
+
+        # at most half of the slots are used, so probes stay short
+        slot_count = 1
+        while slot_count < 2 * len(records):
+            slot_count *= 2
+
+        slots = [(0, cls.EMPTY, 0)] * slot_count
+        strings = bytearray()
+        base = cls.HEADER.size + slot_count * cls.SLOT.size
+
+        for key, record in records.items():
+            index = key & (slot_count - 1)
+            while slots[index][1] != cls.EMPTY:
+                index = (index + 1) & (slot_count - 1)
+            slots[index] = (key, base + len(strings), len(record))
+            strings += record
+
+        data = bytearray(cls.HEADER.pack(cls.MAGIC, slot_count, len(records)))
+        for slot in slots:
+            data += cls.SLOT.pack(*slot)
+        return bytes(data + strings)
+
+    def lookup(self, board):
+        """
+        Get the ECO classification of a position
+
+        :param board: board of the position
+        :return: dictionary with keys 'eco', 'name' and 'variation' (empty if the line is the main one), None if the
+                 position is not in the index
+        """
+
+        return self.lookup_hash(chess.polyglot.zobrist_hash(board))
+
+    def lookup_hash(self, key):
+        """
+        Get the ECO classification of a position from its Zobrist hash
+
+        :param key: polyglot Zobrist hash of the position
+        :return: dictionary with keys 'eco', 'name' and 'variation', None if the position is not in the index
+        """
+
+        if not self.slot_count:
+            return None
+
+        index = key & self._mask
+        while True:
+            slot_key, offset, length = self.SLOT.unpack_from(self._data, self.HEADER.size + index * self.SLOT.size)
+            if offset == self.EMPTY:
+                return None
+            if slot_key == key:
+                eco, name, variation = bytes(self._data[offset:offset + length]).decode("utf-8").split("\t")
+                return {"eco": eco, "name": name, "variation": variation}
+            index = (index + 1) & self._mask
+
+    def __contains__(self, board):
+        return self.lookup(board) is not None
+
+    def __len__(self):
+        return self.position_count
+
+    def close(self):
+        """
+        Unmap the index
+
+        :return: None
+        """
+
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,110 @@
+import chess
+
+
+class MoveContext:
+    """
+    Class used to share the analysis of a candidate move between all the detectors
+    It is built once per move and cannot be changed afterwards
+
+    """
+
+    __slots__ = ("san", "move", "color", "board", "board_after", "piece", "captured", "is_capture",
+                 "is_en_passant", "is_castling", "is_check", "is_checkmate", "attacks_before", "attacks_after")
+
+    def __init__(self, board, move_san, attacks_before=None):
+        """
+        Constructor for MoveContext class
+
+        :param board: board before the move, it is copied so later changes do not affect the context
+        :param move_san: move in standard algebraic notation
+        :param attacks_before: squares attacked by each piece of the player to move, if they are already known
+        """
+
+        move = board.parse_san(move_san)
+        color = board.turn
+
+        # the engine and the game over checks need the moves since the last capture or pawn move to find
+        # repetitions, the earlier moves cannot repeat a position
+        history = board.halfmove_clock
+        board_before = board.copy(stack=history)
+        board_after = board.copy(stack=history)
+        board_after.push(move)
+
+        # the pawn taken en passant is not on the destination square
+        if board.is_en_passant(move):
+            captured = board.piece_at(move.to_square + (-8 if color == chess.WHITE else 8))
+        else:
+            captured = board.piece_at(move.to_square)
+
+        if attacks_before is None:
+            attacks_before = self._attack_map(board_before, color)
+
+        values = {
+            "san": move_san,
+            "move": move,
+            "color": color,
+            "board": board_before,
+            "board_after": board_after,
+            "piece": board.piece_at(move.from_square),
+            "captured": captured,
+            "is_capture": board.is_capture(move),
+            "is_en_passant": board.is_en_passant(move),
+            "is_castling": board.is_castling(move),
+            "is_check": board_after.is_check(),
+            "is_checkmate": board_after.is_checkmate(),
+            # squares attacked by each piece of the moving player, before and after the move
+            "attacks_before": attacks_before,
+            "attacks_after": self._attack_map(board_after, color),
+        }
+
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def for_moves(cls, board, moves_san):
+        """
+        Build the contexts of several moves of the same board, sharing the analysis of the board before the moves
+
+        :param board: board before the moves
+        :param moves_san: moves in standard algebraic notation
+        :return: List of MoveContext, in the order of the moves
+        """
+
+        attacks_before = cls._attack_map(board, board.turn)
+        return [cls(board, move_san, attacks_before) for move_san in moves_san]
+
+    @staticmethod
+    def _attack_map(board, color):
+        """
+        Get the squares attacked by each piece of a player
+
+        :param board: board to be looked at
+        :param color: color of the player
+        :return: dictionary of square index to bitboard of attacked squares
+        """
+
+        return {square: board.attacks_mask(square) for square in chess.scan_forward(board.occupied_co[color])}
+
+    @property
+    def from_square(self):
+        return self.move.from_square
+
+    @property
+    def to_square(self):
+        return self.move.to_square
+
+    @property
+    def opponent_pieces(self):
+        """
+        Get the squares occupied by the opponent after the move
+
+        :return: bitboard of occupied squares
+        """
+
+        return self.board_after.occupied_co[not self.color]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MoveContext cannot be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("MoveContext cannot be changed")
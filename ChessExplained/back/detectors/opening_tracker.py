@@ -0,0 +1,174 @@
+import chess
+import chess.polyglot
+
+from back.detectors.openings_detector import OpeningsDetector
+
+
+class OpeningTracker:
+    """
+    Class used to follow the opening of a game while its moves are pushed and popped
+    Every ply updates the Zobrist hash of the position from the squares the move changes and looks the position up
+    once, so the deepest named opening and the ply the game left theory are known without replaying the game.
+    Positions are found by their hash, so openings reached by transposition are named as well.
+
+    """
+
+    RANDOM = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+    hasher = chess.polyglot.ZobristHasher(RANDOM)
+
+    # index of the key of the side to move in the random array
+    TURN = 780
+
+    def __init__(self, board):
+        """
+        Constructor for OpeningTracker class
+
+        :param board: board the moves are pushed on, followed from its current move stack
+        """
+
+        self.board = board
+
+        # one entry per position, from the root: (hash, move reaching it, deepest opening, ply of the opening)
+        self._stack = []
+        self.reset()
+
+    def reset(self):
+        """
+        Follow the board again from the root of its move stack, e.g. after its position was set
+
+        :return: None
+        """
+
+        board = self.board.root()
+        key = chess.polyglot.zobrist_hash(board)
+        self._stack = [(key, None, OpeningsDetector.lookup(board, key), 0)]
+
+        for move in self.board.move_stack:
+            self._advance(board, move)
+
+    def push(self, move):
+        """
+        Push a move on the board
+
+        :param move: legal chess.Move
+        :return: None
+        """
+
+        self._sync()
+        self._advance(self.board, move)
+
+    def pop(self):
+        """
+        Pop the last move of the board
+
+        :return: the popped chess.Move
+        """
+
+        self._sync()
+        move = self.board.pop()
+        self._stack.pop()
+        return move
+
+    def _sync(self):
+        """
+        Follow the board again if moves were pushed or popped without the tracker
+
+        :return: None
+        """
+
+        stack = self.board.move_stack
+        if len(stack) != len(self._stack) - 1 or (stack and stack[-1] != self._stack[-1][1]):
+            self.reset()
+
+    def _advance(self, board, move):
+        """
+        Push a move on a board and add the position it reaches
+
+        :param board: board of the position on top of the stack
+        :param move: legal chess.Move
+        :return: None
+        """
+
+        key = self._stack[-1][0]
+        color = board.turn
+
+        # the castling rights and the en passant file before the move
+        key ^= self.hasher.hash_castling(board) ^ self.hasher.hash_ep_square(board)
+
+        if board.is_castling(move):
+            # the king and the rook both move on the back rank, whatever squares they come from
+            back_rank = chess.BB_RANK_1 if color == chess.WHITE else chess.BB_RANK_8
+            key ^= self._hash_squares(board, back_rank)
+            board.push(move)
+            key ^= self._hash_squares(board, back_rank)
+        else:
+            if move:
+                piece_type = board.piece_type_at(move.from_square)
+                key ^= self._piece(piece_type, color, move.from_square)
+                key ^= self._piece(move.promotion or piece_type, color, move.to_square)
+
+                if board.is_en_passant(move):
+                    captured_square = move.to_square + (-8 if color == chess.WHITE else 8)
+                    key ^= self._piece(chess.PAWN, not color, captured_square)
+                elif board.piece_type_at(move.to_square):
+                    key ^= self._piece(board.piece_type_at(move.to_square), not color, move.to_square)
+            board.push(move)
+
+        # the castling rights and the en passant file after the move, and the side to move
+        key ^= self.hasher.hash_castling(board) ^ self.hasher.hash_ep_square(board) ^ self.RANDOM[self.TURN]
+
+        _, _, opening, opening_ply = self._stack[-1]
+        found = OpeningsDetector.lookup(board, key)
+        if found is not None:
+            opening, opening_ply = found, len(self._stack)
+        self._stack.append((key, move, opening, opening_ply))
+
+    def _piece(self, piece_type, color, square):
+        return self.RANDOM[64 * ((piece_type - 1) * 2 + int(color)) + square]
+
+    def _hash_squares(self, board, mask):
+        key = 0
+        for square in chess.scan_reversed(board.occupied & mask):
+            key ^= self._piece(board.piece_type_at(square), board.color_at(square), square)
+        return key
+
+    def hash(self):
+        """
+        Get the Zobrist hash of the current position
+
+        :return: polyglot Zobrist hash
+        """
+
+        self._sync()
+        return self._stack[-1][0]
+
+    def opening(self):
+        """
+        Get the deepest named opening of the game so far
+
+        :return: dictionary with keys 'eco', 'name', 'variation' and 'ply' (number of half moves played when it was
+                 reached), None if no position of the game is a known opening
+        """
+
+        self._sync()
+        _, _, opening, opening_ply = self._stack[-1]
+        if opening is None:
+            return None
+        return dict(opening, ply=opening_ply)
+
+    def left_theory(self):
+        """
+        Get the ply the game left theory, the first move after the deepest named opening
+
+        :return: number of half moves played when the game left theory, None while the current position is named or
+                 no move was played
+        """
+
+        self._sync()
+        opening_ply = self._stack[-1][3]
+        if opening_ply == len(self._stack) - 1:
+            return None
+        return opening_ply + 1
+
+    def __len__(self):
+        return len(self._stack) - 1
@@ -0,0 +1,249 @@
+import logging
+import os
+import sqlite3
+import threading
+
+import chess
+import chess.polyglot
+
+from back.utils.timing import Timing
+
+logger = logging.getLogger(__name__)
+
+
+class OpeningTree:
+    """
+    Class used to look up the moves played from a position in a games database, with how often they were played and
+    how they scored
+    The tree is built once from the games into a SQLite file keyed by the Zobrist hash of the positions, so the
+    continuations of a position are read with a single indexed lookup, see resources/build_opening_tree.py.
+
+    """
+
+    # number of half moves of each game added to the tree
+    MAX_PLIES = 20
+
+    # results of a game, with the index of their count: [games, white wins, draws, black wins]
+    RESULTS = {"1-0": 1, "1/2-1/2": 2, "0-1": 3}
+
+    def __init__(self, path):
+        """
+        Constructor for OpeningTree class, use OpeningTree.build to create the file first
+        The database is opened lazily, the first time it is needed
+
+        :param path: path to the SQLite file of the tree
+        """
+
+        self.path = path
+
+        # sqlite connections cannot be shared between threads
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Get the connection of the calling thread, opening the database if needed
+
+        :return: sqlite3 connection
+        """
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # the tree is only written by build, readers never lock it
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _key(board):
+        """
+        Get the key of a position
+
+        :param board: board of the position
+        :return: polyglot Zobrist hash as a signed 64 bit integer, as sqlite stores it
+        """
+
+        key = chess.polyglot.zobrist_hash(board)
+        return key - (1 << 64) if key >= 1 << 63 else key
+
+    @classmethod
+    def read_games(cls, source_path):
+        """
+        Read the games of a games file, one game per line in SAN notation
+        A game ending with a checkmate was won by the side making the last move, other games can end with their
+        result written as '1-0', '0-1' or '1/2-1/2'
+
+        :param source_path: path to the games file
+        :return: generator of tuples (list of moves in SAN notation, result '1-0', '0-1', '1/2-1/2' or '*' if it is
+                 not known)
+        """
+
+        with open(source_path, "r") as file:
+            for line in file:
+                moves = line.split()
+                if not moves:
+                    continue
+
+                if moves[-1] in cls.RESULTS or moves[-1] == "*":
+                    yield moves[:-1], moves[-1]
+                elif moves[-1].endswith("#"):
+                    yield moves, "1-0" if len(moves) % 2 == 1 else "0-1"
+                else:
+                    yield moves, "*"
+
+    @classmethod
+    def build(cls, source_path, tree_path, max_plies=MAX_PLIES, min_games=1):
+        """
+        Build the tree of a games file
+
+        :param source_path: path to the games file
+        :param tree_path: path of the SQLite file written
+        :param max_plies: number of half moves of each game added to the tree. Default is MAX_PLIES
+        :param min_games: minimum number of games of a continuation, rarer continuations are left out. Default is 1
+        :return: OpeningTree instance
+        """
+
+        # (position, move) -> [games, white wins, draws, black wins]
+        counts = {}
+        games = 0
+
+        for moves, result in cls.read_games(source_path):
+            games += 1
+            column = cls.RESULTS.get(result)
+
+            board = chess.Board()
+            for move_san in moves[:max_plies]:
+                try:
+                    move = board.parse_san(move_san)
+                except ValueError:
+                    logger.debug("Game %d has an invalid move %s, its later moves are skipped", games, move_san)
+                    break
+
+                key = (cls._key(board), move.uci())
+                entry = counts.get(key)
+                if entry is None:
+                    entry = counts[key] = [0, 0, 0, 0]
+                entry[0] += 1
+                if column is not None:
+                    entry[column] += 1
+                board.push(move)
+
+        # write to a temporary file first, so a reader never opens a partial tree
+        temporary = f"{tree_path}.{os.getpid()}.{threading.get_ident()}"
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+        connection = sqlite3.connect(temporary)
+        try:
+            connection.execute(
+                "CREATE TABLE continuations (position INTEGER NOT NULL, move TEXT NOT NULL, games INTEGER NOT NULL, "
+                "white INTEGER NOT NULL, draws INTEGER NOT NULL, black INTEGER NOT NULL, "
+                "PRIMARY KEY (position, move)) WITHOUT ROWID")
+            connection.execute("CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+            connection.executemany("INSERT INTO continuations VALUES (?, ?, ?, ?, ?, ?)",
+                                   (key + tuple(entry) for key, entry in sorted(counts.items())
+                                    if entry[0] >= min_games))
+            connection.executemany("INSERT INTO metadata VALUES (?, ?)",
+                                   [("source", os.path.basename(source_path)), ("games", str(games)),
+                                    ("max_plies", str(max_plies)), ("min_games", str(min_games))])
+            connection.commit()
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+        os.replace(temporary, tree_path)
+        logger.info("Opening tree of %d games written to %s", games, tree_path)
+        return cls(tree_path)
+
+    def continuations(self, board, limit=None):
+        """
+        Get the moves played from a position, the most played first
+
+        :param board: board of the position
+        :param limit: maximum number of moves. Default is all of them
+        :return: List of dictionaries with keys 'move' (SAN notation), 'games', 'white', 'draws', 'black' (number of
+                 games won by each side or drawn) and 'score' (points scored by the player to move, between 0 and 1,
+                 None if no result is known)
+        """
+
+        with Timing.span("opening_tree"):
+            rows = self._connection().execute(
+                "SELECT move, games, white, draws, black FROM continuations WHERE position = ? "
+                "ORDER BY games DESC, move LIMIT ?", (self._key(board), -1 if limit is None else limit)).fetchall()
+
+        continuations = []
+        for move, games, white, draws, black in rows:
+            move = chess.Move.from_uci(move)
+            # a hash collision could give a move of another position
+            if not board.is_legal(move):
+                continue
+
+            continuations.append(self._entry(board, move, games, white, draws, black))
+        return continuations
+
+    @staticmethod
+    def _entry(board, move, games, white, draws, black):
+        # games with an unknown result do not count in the score
+        decided = white + draws + black
+        wins = white if board.turn == chess.WHITE else black
+        return {"move": board.san(move), "games": games, "white": white, "draws": draws, "black": black,
+                "score": (wins + draws / 2) / decided if decided else None}
+
+    def statistics(self, board, move_san):
+        """
+        Get how often a move was played from a position and how it scored
+
+        :param board: board before the move
+        :param move_san: move in SAN notation
+        :return: dictionary as returned by continuations, None if the move was never played from the position
+        """
+
+        move = board.parse_san(move_san)
+        with Timing.span("opening_tree"):
+            row = self._connection().execute(
+                "SELECT games, white, draws, black FROM continuations WHERE position = ? AND move = ?",
+                (self._key(board), move.uci())).fetchone()
+        if row is None:
+            return None
+
+        return self._entry(board, move, *row)
+
+    def describe(self, board, limit=3):
+        """
+        Describe what is usually played from a position and how it scores
+
+        :param board: board of the position
+        :param limit: maximum number of moves described. Default is 3
+        :return: description as a string, None if the position is not in the tree
+        """
+
+        continuations = self.continuations(board, limit)
+        if not continuations:
+            return None
+
+        moves = ", ".join(f"{entry['move']} ({entry['games']} games, scoring {round(entry['score'] * 100)}%)"
+                          if entry["score"] is not None else f"{entry['move']} ({entry['games']} games)"
+                          for entry in continuations)
+        return f"In the games database the most played moves here are {moves}. "
+
+    def metadata(self):
+        """
+        Get the settings the tree was built with
+
+        :return: dictionary with keys 'source', 'games', 'max_plies' and 'min_games'
+        """
+
+        return dict(self._connection().execute("SELECT key, value FROM metadata").fetchall())
+
+    def close(self):
+        """
+        Close the connection of the calling thread
+
+        :return: None
+        """
+
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
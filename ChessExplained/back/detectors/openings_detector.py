@@ -1,329 +1,161 @@
-class OpeningsDetector:
-    def __init__(self, stockfish):
-        self.stockfish = stockfish
-
-    def get_opening(self, move_san):
-        opening = None
-
-        if self._is_sicilian_defense(move_san):
-            opening = "Sicilian Defense"
-        elif self._is_french_defense(move_san):
-            opening = "French Defense"
-        elif self._is_ruy_lopez_opening(move_san):
-            opening = "Ruy Lopez Opening"
-        elif self._is_caro_kann_defense(move_san):
-            opening = "Caro-Kann Defense"
-        elif self._is_italian_game(move_san):
-            opening = "Italian Game"
-        elif self._is_scandinavian_defense(move_san):
-            opening = "Scandinavian Defense"
-        elif self._is_pirc_defense(move_san):
-            opening = "Pirc Defense"
-        elif self._is_alekhine_defense(move_san):
-            opening = "Alekhine Defense"
-        elif self._is_kings_gambit(move_san):
-            opening = "King's Gambit"
-        elif self._is_scotch_game(move_san):
-            opening = "Scotch Game"
-        elif self._is_vienna_game(move_san):
-            opening = "Vienna Game"
-        elif self._is_queens_gambit(move_san):
-            opening = "Queen's Gambit"
-        elif self._is_slav_defense(move_san):
-            opening = "Slav Defense"
-        elif self._is_king_indian_defense(move_san):
-            opening = "King's Indian Defense"
-        elif self._is_nimzo_indian_defense(move_san):
-            opening = "Nimzo-Indian Defense"
-        elif self._is_queens_indian_defense(move_san):
-            opening = "Queen's Indian Defense"
-        elif self._is_catalan_opening(move_san):
-            opening = "Catalan Opening"
-        elif self._is_bogo_indian_defense(move_san):
-            opening = "Bogo-Indian Defense"
-        elif self._is_grunfeld_defense(move_san):
-            opening = "Grunfeld Defense"
-        elif self._is_dutch_defense(move_san):
-            opening = "Dutch Defense"
-        elif self._is_trompowsky_attack(move_san):
-            opening = "Trompowsky Attack"
-        elif self._is_benko_gambit(move_san):
-            opening = "Benko Gambit"
-        elif self._is_london_system(move_san):
-            opening = "London System"
-        elif self._is_benoni_defense(move_san):
-            opening = "Benoni Defense"
-        elif self._is_reti_opening(move_san):
-            opening = "Reti Opening"
-        elif self._is_english_opening(move_san):
-            opening = "English Opening"
-        elif self._is_birds_opening(move_san):
-            opening = "Bird's Opening"
-        elif self._is_kings_indian_attack(move_san):
-            opening = "King's Indian Attack"
-        elif self._is_kings_fianchetto_opening(move_san):
-            opening = "King's Fianchetto Opening"
-        elif self._is_nimzowitsch_larsen_attack(move_san):
-            opening = "Nimzowitsch-Larsen Attack"
-        elif self._is_polish_opening(move_san):
-            opening = "Polish Opening"
-        elif self._is_grob_opening(move_san):
-            opening = "Grob Opening"
-
-        return opening
-
-    def _is_sicilian_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_french_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_ruy_lopez_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_caro_kann_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_italian_game(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_scandinavian_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_pirc_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/ppp1pppp/3p1n2/8/3PP3/8/PPP2PPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_alekhine_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/pppppppp/5n2/8/4P3/8/PPPP1PPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_kings_gambit(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppp1ppp/8/4p3/4PP2/8/PPPP2PP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_scotch_game(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("r1bqkbnr/pppp1ppp/2n5/4p3/3PP3/5N2/PPP2PPP/RNBQKB1R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_vienna_game(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppp1ppp/8/4p3/4P3/2N5/PPPP1PPP/R1BQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
+import logging
+import os
+import threading
 
-    def _is_queens_gambit(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
+import chess
 
-    def _is_slav_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pp2pppp/2p5/3p4/2PP4/8/PP2PPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
+from back.detectors.eco_index import EcoIndex
+from back.detectors.opening_tree import OpeningTree
+from back.utils.metrics import MetricsRegistry
+from back.utils.timing import Timing
 
-    def _is_king_indian_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/pppppp1p/5np1/8/2PP4/8/PP2PPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
+logger = logging.getLogger(__name__)
 
-    def _is_nimzo_indian_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqk2r/pppp1ppp/4pn2/8/1bPP4/2N5/PP2PPPP/R1BQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
 
-    def _is_queens_indian_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/p1pp1ppp/1p2pn2/8/2PP4/5N2/PP2PPPP/RNBQKB1R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_catalan_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/pppp1ppp/4pn2/8/2PP4/6P1/PP2PP1P/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_bogo_indian_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqk2r/pppp1ppp/4pn2/8/1bPP4/5N2/PP2PPPP/RNBQKB1R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_grunfeld_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/ppp1pp1p/5np1/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_dutch_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/ppppp1pp/8/5p2/3P4/8/PPP1PPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_trompowsky_attack(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/pppppppp/5n2/6B1/3P4/8/PPP1PPPP/RN1QKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_benko_gambit(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/p2ppppp/5n2/1ppP4/2P5/8/PP2PPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_london_system(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/ppp1pppp/5n2/3p4/3P1B2/5N2/PPP1PPPP/RN1QKB1R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_benoni_defense(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkb1r/pp3ppp/3p1n2/2pP4/8/2N5/PP2PPPP/R1BQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_reti_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_english_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_birds_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppppppp/8/8/5P2/8/PPPPP1PP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_kings_indian_attack(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/ppp1pppp/8/3p4/8/5NP1/PPPPPP1P/RNBQKB1R"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_kings_fianchetto_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppppppp/8/8/8/6P1/PPPPPP1P/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
-
-    def _is_nimzowitsch_larsen_attack(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppppppp/8/8/8/1P6/P1PPPPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
+class OpeningsDetector:
+    # ECO classification data, compiled into an index next to it on first use
+    ECO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets", "eco")
+
+    # openings recognized by their piece placement when the position is not in the ECO data
+    OPENINGS = (
+        ("Sicilian Defense", "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR"),
+        ("French Defense", "rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR"),
+        ("Ruy Lopez Opening", "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R"),
+        ("Caro-Kann Defense", "rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR"),
+        ("Italian Game", "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R"),
+        ("Scandinavian Defense", "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR"),
+        ("Pirc Defense", "rnbqkb1r/ppp1pppp/3p1n2/8/3PP3/8/PPP2PPP/RNBQKBNR"),
+        ("Alekhine Defense", "rnbqkb1r/pppppppp/5n2/8/4P3/8/PPPP1PPP/RNBQKBNR"),
+        ("King's Gambit", "rnbqkbnr/pppp1ppp/8/4p3/4PP2/8/PPPP2PP/RNBQKBNR"),
+        ("Scotch Game", "r1bqkbnr/pppp1ppp/2n5/4p3/3PP3/5N2/PPP2PPP/RNBQKB1R"),
+        ("Vienna Game", "rnbqkbnr/pppp1ppp/8/4p3/4P3/2N5/PPPP1PPP/R1BQKBNR"),
+        ("Queen's Gambit", "rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR"),
+        ("Slav Defense", "rnbqkbnr/pp2pppp/2p5/3p4/2PP4/8/PP2PPPP/RNBQKBNR"),
+        ("King's Indian Defense", "rnbqkb1r/pppppp1p/5np1/8/2PP4/8/PP2PPPP/RNBQKBNR"),
+        ("Nimzo-Indian Defense", "rnbqk2r/pppp1ppp/4pn2/8/1bPP4/2N5/PP2PPPP/R1BQKBNR"),
+        ("Queen's Indian Defense", "rnbqkb1r/p1pp1ppp/1p2pn2/8/2PP4/5N2/PP2PPPP/RNBQKB1R"),
+        ("Catalan Opening", "rnbqkb1r/pppp1ppp/4pn2/8/2PP4/6P1/PP2PP1P/RNBQKBNR"),
+        ("Bogo-Indian Defense", "rnbqk2r/pppp1ppp/4pn2/8/1bPP4/5N2/PP2PPPP/RNBQKB1R"),
+        ("Grunfeld Defense", "rnbqkb1r/ppp1pp1p/5np1/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR"),
+        ("Dutch Defense", "rnbqkbnr/ppppp1pp/8/5p2/3P4/8/PPP1PPPP/RNBQKBNR"),
+        ("Trompowsky Attack", "rnbqkb1r/pppppppp/5n2/6B1/3P4/8/PPP1PPPP/RN1QKBNR"),
+        ("Benko Gambit", "rnbqkb1r/p2ppppp/5n2/1ppP4/2P5/8/PP2PPPP/RNBQKBNR"),
+        ("London System", "rnbqkb1r/ppp1pppp/5n2/3p4/3P1B2/5N2/PPP1PPPP/RN1QKB1R"),
+        ("Benoni Defense", "rnbqkb1r/pp3ppp/3p1n2/2pP4/8/2N5/PP2PPPP/R1BQKBNR"),
+        ("Reti Opening", "rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R"),
+        ("English Opening", "rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR"),
+        ("Bird's Opening", "rnbqkbnr/pppppppp/8/8/5P2/8/PPPPP1PP/RNBQKBNR"),
+        ("King's Indian Attack", "rnbqkbnr/ppp1pppp/8/3p4/8/5NP1/PPPPPP1P/RNBQKB1R"),
+        ("King's Fianchetto Opening", "rnbqkbnr/pppppppp/8/8/8/6P1/PPPPPP1P/RNBQKBNR"),
+        ("Nimzowitsch-Larsen Attack", "rnbqkbnr/pppppppp/8/8/8/1P6/P1PPPPPP/RNBQKBNR"),
+        ("Polish Opening", "rnbqkbnr/pppppppp/8/8/1P6/8/P1PPPPPP/RNBQKBNR"),
+        ("Grob Opening", "rnbqkbnr/pppppppp/8/8/6P1/8/PPPPPP1P/RNBQKBNR"),
+    )
+
+    latency = MetricsRegistry.default.histogram("opening_lookup_seconds", "Time spent looking up the opening of a move")
+
+    _eco = None
+    _eco_lock = threading.Lock()
+
+    # moves played from the positions of the games database, built by 'python resources/build_opening_tree.py'
+    TREE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets",
+                             "opening_tree.sqlite")
+    _tree = None
+    _tree_lock = threading.Lock()
 
-    def _is_polish_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppppppp/8/8/1P6/8/P1PPPPPP/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
+    def __init__(self, stockfish):
+        self.stockfish = stockfish
 
-    def _is_grob_opening(self, move_san):
-        self.stockfish.move(move_san)
-        if self.stockfish.board.fen().startswith("rnbqkbnr/pppppppp/8/8/6P1/8/PPPPPP1P/RNBQKBNR"):
-            self.stockfish.undo()
-            return True
-        self.stockfish.undo()
-        return False
+    @classmethod
+    def eco_index(cls):
+        """
+        Get the ECO index shared by all the detectors, loading it the first time
+
+        :return: EcoIndex instance, None if the ECO data cannot be loaded
+        """
+        if cls._eco is None:
+            with cls._eco_lock:
+                if cls._eco is None:
+                    try:
+                        cls._eco = EcoIndex.load(cls.ECO_PATH)
+                    except (OSError, ValueError) as error:
+                        logger.warning("ECO data could not be loaded: %s", error)
+                        cls._eco = False
+        return cls._eco or None
+
+    @classmethod
+    def opening_tree(cls):
+        """
+        Get the opening tree of the games database shared by all the detectors
+
+        :return: OpeningTree instance, None if the tree was not built
+        """
+        if cls._tree is None:
+            with cls._tree_lock:
+                if cls._tree is None:
+                    cls._tree = OpeningTree(cls.TREE_PATH) if os.path.exists(cls.TREE_PATH) else False
+        return cls._tree or None
+
+    @staticmethod
+    def placement_key(board):
+        """
+        Get a key of the piece placement of a board, ignoring the turn, the castling rights and the move counters
+
+        :param board: board whose pieces are placed
+        :return: tuple of the bitboards of each piece type and of the white pieces
+        """
+        return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+                board.occupied_co[chess.WHITE])
+
+    def get_opening(self, move_san, board=None):
+        """
+        Get the opening reached by a move
+
+        :param move_san: Move in standard algebraic notation
+        :param board: board before the move. Default is the board of the Stockfish instance
+        :return: name of the opening, with its variation if any, None if the move does not reach a known opening
+        """
+        opening = self.classify(move_san, board)
+        if opening is None:
+            return None
+        return f"{opening['name']}: {opening['variation']}" if opening["variation"] else opening["name"]
+
+    def classify(self, move_san, board=None):
+        """
+        Get the ECO classification of the position reached by a move
+
+        :param move_san: Move in standard algebraic notation
+        :param board: board before the move. Default is the board of the Stockfish instance
+        :return: dictionary with keys 'eco' (None for an opening known only by its piece placement), 'name' and
+                 'variation', None if the move does not reach a known opening
+        """
+        # the move is tried on a copy, so the board can be shared with other threads
+        board = (self.stockfish.board if board is None else board).copy(stack=False)
+
+        with Timing.span("opening", self.latency):
+            board.push_san(move_san)
+            return self.lookup(board)
+
+    @classmethod
+    def lookup(cls, board, key=None):
+        """
+        Get the ECO classification of a position, by its Zobrist hash first and by its piece placement otherwise
+
+        :param board: board of the position
+        :param key: polyglot Zobrist hash of the position, if it is already known
+        :return: dictionary with keys 'eco' (None for an opening known only by its piece placement), 'name' and
+                 'variation', None if the position is not a known opening
+        """
+        eco = cls.eco_index()
+        if eco is not None:
+            opening = eco.lookup(board) if key is None else eco.lookup_hash(key)
+            if opening is not None:
+                return opening
+
+        name = cls._index.get(cls.placement_key(board))
+        return {"eco": None, "name": name, "variation": ""} if name is not None else None
+
+
+# openings by the key of their piece placement, built once when the module is imported
+OpeningsDetector._index = {OpeningsDetector.placement_key(chess.BaseBoard(placement)): name
+                           for name, placement in OpeningsDetector.OPENINGS}
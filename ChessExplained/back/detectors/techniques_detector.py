@@ -1,8 +1,14 @@
+from back.detectors.detector_registry import CHEAP, ENGINE, DetectorRegistry, TechniqueResults
+from back.detectors.move_context import MoveContext
 from back.utils.board_utils import BoardUtils
+from back.utils.static_exchange import StaticExchange
 import chess
 
 
 class TechniquesDetector:
+    # detectors of all the techniques, registered with the decorators below
+    registry = DetectorRegistry()
+
     def __init__(self, stockfish):
         self.stockfish = stockfish
 
@@ -15,142 +21,191 @@ class TechniquesDetector:
             'P': 1,
         }
 
-    def get_techniques(self, move_san):
-        dictionary = {'check': self._is_check(move_san), 'checkmate': self._is_checkmate(move_san),
-                      'capture': self._is_capture(move_san), 'en_passant': self._is_en_passant(move_san),
-                      'fork': self._is_fork(move_san), 'battery': self._is_battery(move_san),
-                      'sacrifice': self._is_sacrifice(move_san), 'stalemate': self._is_stalemate(move_san),
-                      'insufficient_material': self._is_insufficient_material(move_san),
-                      'discovered_attack': self._is_a_discovered_attack(move_san),
-                      'castling': self._is_a_castling(move_san), 'pawn_promotion': self._is_pawn_promotion(move_san),
-                      'skewer': self._is_skewer(move_san), 'forced_checkmate': self._is_forced_checkmate(move_san),
-                      'pin': self._is_pin(move_san), 'check_forced': self._is_move_check_forced(move_san)}
+    def get_techniques(self, move_san, techniques=None, max_tier=ENGINE, board=None):
+        """
+        Detect the techniques used by a move
+        The engine detectors are deferred until their result is read
 
-        return dictionary
+        :param move_san: Move in standard algebraic notation
+        :param techniques: names of the techniques to be detected. Default is all the registered techniques
+        :param max_tier: most expensive tier that is run, e.g. CHEAP to keep the engine out. Default is every tier
+        :param board: board before the move. Default is the board of the Stockfish instance
+        :return: TechniqueResults mapping each technique to its dictionary
+        """
 
-    def _is_capture(self, move_san):
+        # analyse the move once, all the detectors share the result
+        context = MoveContext(self.stockfish.board if board is None else board, move_san)
+
+        return self.detect(context, techniques, max_tier)
+
+    def detect(self, context, techniques=None, max_tier=ENGINE):
         """
-        Determine if the move results in a capture.
+        Detect the techniques used by an already analysed move
 
-        :param move_san: Move in standard algebraic notation
-        :return: Dictionary with key 'enable' that is True if the move results in a capture, False otherwise
+        :param context: MoveContext of the move
+        :param techniques: names of the techniques to be detected. Default is all the registered techniques
+        :param max_tier: most expensive tier that is run. Default is every tier
+        :return: TechniqueResults mapping each technique to its dictionary
+        """
+
+        return TechniqueResults(self, context, self.registry.select(techniques), max_tier)
+
+    def _can_pin(self, context):
         """
-        start_end_move = self.stockfish.start_end_from_san(move_san)
-        captured_piece = self.stockfish.piece_at_san(start_end_move[1])
+        Check if the move can pin a piece: only sliding pieces attack through other pieces
 
-        # If the move is an en passant, the captured piece is a pawn
-        if captured_piece is None:
-            captured_piece = "Pawn"
+        :param context: MoveContext of the move
+        :return: False if the move cannot result in a pin
+        """
+        return BoardUtils.is_sliding_piece(context.board_after.piece_at(context.to_square))
+
+    def _can_skewer(self, context):
+        """
+        Check if the move can start a skewer: a sliding piece must attack a higher value piece with another
+        opponent piece behind it
 
-        enable = self.stockfish.is_capture(move_san)
+        :param context: MoveContext of the move
+        :return: False if the move cannot result in a skewer
+        """
+        if not self._can_pin(context):
+            return False
+
+        board_after = context.board_after
+        attacking_value = self.piece_value[BoardUtils.piece_at_index_str(board_after, context.to_square)]
+        attacked = context.attacks_after[context.to_square] & context.opponent_pieces
+
+        for square in chess.scan_forward(attacked):
+            if self.piece_value[board_after.piece_at(square).symbol().upper()] <= attacking_value:
+                continue
+            behind = BoardUtils.x_ray_target(context.to_square, square, board_after.occupied)
+            if behind is not None and context.opponent_pieces & chess.BB_SQUARES[behind]:
+                return True
+        return False
+
+    def _can_force_checkmate(self, context):
+        """
+        Check if the engine can find a mate after the move, a move ending the game is reported by other detectors
 
-        return dict({"enable": enable, "captured": captured_piece})
+        :param context: MoveContext of the move
+        :return: False if the game is over after the move
+        """
+        return not context.board_after.is_game_over()
 
-    def _is_en_passant(self, move_san):
+    @registry.register("capture")
+    def _is_capture(self, context):
+        """
+        Determine if the move results in a capture.
+
+        :param context: MoveContext of the move
+        :return: Dictionary with key 'enable' that is True if the move results in a capture, False otherwise,
+                key 'captured' that is the captured piece and key 'exchange' that is the material won in centipawns
+                once all the captures on the square are made
+        """
+        if not context.is_capture:
+            return dict({"enable": False})
+
+        captured_piece = BoardUtils.expand_piece_name(context.captured.symbol())
+        exchange = StaticExchange.evaluate(context.board, context.move)
+
+        return dict({"enable": True, "captured": captured_piece, "exchange": exchange})
+
+    @registry.register("en_passant")
+    def _is_en_passant(self, context):
         """
         Determine if the move results in an en passant
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: Dictionary with key 'enable' that is True if the move results in an en passant, False otherwise
         """
-        return {'enable': self.stockfish.is_en_passant(move_san)}
+        return {'enable': context.is_en_passant}
 
-    def _is_fork(self, move_san):
+    @registry.register("fork")
+    def _is_fork(self, context):
         """
         Determine if the move results in a fork
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: True if the move results in a fork, False otherwise
         """
 
         dictionary = {"enable": False, "forked": []}
 
-        # get (start, end) square of the move
-        start_end_move = self.stockfish.start_end_from_san(move_san)
-
-        # check that piece is not a pawn
-        if self.stockfish.piece_at_san(start_end_move[0]) == 'P':
-            return dict({"enable": False})
-
         # initialize the valuable pieces count
         valuable_pieces_count = 0
 
-        # make the move
-        self.stockfish.move(move_san)
-
-        # get all captures by the moved piece
-        captures = self.stockfish.capture_pieces_by_san(start_end_move[1])
+        # get all the opponent pieces attacked by the moved piece
+        captures = context.attacks_after[context.to_square] & context.opponent_pieces
 
         # loop through all captures
-        for capture in captures:
+        for square in chess.scan_forward(captures):
             # get captured piece
-            captured_piece = capture[0]
+            captured_piece = context.board_after.piece_at(square).symbol().upper()
+
+            if captured_piece not in ['K', 'Q', 'R', 'B', 'N']:
+                continue
 
-            if captured_piece in ['K', 'Q', 'R', 'B', 'N']:
+            # a piece is not threatened if taking it loses material, the king is always threatened
+            capture = chess.Move(context.to_square, square)
+            if captured_piece == 'K' or StaticExchange.evaluate(context.board_after, capture) >= 0:
                 valuable_pieces_count += 1
                 dictionary['forked'].append(BoardUtils.expand_piece_name(captured_piece))
 
-        # undo the move
-        self.stockfish.undo()
-
-        if valuable_pieces_count > 1:
+        # the forking piece must not be lost for less than it is worth
+        if valuable_pieces_count > 1 and StaticExchange.evaluate(context.board, context.move) >= 0:
             dictionary['enable'] = True
 
         return dictionary
 
-    def _is_checkmate(self, move_san):
+    @registry.register("checkmate")
+    def _is_checkmate(self, context):
         """
         Determine if the move results in a checkmate
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: dictionary with key 'enable' that is True if the move results in a checkmate, False otherwise
                 and key 'piece' that is the piece that delivers checkmate
         """
 
         dictionary = {}
 
-        self.stockfish.move(move_san)
-        is_checkmate = self.stockfish.board.is_checkmate()
-        self.stockfish.undo()
-
         # get piece that delivers checkmate
-        if is_checkmate:
-            start_end_move = self.stockfish.start_end_from_san(move_san)
-            index = self.stockfish.index_from_san(start_end_move[0])
-            piece = BoardUtils.piece_at_index_str(self.stockfish.board, index)
-            piece = BoardUtils.expand_piece_name(piece)
-            dictionary['piece'] = piece
-        dictionary['enable'] = is_checkmate
+        if context.is_checkmate:
+            dictionary['piece'] = BoardUtils.expand_piece_name(context.piece.symbol())
+        dictionary['enable'] = context.is_checkmate
         return dictionary
 
-    def _is_battery(self, move_san):
+    @registry.register("battery")
+    def _is_battery(self, context):
         """
         Determine if the move results in a battery.
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: True if the move results in a battery, False otherwise
         """
-        # Get the index of the moved piece
-        move_index = chess.parse_square(self.stockfish.start_end_from_san(move_san)[1])
+        board_after = context.board_after
 
-        self.stockfish.move(move_san)
+        # Get the index of the moved piece
+        move_index = context.to_square
 
         # Get the moved piece
-        move_piece = self.stockfish.board.piece_at(move_index)
+        move_piece = board_after.piece_at(move_index)
 
-        # Get the pieces that are attacking the moved piece (the same color as the moved piece)
-        self.stockfish.switch_turn()
-        attackers = BoardUtils.get_attackers_at_square(self.stockfish.board, move_index)
-        self.stockfish.switch_turn()
+        # Only sliding pieces line up in a battery
+        sliders = board_after.occupied_co[context.color] & (board_after.bishops | board_after.rooks |
+                                                            board_after.queens) & ~chess.BB_SQUARES[move_index]
 
         is_battery = False
 
         attacker_piece = None
 
         # Check if there is a battery
-        for attacker in attackers:
-            # Get the piece that is attacking the moved piece
-            attacker_piece = self.stockfish.board.piece_at(attacker)
+        for attacker in chess.scan_forward(sliders):
+            # Get the piece that could be attacking the moved piece
+            attacker_piece = board_after.piece_at(attacker)
+
+            # The sliding piece must reach the moved piece, with no piece in between
+            if not BoardUtils.slides_to(attacker_piece.piece_type, attacker, move_index, board_after.occupied):
+                continue
 
             # Check if the attacker piece attacks on the same direction as the moved piece
             if BoardUtils.is_battery_compatible(move_piece, attacker_piece):
@@ -159,119 +214,94 @@ class TechniquesDetector:
                 attacker_piece = BoardUtils.expand_piece_name(str(attacker_piece))
                 break
 
-        # Undo the move
-        self.stockfish.undo()
-
         if is_battery:
             return dict({"enable": is_battery, "moved": move_piece, "attacker": attacker_piece})
         return dict({"enable": is_battery})
 
-    def _is_sacrifice(self, move_san):
+    @registry.register("sacrifice")
+    def _is_sacrifice(self, context):
+        """
+        Determine if the move gives up material, once both players made all the profitable captures on its square
 
-        enable = False
-        capture = False
-        start_end_move = self.stockfish.start_end_from_san(move_san)
-
-        # type of the piece that was captured
-        index = self.stockfish.index_from_san(start_end_move[1])
-        old_piece = self.stockfish.board.piece_at(index)
-
-        self.stockfish.move(move_san)
-        # type of the piece that was moved
-        new_piece = BoardUtils.piece_at_index_str(self.stockfish.board, index)
-        # all the squares (as integers) that attack the moved piece
-        attackers = BoardUtils.get_attackers_at_index(self.stockfish.board, self.stockfish.board.turn, index)
-        # all the squares that protect the moved piece
-        protectors = BoardUtils.get_attackers_at_index(self.stockfish.board, not self.stockfish.board.turn, index)
-
-        # undo the move
-        self.stockfish.undo()
-
-        # the piece was moved to a square that is under attack and there are no protectors
-        if old_piece is None:
-            if len(attackers) > 0 and len(protectors) == 0:
-                enable = True
-
-            else:
-                # the piece is protected but is attacked and can be taken by a weaker piece
-                for attacker in attackers:
-                    piece = BoardUtils.piece_at_index_str(self.stockfish.board, attacker)
-                    if self.piece_value[piece] < self.piece_value[new_piece]:
-                        enable = True
-                if enable:
-                    new_piece = BoardUtils.expand_piece_name(new_piece)
-                    return dict({"enable": enable, "capture": capture, "sacrificed": new_piece})
-                else:
-                    return dict({"enable": enable})
+        :param context: MoveContext of the move
+        :return: Dictionary with key 'enable' that is True if the move loses material, False otherwise,
+                key 'capture' that is True if the move is a capture, key 'sacrificed' that is the moved piece and
+                key 'captured' that is the captured piece, if any
+        """
 
-        capture = True
-        old_piece = str(old_piece).upper()
+        if StaticExchange.evaluate(context.board, context.move) >= 0:
+            return dict({"enable": False})
 
-        # the piece was traded for a lower value piece
-        if self.piece_value[old_piece] < self.piece_value[new_piece]:
-            enable = True
+        # type of the piece that was moved, after a promotion
+        new_piece = BoardUtils.expand_piece_name(context.board_after.piece_at(context.to_square).symbol())
 
-        if enable:
-            old_piece = BoardUtils.expand_piece_name(old_piece)
-            new_piece = BoardUtils.expand_piece_name(new_piece)
-            return dict({"enable": enable, "capture": capture, "captured": old_piece, "sacrificed": new_piece})
+        if not context.is_capture:
+            return dict({"enable": True, "capture": False, "sacrificed": new_piece})
 
-        return dict({"enable": enable})
+        old_piece = BoardUtils.expand_piece_name(context.captured.symbol())
+        return dict({"enable": True, "capture": True, "captured": old_piece, "sacrificed": new_piece})
 
-    def _is_stalemate(self, move_san):
+    @registry.register("stalemate")
+    def _is_stalemate(self, context):
         """
         Determine if the move results in a stalemate.
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: Dictionary with key 'enable' that is True if the move results in a stalemate, False otherwise
         """
 
-        self.stockfish.move(move_san)
-        dictionary = {"enable": self.stockfish.board.is_stalemate()}
-        self.stockfish.undo()
-        return dictionary
+        return {"enable": context.board_after.is_stalemate()}
 
-    def _is_insufficient_material(self, move_san):
+    @registry.register("insufficient_material")
+    def _is_insufficient_material(self, context):
         """
         Determine if the move results in a stalemate.
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: Dictionary with key 'enable' that is True if the move results in a stalemate, False otherwise
         """
-        self.stockfish.move(move_san)
-        dictionary = {"enable": self.stockfish.board.is_insufficient_material()}
-        self.stockfish.undo()
-        return dictionary
+        return {"enable": context.board_after.is_insufficient_material()}
+
+    @staticmethod
+    def _attacked_opponent_pieces(attack_map, opponent_pieces, excluded_square):
+        """
+        List the opponent pieces attacked by each piece of an attack map, allowing duplicates
 
-    def _is_a_discovered_attack(self, move_san):
+        :param attack_map: dictionary of square index to bitboard of attacked squares
+        :param opponent_pieces: bitboard of the squares occupied by the opponent
+        :param excluded_square: square whose attacks are not counted
+        :return: List of squares
+        """
+        attacked_squares = []
+        for square, attacks in attack_map.items():
+            if square == excluded_square:
+                continue
+            attacked_squares += chess.scan_forward(attacks & opponent_pieces)
+        return attacked_squares
+
+    @registry.register("discovered_attack")
+    def _is_a_discovered_attack(self, context):
         """
             Determine if the move results in a discovered attack.
 
-            :param move_san: Move in standard algebraic notation
+            :param context: MoveContext of the move
             :return: True if the move results in a discovered attack, False otherwise
         """
 
         dictionary = {}
-        from_square = self.stockfish.board.parse_san(move_san).from_square
-        to_square = self.stockfish.board.parse_san(move_san).to_square
-
-        moved_piece_type = BoardUtils.piece_at_index_str(self.stockfish.board, from_square)
-        moved_piece = BoardUtils.expand_piece_name(moved_piece_type)
-
-        squares_before_move = self.stockfish.captures_except_square_allowing_duplicates(from_square)
-
-        self.stockfish.move(move_san)
-        self.stockfish.board.turn = not self.stockfish.board.turn
 
-        squares_after_move = self.stockfish.captures_except_square_allowing_duplicates(to_square)
+        moved_piece = BoardUtils.expand_piece_name(context.piece.symbol())
 
-        self.stockfish.undo()
+        squares_before_move = self._attacked_opponent_pieces(context.attacks_before,
+                                                             context.board.occupied_co[not context.color],
+                                                             context.from_square)
+        squares_after_move = self._attacked_opponent_pieces(context.attacks_after, context.opponent_pieces,
+                                                            context.to_square)
 
         for attacked_square in squares_after_move:
             if squares_after_move.count(attacked_square) > squares_before_move.count(attacked_square):
                 dictionary['enable'] = True
-                attacked_piece_type = self.stockfish.piece_at_san(attacked_square)
-                print(attacked_piece_type)
+                attacked_piece_type = context.board.piece_at(attacked_square)
                 attacked_piece = BoardUtils.expand_piece_name(str(attacked_piece_type))
                 dictionary['piece'] = [moved_piece, attacked_piece]
                 return dictionary
@@ -279,97 +309,76 @@ class TechniquesDetector:
         dictionary['enable'] = False
         return dictionary
 
-    def _is_a_castling(self, move_san):
-        enable = self.stockfish.board.is_castling(self.stockfish.board.parse_san(move_san))
-        from_square = self.stockfish.board.parse_san(move_san).from_square
-        to_square = self.stockfish.board.parse_san(move_san).to_square
-        if chess.square_rank(from_square) < chess.square_rank(to_square):
+    @registry.register("castling")
+    def _is_a_castling(self, context):
+        if chess.square_rank(context.from_square) < chess.square_rank(context.to_square):
             side = "QueenSide"
         else:
             side = "KingSide"
 
-        return dict({"enable": enable, "side": side})
+        return dict({"enable": context.is_castling, "side": side})
 
-    def _is_pawn_promotion(self, move_san):
-        enable = False
-        piece_type = ""
-        start_end_move = self.stockfish.start_end_from_san(move_san)
-        start_index = self.stockfish.index_from_san(start_end_move[0])
-        end_index = self.stockfish.index_from_san(start_end_move[1])
-        start_piece = BoardUtils.piece_at_index_str(self.stockfish.board, start_index)
-        if start_piece == 'P':
-            self.stockfish.move(move_san)
-            end_piece = BoardUtils.piece_at_index_str(self.stockfish.board, end_index)
-            if end_piece != 'P':
-                piece_type = end_piece
-                self.stockfish.undo()
-                enable = True
-            self.stockfish.undo()
-
-        if enable:
-            piece = BoardUtils.expand_piece_name(piece_type)
-            return dict({"enable": enable, "piece": piece})
+    @registry.register("pawn_promotion")
+    def _is_pawn_promotion(self, context):
+        if context.move.promotion is not None:
+            piece = BoardUtils.expand_piece_name(chess.piece_symbol(context.move.promotion))
+            return dict({"enable": True, "piece": piece})
         else:
-            return dict({"enable": enable})
+            return dict({"enable": False})
 
-    def _is_skewer(self, move_san):
+    @registry.register("skewer", ENGINE, prefilter=_can_skewer)
+    def _is_skewer(self, context):
 
         enable = False
-        start_end_move = self.stockfish.start_end_from_san(move_san)
 
         # index of best move
-        index = self.stockfish.index_from_san(start_end_move[1])
-
-        self.stockfish.move(move_san)
+        index = context.to_square
+        board_after = context.board_after
 
         # all the squares attacked be the moved piece
-        previously_attacked_pieces = self.stockfish.board.attacks(index)
+        previously_attacked_pieces = context.attacks_after[index]
 
-        # a skewer requires two extra moves for completion
-        best_moves = self.stockfish.best_move_sequence(2)
+        # a skewer requires two extra moves for completion, both taken from one principal variation
+        best_moves = self.stockfish.principal_variation(2, board=board_after)["moves"]
 
         if len(best_moves) < 2:
-            self.stockfish.undo()
             return dict({"enable": enable})
 
-        # indexes for the starting and ending position of the first move in the sequence
-        start_first_move, end_first_move = self.stockfish.start_end_from_san(best_moves[0])
-        start_first_move = self.stockfish.index_from_san(start_first_move)
-        end_first_move = self.stockfish.index_from_san(end_first_move)
+        # the starting and ending position of the first move in the sequence
+        start_first_move, end_first_move = best_moves[0].from_square, best_moves[0].to_square
 
         # type of the attacked and attacking piece to be compared
-        attacked_piece = BoardUtils.piece_at_index_str(self.stockfish.board, start_first_move)
-        attacking_piece = BoardUtils.piece_at_index_str(self.stockfish.board, index)
+        attacked_piece = BoardUtils.piece_at_index_str(board_after, start_first_move)
+        attacking_piece = BoardUtils.piece_at_index_str(board_after, index)
 
-        # get all the attacked squares after the opponent played an optimal move
-        self.stockfish.move(best_moves[0])
-        attacked_pieces = self.stockfish.board.attacks(index)
+        # the squares occupied after the opponent played an optimal move, the attacked piece can only move away
+        # by a plain move since it is worth more than the attacking piece
+        occupied_after_reply = (board_after.occupied & ~chess.BB_SQUARES[start_first_move]) | \
+            chess.BB_SQUARES[end_first_move]
+        opponent_after_reply = (context.opponent_pieces & ~chess.BB_SQUARES[start_first_move]) | \
+            chess.BB_SQUARES[end_first_move]
 
-        # indexes for the second move in the sequence
-        start_second_move, end_second_move = self.stockfish.start_end_from_san(best_moves[1])
-        start_second_move = self.stockfish.index_from_san(start_second_move)
-        end_second_move = self.stockfish.index_from_san(end_second_move)
+        # the starting and ending position of the second move in the sequence
+        start_second_move, end_second_move = best_moves[1].from_square, best_moves[1].to_square
 
-        captured_piece = BoardUtils.piece_at_index_str(self.stockfish.board, end_second_move)
-
-        # undo the moves
-        self.stockfish.undo()
-        self.stockfish.undo()
+        captured_piece = BoardUtils.piece_at_index_str(board_after, end_second_move)
 
         # a skewer requires to attack a higher value piece
         if self.piece_value[attacking_piece] >= self.piece_value[attacked_piece]:
             return dict({"enable": enable})
 
         # the opponent move must move an attacked piece to be a skewer
-        if start_first_move not in previously_attacked_pieces:
+        if not previously_attacked_pieces & chess.BB_SQUARES[start_first_move]:
             return dict({"enable": enable})
 
         # the opponent must take the higher piece to safety
-        if end_first_move in attacked_pieces:
+        if end_first_move != index and BoardUtils.slides_to(board_after.piece_type_at(index), index, end_first_move,
+                                                             occupied_after_reply):
             return dict({"enable": enable})
 
         # the attacking piece must capture a piece in the next move that was defended previously
-        if start_second_move == index and end_second_move not in previously_attacked_pieces and "x" in best_moves[1]:
+        if (start_second_move == index and not previously_attacked_pieces & chess.BB_SQUARES[end_second_move]
+                and opponent_after_reply & chess.BB_SQUARES[end_second_move]):
             enable = True
             attacking_piece = BoardUtils.expand_piece_name(attacking_piece)
             attacked_piece = BoardUtils.expand_piece_name(attacked_piece)
@@ -379,139 +388,93 @@ class TechniquesDetector:
 
         return dict({"enable": enable})
 
-    def _is_forced_checkmate(self, move_san):
+    @registry.register("forced_checkmate", ENGINE, prefilter=_can_force_checkmate)
+    def _is_forced_checkmate(self, context):
 
-        start_end_move = self.stockfish.start_end_from_san(move_san)
-        start_index = self.stockfish.index_from_san(start_end_move[0])
-        start_piece = BoardUtils.piece_at_index_str(self.stockfish.board, start_index)
-        piece = BoardUtils.expand_piece_name(start_piece)
-        self.stockfish.move(move_san)
-        eval_first_item = self.stockfish.first_item_evaluation()
-        self.stockfish.undo()
+        piece = BoardUtils.expand_piece_name(context.piece.symbol())
+        evaluation = self.stockfish.evaluation(board=context.board_after)
 
-        if eval_first_item[0] == 'M':
+        if evaluation.is_mate():
             return dict({"enable": True, "piece": piece})
         return dict({"enable": False})
 
-    def _is_check(self, move_san):
+    @registry.register("check")
+    def _is_check(self, context):
         """
         Determine if the move results in a check.
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: Dictionary with key 'enable' that is True if the move results in a check, False otherwise
                 and key 'piece' that is the piece that delivers check
         """
 
-        start_end_move = self.stockfish.start_end_from_san(move_san)
-        index = self.stockfish.index_from_san(start_end_move[0])
-        piece_type = BoardUtils.piece_at_index_str(self.stockfish.board, index)
-        piece = BoardUtils.expand_piece_name(piece_type)
-        self.stockfish.move(move_san)
-        is_check = self.stockfish.board.is_check()
-        self.stockfish.undo()
-        if is_check:
-            return dict({"enable": is_check, "piece": piece})
+        if context.is_check:
+            piece = BoardUtils.expand_piece_name(context.piece.symbol())
+            return dict({"enable": True, "piece": piece})
         else:
-            return dict({"enable": is_check})
+            return dict({"enable": False})
 
-    def _is_move_check_forced(self, move_san):
+    @registry.register("check_forced")
+    def _is_move_check_forced(self, context):
         """
         Determine if the move is forced by a check
 
+        :param context: MoveContext of the move
         :return: Dictionary with key 'enable' that is True if the move is forced by a check, False otherwise
                 and key 'piece' that is the piece that makes the player not to be in check anymore
         """
 
-        start_end_move = self.stockfish.start_end_from_san(move_san)
-        is_check = self.stockfish.board.is_check()
-        is_checkmate = self.stockfish.board.is_checkmate()
-        piece = BoardUtils.piece_at_index_str(self.stockfish.board, self.stockfish.index_from_san(start_end_move[0]))
+        is_check = context.board.is_check()
+        is_checkmate = context.board.is_checkmate()
 
         if is_check and not is_checkmate:
-            return dict({"enable": True, "piece": piece})
+            return dict({"enable": True, "piece": context.piece.symbol().upper()})
         return dict({"enable": False})
 
-    def _is_pin(self, move_san):
+    @registry.register("pin", CHEAP, prefilter=_can_pin)
+    def _is_pin(self, context):
         """
         Determine if the move results in a pin.
 
-        :param move_san: Move in standard algebraic notation
+        :param context: MoveContext of the move
         :return: True if the move results in a pin, False otherwise
         """
-        # Get the square name of the moved piece
-        moved_square = self.stockfish.start_end_from_san(move_san)[1]
+        board_after = context.board_after
 
-        # Make the move
-        self.stockfish.move(move_san)
+        # Get the square of the moved piece
+        moved_square = context.to_square
 
         # Get the piece that is moved
-        moved_piece = self.stockfish.piece_at_san(moved_square)
-
-        # Check if the moved piece is a pawn, knight or king
-        if moved_piece == 'P' or moved_piece == 'N' or moved_piece == 'K':
-            # Undo the move
-            self.stockfish.undo()
+        moved_piece = board_after.piece_at(moved_square)
 
-            # Return False if the moved piece is a pawn, knight or king
+        # Only sliding pieces attack through the pinned piece
+        if not BoardUtils.is_sliding_piece(moved_piece):
             return dict({"enable": False})
 
         # Get all the pieces that are attacked by the moved piece
-        attacked_pieces = set(self.stockfish.captures_by(moved_square))
-
-        # Make backup of board
-        board_backup = self.stockfish.board.copy()
-
-        for attacked_piece_square in attacked_pieces:
-            # Convert the attacked piece to a chess.Piece object
-            attacked_piece = self.stockfish.piece_at_san(attacked_piece_square)
-
-            # Remove the attacked piece from the board
-            self.stockfish.board.remove_piece_at(self.stockfish.index_from_san(attacked_piece_square))
-
-            # Get all the pieces that are attacked by the moved piece after the attacked piece is removed
-            attacked_pieces_after = set(self.stockfish.captures_by(moved_square))
-
-            # Add the attacked piece back to the board
-            self.stockfish.add_piece_at(chess.Piece(attacked_piece.piece_type, self.stockfish.board.turn),
-                                        self.stockfish.index_from_san(attacked_piece_square))
-
-            # Check if another piece is attacked by the moved piece after the attacked piece is removed
-            if len(attacked_pieces_after) > 0:
-                # Get the other attacked piece from behind the removed attacked piece
-                other_attacked_pieces = attacked_pieces_after.difference(attacked_pieces)
-
-                # Get the first other attacked piece
-                if len(other_attacked_pieces) > 0:
-                    other_attacked_piece = other_attacked_pieces.pop()
+        attacked_pieces = context.attacks_after[moved_square] & context.opponent_pieces
+
+        for attacked_piece_square in chess.scan_forward(attacked_pieces):
+            # Get the first piece behind the attacked piece, on the line of the moved piece
+            behind_square = BoardUtils.x_ray_target(moved_square, attacked_piece_square, board_after.occupied)
+            if behind_square is None or not context.opponent_pieces & chess.BB_SQUARES[behind_square]:
+                continue
+
+            attacked_piece = board_after.piece_at(attacked_piece_square)
+            other_attacked_piece = board_after.piece_at(behind_square)
+
+            # Check if there is a pin
+            if BoardUtils.is_pin_compatible(moved_piece, attacked_piece, other_attacked_piece):
+                pinned = BoardUtils.expand_piece_name(str(attacked_piece))
+                defended = BoardUtils.expand_piece_name(str(other_attacked_piece))
+
+                # Return absolute or relative pin
+                if other_attacked_piece.piece_type == 6:
+                    # Return absolute pin if the attacked piece is a king
+                    return dict({"enable": True, "type": "absolute", "pinned": pinned, "defended": defended})
                 else:
-                    continue
-
-                # Convert the other attacked piece to a chess.Piece object
-                other_attacked_piece = self.stockfish.piece_at_san(other_attacked_piece)
-
-                # Check if there is a pin
-                if BoardUtils.is_pin_compatible(moved_piece, attacked_piece, other_attacked_piece):
-                    # Restore the board
-                    self.stockfish.board = board_backup
-
-                    # Undo the move
-                    self.stockfish.undo()
-                    pinned = BoardUtils.expand_piece_name(str(attacked_piece))
-                    defended = BoardUtils.expand_piece_name(str(other_attacked_piece))
-
-                    # Return absolute or relative pin
-                    if other_attacked_piece.piece_type == 6:
-                        # Return absolute pin if the attacked piece is a king
-                        return dict({"enable": True, "type": "absolute", "pinned": pinned, "defended": defended})
-                    else:
-                        # Return relative pin if the attacked piece is not a king
-                        return dict({"enable": True, "type": "relative", "pinned": pinned, "defended": defended})
-
-        # Restore the board
-        self.stockfish.board = board_backup
-
-        # Undo the move
-        self.stockfish.undo()
+                    # Return relative pin if the attacked piece is not a king
+                    return dict({"enable": True, "type": "relative", "pinned": pinned, "defended": defended})
 
         # Return False if there is no pin
         return dict({"enable": False})
@@ -1,5 +1,10 @@
 from back.stockfish_tools.stockfish import Stockfish
+from back.stockfish_tools.engine_pool import AsyncEnginePool, EnginePool
+from back.stockfish_tools.evaluation import Evaluation
+from back.stockfish_tools.game_annotator import GameAnnotator
+from back.stockfish_tools.opening_book import OpeningBook
 from back.stockfish_tools.stockfish_explainer import StockfishExplainer
 from back.stockfish_tools.explanation_builder import ExplanationBuilder
 
-__all__ = ["Stockfish", "StockfishExplainer"]
+__all__ = ["Stockfish", "StockfishExplainer", "EnginePool", "AsyncEnginePool", "Evaluation", "GameAnnotator",
+           "OpeningBook"]
@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+
+import chess.polyglot
+
+
+class AnalysisCache:
+    """
+    Class used to remember engine searches, so analysed positions are not searched again
+
+    """
+
+    def __init__(self, max_size=4096):
+        """
+        Constructor for AnalysisCache class
+
+        :param max_size: maximum number of positions kept. The least recently used position is dropped first
+        """
+
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(board):
+        """
+        Get the key of a position
+
+        :param board: board of the position
+        :return: tuple of (zobrist hash, side to move, castling rights, en passant square)
+        """
+
+        return chess.polyglot.zobrist_hash(board), board.turn, board.castling_rights, board.ep_square
+
+    @staticmethod
+    def covers(entry, time_limit=None, depth=None, nodes=None):
+        """
+        Check if a remembered search is at least as long, or as deep, as a requested search
+
+        :param entry: remembered search
+        :param time_limit: time limit of the requested search
+        :param depth: depth limit of the requested search
+        :param nodes: nodes limit of the requested search
+        :return: True if the remembered search can answer the request, False otherwise
+        """
+
+        if time_limit is None and depth is None and nodes is None:
+            return True
+        if time_limit is not None and entry["time"] >= time_limit:
+            return True
+        if depth is not None and entry["depth"] >= depth:
+            return True
+        if nodes is not None and entry.get("nodes", 0) >= nodes:
+            return True
+        return False
+
+    def get(self, board, time_limit=None, depth=None, nodes=None):
+        """
+        Get the cached search of a position, if it is at least as deep as the requested search
+
+        :param board: board of the position
+        :param time_limit: time limit of the requested search
+        :param depth: depth limit of the requested search
+        :param nodes: nodes limit of the requested search
+        :return: dictionary with keys 'score', 'best_move', 'pv', 'depth' and 'time', or None on a miss
+        """
+
+        key = self.key(board)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            # the cached search must cover the requested one
+            if not self.covers(entry, time_limit, depth, nodes):
+                return None
+
+            # mark the position as recently used
+            self._entries.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def entry(info, time_limit=0.0):
+        """
+        Build the entry remembered for an engine search
+
+        :param info: engine information about the position, as returned by analyse
+        :param time_limit: time limit the search ran with
+        :return: dictionary with keys 'score', 'best_move', 'pv', 'depth', 'nodes' and 'time'
+        """
+
+        pv = list(info.get("pv", []))
+        return {
+            "score": info.get("score"),
+            "best_move": pv[0] if pv else None,
+            "pv": pv,
+            "depth": info.get("depth", 0),
+            "nodes": info.get("nodes", 0),
+            "time": max(time_limit or 0.0, info.get("time", 0.0)),
+        }
+
+    def put(self, board, info, time_limit=0.0):
+        """
+        Remember the search of a position
+        A shallower search never replaces a deeper one
+
+        :param board: board of the position
+        :param info: engine information about the position, as returned by analyse, or an entry
+        :param time_limit: time limit the search ran with
+        :return: the cached entry
+        """
+
+        entry = info if "best_move" in info else self.entry(info, time_limit)
+
+        key = self.key(board)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached["depth"] > entry["depth"]:
+                self._entries.move_to_end(key)
+                return cached
+
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            # drop the least recently used positions
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def clear(self):
+        """
+        Forget all the cached positions
+
+        :return: None
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
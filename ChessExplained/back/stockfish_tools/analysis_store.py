@@ -0,0 +1,151 @@
+import time
+
+import chess
+import chess.engine
+
+from back.stockfish_tools.analysis_cache import AnalysisCache
+from back.stockfish_tools.sqlite_store import SQLiteStore
+
+
+class AnalysisStore(SQLiteStore):
+    """
+    Class used to keep engine searches on disk, so they survive between sessions
+
+    """
+
+    TABLE = "analyses"
+    KEY_COLUMNS = ("position", "turn", "castling", "ep", "settings")
+
+    def __init__(self, path, max_entries=200000):
+        """
+        Constructor for AnalysisStore class
+        The database is opened lazily, the first time it is needed
+
+        :param path: path to the SQLite database file
+        :param max_entries: maximum number of positions kept. The least recently used positions are dropped first
+        """
+
+        super().__init__(path, max_entries)
+
+    def _create(self, connection):
+        """
+        Create the table of the searches if needed
+
+        :param connection: sqlite3 connection
+        :return: None
+        """
+
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "position INTEGER NOT NULL, turn INTEGER NOT NULL, castling INTEGER NOT NULL, ep INTEGER NOT NULL, "
+            "settings TEXT NOT NULL, cp INTEGER, mate INTEGER, best_move TEXT, pv TEXT NOT NULL, "
+            "depth INTEGER NOT NULL, time REAL NOT NULL, used REAL NOT NULL, nodes INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (position, turn, castling, ep, settings))")
+        connection.execute("CREATE INDEX IF NOT EXISTS analyses_used ON analyses (used)")
+
+        # stores written before the number of nodes was kept
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(analyses)")]
+        if "nodes" not in columns:
+            connection.execute("ALTER TABLE analyses ADD COLUMN nodes INTEGER NOT NULL DEFAULT 0")
+
+    @staticmethod
+    def key(board, settings):
+        """
+        Get the primary key of a position, as stored on disk
+
+        :param board: board of the position
+        :param settings: engine settings the position was searched with
+        :return: tuple of column values (position, turn, castling, ep, settings)
+        """
+
+        position, turn, castling, ep = AnalysisCache.key(board)
+
+        # sqlite integers are signed 64 bit
+        if position >= 1 << 63:
+            position -= 1 << 64
+
+        # castling rights are a bitboard of the rook squares, keep only the four corners
+        castling = (int(bool(castling & chess.BB_H1)) | int(bool(castling & chess.BB_A1)) << 1 |
+                    int(bool(castling & chess.BB_H8)) << 2 | int(bool(castling & chess.BB_A8)) << 3)
+
+        return position, int(turn), castling, -1 if ep is None else ep, settings
+
+    def get(self, board, settings="", time_limit=None, depth=None, nodes=None):
+        """
+        Get the stored search of a position, if it is at least as deep as the requested search
+
+        :param board: board of the position
+        :param settings: engine settings the search must have been made with
+        :param time_limit: time limit of the requested search
+        :param depth: depth limit of the requested search
+        :param nodes: nodes limit of the requested search
+        :return: dictionary with keys 'score', 'best_move', 'pv', 'depth', 'nodes' and 'time', or None on a miss
+        """
+
+        key = self.key(board, settings)
+        connection = self._connection()
+
+        row = connection.execute(
+            "SELECT cp, mate, best_move, pv, depth, nodes, time FROM analyses "
+            "WHERE position = ? AND turn = ? AND castling = ? AND ep = ? AND settings = ?", key).fetchone()
+        if row is None:
+            return None
+
+        cp, mate, best_move, pv, depth_searched, nodes_searched, time_searched = row
+
+        # scores are stored from the point of view of white, the engine reports them for the side to move
+        if mate is not None:
+            score = chess.engine.PovScore(chess.engine.Mate(mate), chess.WHITE)
+        elif cp is not None:
+            score = chess.engine.PovScore(chess.engine.Cp(cp), chess.WHITE)
+        else:
+            score = None
+        if score is not None:
+            score = chess.engine.PovScore(score.pov(board.turn), board.turn)
+
+        entry = {
+            "score": score,
+            "best_move": chess.Move.from_uci(best_move) if best_move else None,
+            "pv": [chess.Move.from_uci(move) for move in pv.split()],
+            "depth": depth_searched,
+            "nodes": nodes_searched,
+            "time": time_searched,
+        }
+
+        if not AnalysisCache.covers(entry, time_limit, depth, nodes):
+            return None
+
+        # mark the position as recently used
+        self._touch(key)
+        return entry
+
+    def put(self, board, entry, settings=""):
+        """
+        Store the search of a position
+        A shallower search never replaces a deeper one
+
+        :param board: board of the position
+        :param entry: search to be stored, as built by AnalysisCache.entry
+        :param settings: engine settings the position was searched with
+        :return: None
+        """
+
+        key = self.key(board, settings)
+        score = entry["score"]
+
+        cp = mate = None
+        if score is not None:
+            mate = score.white().mate()
+            cp = score.white().score() if mate is None else None
+
+        best_move = entry["best_move"].uci() if entry["best_move"] else None
+        pv = " ".join(move.uci() for move in entry["pv"])
+
+        self._write(
+            "INSERT INTO analyses (position, turn, castling, ep, settings, cp, mate, best_move, pv, depth, time, used, "
+            "nodes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (position, turn, castling, ep, settings) DO UPDATE SET "
+            "cp = excluded.cp, mate = excluded.mate, best_move = excluded.best_move, pv = excluded.pv, "
+            "depth = excluded.depth, time = excluded.time, used = excluded.used, nodes = excluded.nodes "
+            "WHERE excluded.depth >= analyses.depth",
+            key + (cp, mate, best_move, pv, entry["depth"], entry["time"], time.time(), entry.get("nodes", 0)))
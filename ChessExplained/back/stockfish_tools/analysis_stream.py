@@ -0,0 +1,136 @@
+import threading
+
+from back.stockfish_tools.evaluation import Evaluation
+
+
+class AnalysisStream:
+    """
+    Class used to follow an engine search depth by depth, as the engine reports it
+
+    """
+
+    def __init__(self, stockfish, board, limits):
+        """
+        Constructor for AnalysisStream class
+        The search starts when the stream is iterated
+
+        :param stockfish: Instance of Stockfish class
+        :param board: board to be searched
+        :param limits: SearchLimits of the search
+        """
+
+        self.stockfish = stockfish
+        self.board = board
+        self.limits = limits
+
+        self._analysis = None
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def _is_iteration(info, last_depth):
+        """
+        Check if engine information reports a new completed iteration
+
+        :param info: engine information
+        :param last_depth: depth of the previous iteration
+        :return: True if the information is a new iteration, False otherwise
+        """
+
+        return "score" in info and info.get("pv") and info.get("depth") not in (None, last_depth)
+
+    def _evaluation(self, info):
+        """
+        Build the evaluation of one iteration
+
+        :param info: engine information
+        :return: Evaluation for the player to move
+        """
+
+        return Evaluation.from_score(info["score"], self.board.turn, info["depth"], info.get("nodes", 0), info["pv"])
+
+    def __iter__(self):
+        """
+        Search the board, yielding an Evaluation every time the engine completes a depth
+        Breaking out of the loop or calling stop ends the search
+
+        :return: generator of Evaluation
+        """
+
+        last_depth = None
+        history = []
+        with self.stockfish.pool.lease() as engine:
+            with engine.analysis(self.board, self.limits.engine_limit()) as analysis:
+                self._analysis = analysis
+                if self._stopped.is_set():
+                    analysis.stop()
+
+                for info in analysis:
+                    if self._is_iteration(info, last_depth):
+                        last_depth = info["depth"]
+                        yield self._evaluation(info)
+
+                        # an adaptive search ends once the best move is stable
+                        if self.limits.adaptive and self.stockfish.is_stable(info, history, self.limits):
+                            analysis.stop()
+
+                final = dict(analysis.info)
+
+        # the deepest iteration answers later requests for the position
+        if final.get("pv"):
+            time_limit = None if self._stopped.is_set() else self.limits.completed_time()
+            self.stockfish.remember(self.board, final, time_limit)
+
+    def stop(self):
+        """
+        Stop the search, it can be called from any thread
+
+        :return: None
+        """
+
+        self._stopped.set()
+        if self._analysis is not None:
+            self._analysis.stop()
+
+
+class AsyncAnalysisStream(AnalysisStream):
+    """
+    Class used to follow an engine search depth by depth from an event loop
+
+    """
+
+    def __iter__(self):
+        raise TypeError("Use async for to iterate an AsyncAnalysisStream")
+
+    async def _iterate(self):
+        """
+        Search the board, yielding an Evaluation every time the engine completes a depth
+
+        :return: async generator of Evaluation
+        """
+
+        last_depth = None
+        history = []
+        async with self.stockfish.async_pool.lease() as engine:
+            with await engine.analysis(self.board, self.limits.engine_limit()) as analysis:
+                self._analysis = analysis
+                if self._stopped.is_set():
+                    analysis.stop()
+
+                async for info in analysis:
+                    if self._is_iteration(info, last_depth):
+                        last_depth = info["depth"]
+                        yield self._evaluation(info)
+
+                        # an adaptive search ends once the best move is stable
+                        if self.limits.adaptive and self.stockfish.is_stable(info, history, self.limits):
+                            analysis.stop()
+
+                final = dict(analysis.info)
+
+        # the deepest iteration answers later requests for the position
+        if final.get("pv"):
+            time_limit = None if self._stopped.is_set() else self.limits.completed_time()
+            self.stockfish.remember(self.board, final, time_limit)
+
+    def __aiter__(self):
+        return self._iterate()
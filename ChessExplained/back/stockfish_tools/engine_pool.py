@@ -0,0 +1,439 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+import chess.engine
+
+from back.utils.metrics import MetricsRegistry
+
+
+def supported_options(engine_options, options):
+    """
+    Keep the UCI options known by an engine, clamped to the range it accepts
+
+    :param engine_options: options reported by the engine
+    :param options: dictionary of UCI option names and values
+    :return: dictionary of the supported options
+    """
+
+    supported = {}
+    for name, value in options.items():
+        option = engine_options.get(name)
+        if option is None:
+            continue
+        if option.type == "spin":
+            value = max(option.min, min(option.max, value))
+        supported[name] = value
+    return supported
+
+
+class PoolMetrics:
+    """
+    Class used to hold the metrics of the engine processes of a pool
+
+    """
+
+    def __init__(self, kind):
+        """
+        Constructor for PoolMetrics class
+
+        :param kind: kind of pool, 'sync' or 'async'
+        """
+
+        metrics = MetricsRegistry.default
+        self.spawns = metrics.counter("engine_spawns_total", "Engine processes started", ("pool",)).labels(kind)
+        self.discards = metrics.counter("engine_discards_total", "Engine processes dropped after crashing or hanging",
+                                        ("pool",)).labels(kind)
+        self.spawn_seconds = metrics.histogram("engine_spawn_seconds", "Time to start and configure an engine process",
+                                               ("pool",)).labels(kind)
+
+
+class EnginePool:
+    """
+    Class used to keep warm Stockfish processes alive and lease them to callers
+
+    """
+
+    def __init__(self, engine_path, size=1, timeout=10.0, options=None, acquire_timeout=60.0):
+        """
+        Constructor for EnginePool class
+        Engines are started lazily, the first time they are needed
+
+        :param engine_path: path to Stockfish engine on personal computer
+        :param size: maximum number of engine processes kept alive
+        :param timeout: seconds after which an unresponsive engine is considered hung
+        :param options: dictionary of UCI options every engine is configured with
+        :param acquire_timeout: seconds to wait for an engine when all of them are leased, None to wait forever
+        """
+
+        self.engine_path = engine_path
+        self.size = size
+        self.timeout = timeout
+        self.options = options or {}
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = queue.LifoQueue()
+        self._engines = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.metrics = PoolMetrics("sync")
+
+    def _spawn(self):
+        """
+        Start a new engine process
+
+        :return: the started engine
+        """
+
+        with self.metrics.spawn_seconds.time():
+            engine = chess.engine.SimpleEngine.popen_uci(self.engine_path, timeout=self.timeout)
+            try:
+                engine.configure(supported_options(engine.options, self.options))
+            except Exception:
+                engine.close()
+                raise
+        self.metrics.spawns.inc()
+        return engine
+
+    def _is_alive(self, engine):
+        """
+        Check that an engine still answers
+
+        :param engine: engine to be checked
+        :return: True if the engine answered, False otherwise
+        """
+
+        try:
+            engine.ping()
+            return True
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, concurrent.futures.TimeoutError):
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Lease an engine, starting a new one if the pool is not full, or waiting for one otherwise
+
+        :param timeout: seconds to wait for an engine when all of them are leased. Default is acquire_timeout
+        :return: leased engine
+        """
+
+        if self._closed:
+            raise RuntimeError("Engine pool is closed")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_spawn = len(self._engines) < self.size
+            if can_spawn:
+                # reserve the slot before the (slow) process start
+                self._engines.append(None)
+
+        if can_spawn:
+            try:
+                engine = self._spawn()
+            except Exception:
+                with self._lock:
+                    self._engines.remove(None)
+                raise
+            with self._lock:
+                self._engines[self._engines.index(None)] = engine
+            return engine
+
+        # the pool is full, wait for an engine to be released
+        timeout = self.acquire_timeout if timeout is None else timeout
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No engine was released within {timeout} seconds") from None
+
+    def release(self, engine, check=False):
+        """
+        Give a leased engine back to the pool
+
+        :param engine: engine to be released
+        :param check: True to make sure the engine still answers first, e.g. after its lease failed
+        :return: None
+        """
+
+        if self._closed:
+            self._quit(engine)
+            return
+
+        # a broken engine is replaced, so the next lease does not fail as well
+        if check and not self._is_alive(engine):
+            self.discard(engine)
+            return
+        self._idle.put(engine)
+
+    def discard(self, engine):
+        """
+        Remove a broken engine from the pool, so a fresh one is started on the next lease
+
+        :param engine: engine to be removed
+        :return: None
+        """
+
+        with self._lock:
+            if engine in self._engines:
+                self._engines.remove(engine)
+        self.metrics.discards.inc()
+        self._quit(engine)
+
+    @contextmanager
+    def lease(self):
+        """
+        Context manager leasing an engine for the duration of a with block
+        Engines that crash or time out inside the block are recycled, engines of a block failing for another reason
+        are checked before they are leased again
+
+        :return: leased engine
+        """
+
+        engine = self.acquire()
+        try:
+            yield engine
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, concurrent.futures.TimeoutError):
+            self.discard(engine)
+            raise
+        except BaseException:
+            self.release(engine, check=True)
+            raise
+        else:
+            self.release(engine)
+
+    def close(self):
+        """
+        Quit all the engines of the pool
+
+        :return: None
+        """
+
+        self._closed = True
+        with self._lock:
+            engines = [engine for engine in self._engines if engine is not None]
+            self._engines = []
+
+        for engine in engines:
+            self._quit(engine)
+
+    @staticmethod
+    def _quit(engine):
+        """
+        Stop an engine process, killing it if it does not answer
+
+        :param engine: engine to be stopped
+        :return: None
+        """
+
+        try:
+            engine.quit()
+        except Exception:
+            engine.close()
+
+
+class AsyncEnginePool:
+    """
+    Class used to keep warm Stockfish processes alive for asyncio callers
+
+    """
+
+    def __init__(self, engine_path, size=1, timeout=10.0, options=None, acquire_timeout=60.0):
+        """
+        Constructor for AsyncEnginePool class
+        Engines are started lazily, inside the event loop that first needs them
+
+        :param engine_path: path to Stockfish engine on personal computer
+        :param size: maximum number of engine processes kept alive
+        :param timeout: seconds after which an unresponsive engine is considered hung
+        :param options: dictionary of UCI options every engine is configured with
+        :param acquire_timeout: seconds to wait for an engine when all of them are leased, None to wait forever
+        """
+
+        self.engine_path = engine_path
+        self.size = size
+        self.timeout = timeout
+        self.options = options or {}
+        self.acquire_timeout = acquire_timeout
+
+        self._loop = None
+        self._idle = None
+        self._engines = []
+
+        self.metrics = PoolMetrics("async")
+
+    def _bind_loop(self):
+        """
+        Bind the pool to the running event loop
+        Engines started by a previous event loop cannot be reused, they are stopped
+
+        :return: None
+        """
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._stop_engines(self._loop, [engine for engine in self._engines if engine is not None])
+            self._loop = loop
+            self._idle = asyncio.LifoQueue()
+            self._engines = []
+
+    def _stop_engines(self, loop, engines):
+        """
+        Stop the engines of another event loop
+
+        :param loop: event loop the engines were started in
+        :param engines: engine protocols to be stopped
+        :return: None
+        """
+
+        for engine in engines:
+            if loop is not None and loop.is_running():
+                # the loop lives on in another thread, let it quit its engine
+                asyncio.run_coroutine_threadsafe(self._quit(engine), loop)
+                continue
+            try:
+                # a closed loop cannot run the quit command, the process is killed instead
+                engine.transport.kill()
+            except Exception:
+                pass
+
+    async def _spawn(self):
+        """
+        Start a new engine process
+
+        :return: the started engine protocol
+        """
+
+        with self.metrics.spawn_seconds.time():
+            transport, engine = await asyncio.wait_for(chess.engine.popen_uci(self.engine_path), self.timeout)
+            try:
+                await engine.configure(supported_options(engine.options, self.options))
+            except BaseException:
+                transport.close()
+                raise
+        self.metrics.spawns.inc()
+        return engine
+
+    async def _is_alive(self, engine):
+        """
+        Check that an engine still answers
+
+        :param engine: engine to be checked
+        :return: True if the engine answered, False otherwise
+        """
+
+        try:
+            await asyncio.wait_for(engine.ping(), self.timeout)
+            return True
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, asyncio.TimeoutError):
+            return False
+
+    async def acquire(self, timeout=None):
+        """
+        Lease an engine, starting a new one if the pool is not full, or waiting for one otherwise
+
+        :param timeout: seconds to wait for an engine when all of them are leased. Default is acquire_timeout
+        :return: leased engine protocol
+        """
+
+        self._bind_loop()
+
+        if self._idle.empty() and len(self._engines) < self.size:
+            # reserve the slot before the (slow) process start
+            self._engines.append(None)
+            try:
+                engine = await self._spawn()
+            except BaseException:
+                self._engines.remove(None)
+                raise
+            self._engines[self._engines.index(None)] = engine
+            return engine
+
+        # wait for an engine to be released
+        timeout = self.acquire_timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(self._idle.get(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No engine was released within {timeout} seconds") from None
+
+    async def release(self, engine, check=False):
+        """
+        Give a leased engine back to the pool
+
+        :param engine: engine to be released
+        :param check: True to make sure the engine still answers first, e.g. after its lease failed
+        :return: None
+        """
+
+        # a broken engine is replaced, so the next lease does not fail as well
+        if check and not await self._is_alive(engine):
+            await self.discard(engine)
+            return
+        self._idle.put_nowait(engine)
+
+    async def discard(self, engine):
+        """
+        Remove a broken engine from the pool, so a fresh one is started on the next lease
+
+        :param engine: engine to be removed
+        :return: None
+        """
+
+        if engine in self._engines:
+            self._engines.remove(engine)
+        self.metrics.discards.inc()
+        await self._quit(engine)
+
+    @asynccontextmanager
+    async def lease(self):
+        """
+        Async context manager leasing an engine for the duration of an async with block
+        Engines that crash or time out inside the block are recycled, engines of a block failing for another reason
+        are checked before they are leased again
+
+        :return: leased engine protocol
+        """
+
+        engine = await self.acquire()
+        try:
+            yield engine
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, asyncio.TimeoutError):
+            await self.discard(engine)
+            raise
+        except BaseException:
+            await self.release(engine, check=True)
+            raise
+        else:
+            await self.release(engine)
+
+    async def close(self):
+        """
+        Quit all the engines of the pool
+
+        :return: None
+        """
+
+        engines = [engine for engine in self._engines if engine is not None]
+        self._engines = []
+        self._idle = asyncio.LifoQueue()
+
+        for engine in engines:
+            await self._quit(engine)
+
+    async def _quit(self, engine):
+        """
+        Stop an engine process, killing it if it does not answer
+
+        :param engine: engine protocol to be stopped
+        :return: None
+        """
+
+        try:
+            await asyncio.wait_for(engine.quit(), self.timeout)
+        except Exception:
+            engine.transport.close()
@@ -0,0 +1,138 @@
+import os
+import sys
+
+
+class EngineProfile:
+    """
+    Class used to describe the UCI options the engine processes are started with
+
+    """
+
+    def __init__(self, name, threads=None, hash_mb=None, core_share=1.0, memory_share=0.25, max_hash_mb=None,
+                 multipv=1, skill=20):
+        """
+        Constructor for EngineProfile class
+        Threads and hash that are not given are sized from the hardware and shared between the pooled engines
+
+        :param name: name of the profile
+        :param threads: number of search threads of each engine
+        :param hash_mb: size of the hash table of each engine, in MB
+        :param core_share: fraction of the CPU cores used by all the engines together, if threads is not given
+        :param memory_share: fraction of the available memory used by all the engines together, if hash_mb is not
+                             given
+        :param max_hash_mb: largest hash table of each engine, in MB, if hash_mb is not given. Default is no limit
+        :param multipv: number of lines searched when several candidate moves are requested
+        :param skill: Stockfish skill level, from 0 to 20
+        """
+
+        self.name = name
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.core_share = core_share
+        self.memory_share = memory_share
+        self.max_hash_mb = max_hash_mb
+        self.multipv = multipv
+        self.skill = skill
+
+    @staticmethod
+    def available_memory_mb():
+        """
+        Get the memory currently available on the computer, including the caches the system can reclaim
+
+        :return: available memory in MB, None if it cannot be found
+        """
+
+        if sys.platform == "win32":
+            import ctypes
+
+            class MemoryStatus(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+            status = MemoryStatus()
+            status.dwLength = ctypes.sizeof(MemoryStatus)
+            if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return None
+            return status.ullAvailPhys // (1024 * 1024)
+
+        # the free pages leave out the page cache, which Linux gives back when it is needed
+        try:
+            with open("/proc/meminfo") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) // 1024
+        except (OSError, ValueError):
+            pass
+
+        try:
+            return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") // (1024 * 1024)
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    def options(self, pool_size=1, pools=1):
+        """
+        Get the UCI options of each engine of a pool
+
+        :param pool_size: number of engines of each pool sharing the hardware
+        :param pools: number of pools whose engines may be alive at the same time. Default is 1
+        :return: dictionary of UCI option names and values
+        """
+
+        # the threads of an idle engine cost nothing, only the engines searching together share the cores
+        threads = self.threads
+        if threads is None:
+            threads = max(1, int((os.cpu_count() or 1) * self.core_share) // pool_size)
+
+        # the hash table of every started engine stays allocated, so all of them share the memory budget
+        hash_mb = self.hash_mb
+        if hash_mb is None:
+            memory = self.available_memory_mb()
+            hash_mb = 16 if memory is None else max(16, int(memory * self.memory_share) // (pool_size * pools))
+            if self.max_hash_mb is not None:
+                hash_mb = min(hash_mb, self.max_hash_mb)
+
+            # Stockfish rounds the hash size down to a power of two
+            hash_mb = 1 << (hash_mb.bit_length() - 1)
+
+        # MultiPV is passed with each search, the engine library does not allow configuring it
+        return {"Threads": threads, "Hash": hash_mb, "Skill Level": self.skill}
+
+    def settings_key(self):
+        """
+        Get the part of the profile that changes the search results, used to keep searches apart
+
+        :return: string describing the profile
+        """
+
+        return f"skill={self.skill}"
+
+    @classmethod
+    def of(cls, profile):
+        """
+        Get a profile from its name or a profile
+
+        :param profile: name of a known profile or EngineProfile instance
+        :return: EngineProfile instance
+        """
+
+        if isinstance(profile, cls):
+            return profile
+        try:
+            return PROFILES[profile]
+        except KeyError:
+            raise ValueError(f"Unknown engine profile: {profile}")
+
+    def __repr__(self):
+        return f"EngineProfile({self.name})"
+
+
+PROFILES = {
+    # leave half of the cores to the interface, a short search does not fill a larger hash table
+    "interactive": EngineProfile("interactive", core_share=0.5, max_hash_mb=256),
+    "batch": EngineProfile("batch", memory_share=0.5, multipv=3),
+    "low_memory": EngineProfile("low_memory", threads=1, hash_mb=16),
+    "auto": EngineProfile("auto"),
+}
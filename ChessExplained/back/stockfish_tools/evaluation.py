@@ -0,0 +1,99 @@
+import chess
+
+
+class Evaluation:
+    """
+    Class used to hold the engine evaluation of a position
+
+    """
+
+    __slots__ = ("cp", "mate", "pov", "wdl", "depth", "nodes", "pv")
+
+    # score given to a forced mate, in centipawns
+    MATE_SCORE = 100000
+
+    def __init__(self, cp=None, mate=None, pov=chess.WHITE, wdl=None, depth=0, nodes=0, pv=()):
+        """
+        Constructor for Evaluation class
+
+        :param cp: score in centipawns, None if a mate was found
+        :param mate: number of moves until mate, negative if the player is mated, None if no mate was found
+        :param pov: color of the player the score is given for
+        :param wdl: tuple of (wins, draws, losses) per mille expected for the player
+        :param depth: depth of the search
+        :param nodes: number of searched nodes
+        :param pv: principal variation as a tuple of chess.Move
+        """
+
+        self.cp = cp
+        self.mate = mate
+        self.pov = pov
+        self.wdl = wdl
+        self.depth = depth
+        self.nodes = nodes
+        self.pv = tuple(pv)
+
+    @classmethod
+    def from_score(cls, score, pov, depth=0, nodes=0, pv=()):
+        """
+        Build an evaluation from an engine score
+
+        :param score: chess.engine.PovScore reported by the engine
+        :param pov: color of the player the score is given for
+        :param depth: depth of the search
+        :param nodes: number of searched nodes
+        :param pv: principal variation
+        :return: Evaluation instance
+        """
+
+        relative = score.pov(pov)
+        wins, draws, losses = relative.wdl()
+        return cls(cp=relative.score(), mate=relative.mate(), pov=pov, wdl=(wins, draws, losses), depth=depth,
+                   nodes=nodes, pv=pv)
+
+    @classmethod
+    def from_entry(cls, entry, pov):
+        """
+        Build an evaluation from a cached engine search
+
+        :param entry: dictionary with keys 'score', 'pv', 'depth' and 'nodes'
+        :param pov: color of the player the score is given for
+        :return: Evaluation instance
+        """
+
+        return cls.from_score(entry["score"], pov, entry["depth"], entry.get("nodes", 0), entry["pv"])
+
+    def is_mate(self):
+        """
+        Check if the engine found a forced mate, for either player
+
+        :return: True if a mate was found, False otherwise
+        """
+
+        return self.mate is not None
+
+    def score(self):
+        """
+        Get the score in centipawns, forced mates count as MATE_SCORE
+
+        :return: score in centipawns for the player
+        """
+
+        if self.mate is None:
+            return self.cp
+
+        # a mate in 0 means the player is already mated
+        return self.MATE_SCORE if self.mate > 0 else -self.MATE_SCORE
+
+    def advantage(self):
+        """
+        Get the player in advantage
+
+        :return: color of the player in advantage
+        """
+
+        return self.pov if self.score() > 0 else not self.pov
+
+    def __repr__(self):
+        value = f"mate={self.mate}" if self.mate is not None else f"cp={self.cp}"
+        return f"Evaluation({value}, pov={chess.COLOR_NAMES[self.pov]}, depth={self.depth})"
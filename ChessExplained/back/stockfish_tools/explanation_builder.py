@@ -1,8 +1,24 @@
+from back.detectors.detector_registry import CHEAP
+
+
 class ExplanationBuilder:
     def __init__(self, dictionary):
         self.dictionary = dictionary
+
+        # the engine detectors are only run when no cheap technique explains the move, e.g. a move ending the game
+        # leaves nothing for them to find. Plain dictionaries hold results that are all known already
+        tier = getattr(dictionary, "tier", lambda name: CHEAP)
+        self.engine_techniques = [name for name in dictionary if tier(name) > CHEAP]
+        self.consult_engine = not any(dictionary[name]['enable'] for name in dictionary
+                                      if name not in self.engine_techniques)
+
         self.build_explanation()
 
+    def any_technique(self):
+        if not self.consult_engine:
+            return True
+        return any(self.dictionary[name]['enable'] for name in self.engine_techniques)
+
     def build_explanation(self):
         explanation = ""
         explanation += self.en_passant_explanation(self.dictionary['en_passant'])
@@ -17,8 +33,9 @@ class ExplanationBuilder:
         explanation += self.sacrifice_explanation(self.dictionary['sacrifice'])
         explanation += self.pawn_promotion_explanation(self.dictionary['pawn_promotion'])
         explanation += self.discovered_attack_explanation(self.dictionary['discovered_attack'])
-        explanation += self.forced_checkmate_explanation(self.dictionary['forced_checkmate'])
-        explanation += self.skewer_explanation(self.dictionary['skewer'])
+        if self.consult_engine:
+            explanation += self.forced_checkmate_explanation(self.dictionary['forced_checkmate'])
+            explanation += self.skewer_explanation(self.dictionary['skewer'])
         explanation += self.pin_explanation(self.dictionary['pin'])
         explanation += self.fork_explanation(self.dictionary['fork'])
 
@@ -116,6 +133,8 @@ class ExplanationBuilder:
         if info['enable'] is False:
             return ""
 
+        if info.get('exchange', 0) > 0:
+            return f"It captures the {info['captured']} and wins material."
         return f"It captures the {info['captured']}."
 
     @staticmethod
@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import OrderedDict
+
+from back.stockfish_tools.analysis_cache import AnalysisCache
+from back.stockfish_tools.analysis_store import AnalysisStore
+from back.stockfish_tools.sqlite_store import SQLiteStore
+from back.utils.metrics import MetricsRegistry
+
+
+class ExplanationStore(SQLiteStore):
+    """
+    Class used to keep explanations on disk, so they survive between sessions
+
+    """
+
+    TABLE = "explanations"
+    KEY_COLUMNS = ("position", "turn", "castling", "ep", "settings", "move")
+
+    def __init__(self, path, max_entries=50000):
+        """
+        Constructor for ExplanationStore class
+        The database is opened lazily, the first time it is needed
+
+        :param path: path to the SQLite database file, it can be shared with an AnalysisStore
+        :param max_entries: maximum number of explanations kept. The least recently used ones are dropped first
+        """
+
+        super().__init__(path, max_entries)
+
+    def _create(self, connection):
+        """
+        Create the table of the explanations if needed
+
+        :param connection: sqlite3 connection
+        :return: None
+        """
+
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS explanations ("
+            "position INTEGER NOT NULL, turn INTEGER NOT NULL, castling INTEGER NOT NULL, ep INTEGER NOT NULL, "
+            "settings TEXT NOT NULL, move TEXT NOT NULL, explanation TEXT NOT NULL, used REAL NOT NULL, "
+            "PRIMARY KEY (position, turn, castling, ep, settings, move))")
+        connection.execute("CREATE INDEX IF NOT EXISTS explanations_used ON explanations (used)")
+
+    def get(self, board, move_san, settings):
+        """
+        Get the stored explanation of a move
+
+        :param board: board before the move
+        :param move_san: move in SAN notation
+        :param settings: engine settings and explanation version the explanation was made with
+        :return: explanation as a string, None on a miss
+        """
+
+        key = AnalysisStore.key(board, settings) + (move_san,)
+        connection = self._connection()
+
+        row = connection.execute(
+            "SELECT explanation FROM explanations "
+            "WHERE position = ? AND turn = ? AND castling = ? AND ep = ? AND settings = ? AND move = ?",
+            key).fetchone()
+        if row is None:
+            return None
+
+        # mark the explanation as recently used
+        self._touch(key)
+        return row[0]
+
+    def put(self, board, move_san, settings, explanation):
+        """
+        Store the explanation of a move
+
+        :param board: board before the move
+        :param move_san: move in SAN notation
+        :param settings: engine settings and explanation version the explanation was made with
+        :param explanation: explanation as a string
+        :return: None
+        """
+
+        key = AnalysisStore.key(board, settings) + (move_san,)
+
+        self._write("INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    key + (explanation, time.time()))
+
+
+class ExplanationCache:
+    """
+    Class used to remember explanations, in memory and optionally on disk, so explained moves are not explained again
+
+    """
+
+    def __init__(self, max_size=256, store_path=None):
+        """
+        Constructor for ExplanationCache class
+
+        :param max_size: maximum number of explanations kept in memory. The least recently used one is dropped first
+        :param store_path: path to a SQLite file keeping explanations between sessions. Default is none
+        """
+
+        self.max_size = max_size
+        self.store = ExplanationStore(store_path) if store_path else None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+
+        lookups = MetricsRegistry.default.counter("explanation_cache_lookups_total",
+                                                  "Lookups of remembered explanations, by result", ("result",))
+        self._lookups = {"memory_hits": lookups.labels("memory_hit"), "store_hits": lookups.labels("store_hit"),
+                         "misses": lookups.labels("miss")}
+
+    @staticmethod
+    def key(board, move_san, settings):
+        """
+        Get the key of an explanation
+
+        :param board: board before the move
+        :param move_san: move in SAN notation
+        :param settings: engine settings and explanation version the explanation was made with
+        :return: tuple of the position key, the move and the settings
+        """
+
+        return AnalysisCache.key(board) + (move_san, settings)
+
+    def get(self, board, move_san, settings):
+        """
+        Get the explanation of a move, looking in memory first and on disk then
+
+        :param board: board before the move
+        :param move_san: move in SAN notation
+        :param settings: engine settings and explanation version the explanation must have been made with
+        :return: explanation as a string, None on a miss
+        """
+
+        key = self.key(board, move_san, settings)
+
+        with self._lock:
+            explanation = self._entries.get(key)
+            if explanation is not None:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                self._lookups["memory_hits"].inc()
+                return explanation
+
+        explanation = self.store.get(board, move_san, settings) if self.store is not None else None
+
+        with self._lock:
+            if explanation is None:
+                self._counters["misses"] += 1
+                self._lookups["misses"].inc()
+                return None
+            self._counters["store_hits"] += 1
+            self._lookups["store_hits"].inc()
+
+        self._remember(key, explanation)
+        return explanation
+
+    def put(self, board, move_san, settings, explanation):
+        """
+        Remember the explanation of a move
+
+        :param board: board before the move
+        :param move_san: move in SAN notation
+        :param settings: engine settings and explanation version the explanation was made with
+        :param explanation: explanation as a string
+        :return: None
+        """
+
+        self._remember(self.key(board, move_san, settings), explanation)
+        if self.store is not None:
+            self.store.put(board, move_san, settings, explanation)
+
+    def _remember(self, key, explanation):
+        """
+        Keep an explanation in memory
+
+        :param key: key of the explanation
+        :param explanation: explanation as a string
+        :return: None
+        """
+
+        with self._lock:
+            self._entries[key] = explanation
+            self._entries.move_to_end(key)
+
+            # drop the least recently used explanations
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Get the hit and miss counters of the cache
+
+        :return: dictionary with keys 'memory_hits', 'store_hits', 'misses', 'hit_rate' and 'size'
+        """
+
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+
+        lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["store_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """
+        Forget the explanations kept in memory, the counters are kept
+
+        :return: None
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        """
+        Close the store, with the connections of all the threads
+
+        :return: None
+        """
+
+        if self.store is not None:
+            self.store.close()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,221 @@
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import chess.pgn
+
+from back.detectors import MoveContext, OpeningsDetector, TechniquesDetector
+from back.stockfish_tools.evaluation import Evaluation
+from back.stockfish_tools.search_limits import SearchLimits
+
+
+class GameAnnotator:
+    """
+    Class used to annotate every move of a game with its evaluation, opening and techniques
+
+    """
+
+    # PGN text starts with a tag or with the number of the first move
+    PGN_START = re.compile(r"\s*(\[|\d+\.)")
+
+    def __init__(self, stockfish, limits=None, techniques=None):
+        """
+        Constructor for GameAnnotator class
+
+        :param stockfish: Instance of Stockfish class
+        :param limits: time limit in seconds, dictionary or SearchLimits of the search of each position. Default is
+                       the evaluation limits
+        :param techniques: names of the techniques to be detected. Default is all the registered techniques
+        """
+
+        self.stockfish = stockfish
+        self.limits = stockfish.limits["evaluation"] if limits is None else SearchLimits.of(limits)
+        self.techniques = techniques
+        self.openings_detector = OpeningsDetector(stockfish)
+        self.techniques_detector = TechniquesDetector(stockfish)
+
+    @staticmethod
+    def read_games(path):
+        """
+        Read the games of a PGN file, or of a file with one game per line as moves in SAN notation
+
+        :param path: path of the file
+        :return: generator of chess.pgn.Game for PGN files, of strings of moves otherwise
+        """
+
+        with open(path, "r") as file:
+            if path.lower().endswith(".pgn"):
+                while True:
+                    game = chess.pgn.read_game(file)
+                    if game is None:
+                        return
+                    yield game
+            else:
+                for line in file:
+                    line = line.strip()
+                    # games may also be separated by lines holding a '#'
+                    if line and line != "#":
+                        yield line
+
+    @classmethod
+    def replay(cls, game, pgn=None):
+        """
+        Get the boards and the moves of a game
+
+        :param game: chess.pgn.Game, PGN text or moves in SAN notation separated by spaces
+        :param pgn: True if the text is PGN, False if it is moves in SAN notation. Default is PGN if the text starts
+                    with a tag or a move number
+        :return: tuple of (boards, moves), boards[i] is the board before moves[i] and the last board is the final one
+        """
+
+        if isinstance(game, str) and os.path.isfile(game):
+            raise ValueError(f"{game} is a file, its games are annotated by annotate_file")
+        if pgn is None:
+            pgn = isinstance(game, str) and cls.PGN_START.match(game) is not None
+
+        if isinstance(game, str) and pgn:
+            game = chess.pgn.read_game(io.StringIO(game))
+            if game is None:
+                raise ValueError("The PGN text does not hold a game")
+
+        if isinstance(game, chess.pgn.Game):
+            board = game.board()
+            moves = list(game.mainline_moves())
+        else:
+            board = chess.Board()
+            moves = []
+            for move_san in game.split():
+                # a game ends at the first move that cannot be played
+                try:
+                    move = board.parse_san(move_san)
+                except ValueError:
+                    break
+                moves.append(move)
+                board.push(move)
+            board = chess.Board()
+
+        boards = [board.copy()]
+        for move in moves:
+            board.push(move)
+            boards.append(board.copy())
+
+        return boards, moves
+
+    def annotate(self, game, parallel=False, pgn=None):
+        """
+        Annotate every move of a game, as soon as the position after it is searched
+
+        :param game: chess.pgn.Game, PGN text or moves in SAN notation separated by spaces
+        :param parallel: True to split the moves in consecutive shards searched by all the pooled engines
+        :param pgn: True if the text is PGN, False if it is moves in SAN notation. Default is guessing it
+        :return: generator of dictionaries with keys 'ply', 'move' (SAN notation), 'fen' (board before the move),
+                 'evaluation' (Evaluation before the move, for the player making it), 'best_move', 'loss' (centipawns
+                 lost compared to the best move), 'opening' and 'techniques'
+        """
+
+        boards, moves = self.replay(game, pgn)
+
+        if not parallel or self.stockfish.pool.size == 1:
+            records = (self._annotate_position(boards, moves, index) for index in range(len(boards)))
+            yield from self._complete(records)
+            return
+
+        # each worker searches consecutive positions with one engine, so the engine finds them in its hash
+        shard_size = -(-len(boards) // self.stockfish.pool.size)
+        executor = ThreadPoolExecutor(max_workers=self.stockfish.pool.size, thread_name_prefix="annotator")
+        futures = [executor.submit(self._annotate_range, boards, moves, start, min(start + shard_size, len(boards)))
+                   for start in range(0, len(boards), shard_size)]
+
+        try:
+            yield from self._complete(record for future in futures for record in future.result())
+        finally:
+            # the remaining shards are not needed if the caller stopped early
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def annotate_file(self, path, parallel=False):
+        """
+        Annotate every move of the games of a file
+
+        :param path: path of a PGN file or of a file with one game per line
+        :param parallel: True to search the moves of each game with all the pooled engines
+        :return: generator of tuples (game index, annotated move)
+        """
+
+        for index, game in enumerate(self.read_games(path)):
+            # the games of a PGN file are already read, the other files hold moves in SAN notation
+            for annotation in self.annotate(game, parallel, pgn=False):
+                yield index, annotation
+
+    def _annotate_range(self, boards, moves, start, stop):
+        """
+        Annotate consecutive positions of a game, in a worker thread
+
+        :param boards: boards of the game
+        :param moves: moves of the game
+        :param start: index of the first position
+        :param stop: index after the last position
+        :return: List of annotated positions
+        """
+
+        # the engine of the shard is held for all its positions
+        with self.stockfish.pool.lease() as engine:
+            records = [self._annotate_position(boards, moves, index, engine) for index in range(start, stop)]
+
+        # run the deferred engine detectors in the worker as well, they lease their own engines
+        for record in records:
+            if "techniques" in record:
+                record["techniques"].evaluate_all()
+        return records
+
+    def _annotate_position(self, boards, moves, index, engine=None):
+        """
+        Search a position of a game and detect the techniques of the move played from it
+
+        :param boards: boards of the game
+        :param moves: moves of the game
+        :param index: index of the position
+        :param engine: engine leased by the caller for the search. Default is leasing one from the pool
+        :return: dictionary with the annotation of the position
+        """
+
+        board = boards[index]
+        record = {"ply": index + 1, "fen": board.fen(), "evaluation": None, "best_move": None}
+
+        if not board.is_game_over():
+            entry = self.stockfish.analyse(self.limits, board, engine)
+            if entry["score"] is not None:
+                record["evaluation"] = Evaluation.from_entry(entry, board.turn)
+            if entry["best_move"] is not None:
+                record["best_move"] = board.san(entry["best_move"])
+
+        if index < len(moves):
+            move_san = board.san(moves[index])
+            record["move"] = move_san
+            record["opening"] = self.openings_detector.get_opening(move_san, board)
+            record["techniques"] = self.techniques_detector.detect(MoveContext(board, move_san), self.techniques)
+
+        return record
+
+    @staticmethod
+    def _complete(records):
+        """
+        Add to each annotated move the centipawns it lost, known once the position after it is searched
+
+        :param records: annotated positions, in the order of the game
+        :return: generator of annotated moves
+        """
+
+        previous = None
+        for record in records:
+            if previous is not None:
+                before, after = previous["evaluation"], record["evaluation"]
+                previous["loss"] = None
+                if before is not None and after is not None:
+                    # the evaluation after the move is given for the opponent
+                    previous["loss"] = max(0, before.score() + after.score())
+                yield previous
+            previous = record
@@ -0,0 +1,85 @@
+import chess
+import chess.polyglot
+
+from back.utils.metrics import MetricsRegistry
+from back.utils.timing import Timing
+
+
+class OpeningBook:
+    """
+    Class used to look up the moves of a position in a Polyglot opening book
+    The book file is memory mapped, a lookup is a binary search over its entries and never starts the engine
+
+    """
+
+    lookups = MetricsRegistry.default.counter("book_lookups_total", "Lookups of positions in the opening book, by "
+                                                                    "result", ("result",))
+
+    def __init__(self, path, min_weight=1):
+        """
+        Constructor for OpeningBook class
+
+        :param path: path to a Polyglot .bin book
+        :param min_weight: minimum weight of a book move, the lighter moves are ignored. Default is 1
+        """
+
+        self.path = path
+        self.min_weight = min_weight
+        self._reader = chess.polyglot.open_reader(path)
+
+        self._hits = self.lookups.labels("hit")
+        self._misses = self.lookups.labels("miss")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def entries(self, board):
+        """
+        Get the book moves of a position
+
+        :param board: board of the position
+        :return: List of dictionaries with keys 'move' (SAN notation), 'weight' and 'share' (weight relative to all
+                 the book moves of the position), heaviest move first. Moves under the minimum weight are left out
+        """
+
+        # the book keeps the entries of a position in file order
+        entries = sorted(self._reader.find_all(board, minimum_weight=0), key=lambda entry: -entry.weight)
+        total = sum(entry.weight for entry in entries)
+
+        return [{"move": board.san(entry.move), "weight": entry.weight,
+                 "share": entry.weight / total if total else 0.0}
+                for entry in entries if entry.weight >= self.min_weight]
+
+    def probe(self, board):
+        """
+        Get the main book move of a position
+
+        :param board: board of the position
+        :return: dictionary with keys 'move', 'weight' and 'share' of the heaviest book move, None if the position
+                 is out of the book
+        """
+
+        entries = self.entries(board)
+        if not entries:
+            Timing.count("book.miss")
+            self._misses.inc()
+            return None
+
+        Timing.count("book.hit")
+        self._hits.inc()
+        return entries[0]
+
+    def __contains__(self, board):
+        return bool(self.entries(board))
+
+    def close(self):
+        """
+        Unmap the book
+
+        :return: None
+        """
+
+        self._reader.close()
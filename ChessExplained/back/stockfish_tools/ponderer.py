@@ -0,0 +1,204 @@
+import logging
+import threading
+
+from back.stockfish_tools.analysis_cache import AnalysisCache
+
+logger = logging.getLogger(__name__)
+
+
+class Ponderer:
+    """
+    Class used to search positions in the background, before their best move is requested
+    The searches are left in the analysis cache of the Stockfish instance
+
+    """
+
+    def __init__(self, stockfish):
+        """
+        Constructor for Ponderer class
+        Starts the background worker thread
+
+        :param stockfish: Instance of Stockfish class
+        """
+
+        self.stockfish = stockfish
+
+        self._condition = threading.Condition()
+        self._target = None
+        self._pending = False
+        self._generation = 0
+        self._ready = 0
+        # latest generation whose search failed, its waiters give up
+        self._failed = 0
+        self._speculate = True
+        self._stream = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="ponderer", daemon=True)
+        self._thread.start()
+
+    def ponder(self, board):
+        """
+        Start searching a board, abandoning the board searched before
+
+        :param board: board to be searched
+        :return: None
+        """
+
+        with self._condition:
+            self._target = board.copy()
+            self._pending = True
+            self._generation += 1
+            self._speculate = True
+            stream = self._stream
+            self._condition.notify_all()
+
+        if stream is not None:
+            stream.stop()
+
+    def wait(self, board, timeout=None):
+        """
+        Wait until the positions needed to explain the best move of a board are searched
+        Speculative searches are stopped, so the engine is free for the explanation
+
+        :param board: board whose best move is about to be requested
+        :param timeout: maximum number of seconds to wait
+        :return: True if the searches are in the cache, False if the board is not being pondered, its search failed
+                 or the timeout expired
+        """
+
+        with self._condition:
+            if self._target is None or AnalysisCache.key(self._target) != AnalysisCache.key(board):
+                return False
+
+            generation = self._generation
+            self._speculate = False
+            self._condition.wait_for(
+                lambda: self._ready >= generation or self._failed >= generation or self._generation != generation
+                or self._closed, timeout)
+
+            ready = self._ready >= generation
+            stream = self._stream if ready else None
+
+        # the remaining search is speculative
+        if stream is not None:
+            stream.stop()
+        return ready
+
+    def close(self):
+        """
+        Stop the background worker
+
+        :return: None
+        """
+
+        with self._condition:
+            self._closed = True
+            stream = self._stream
+            self._condition.notify_all()
+
+        if stream is not None:
+            stream.stop()
+
+    def _run(self):
+        """
+        Background worker, searching the latest board given to ponder
+
+        :return: None
+        """
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                self._pending = False
+                board, generation = self._target, self._generation
+
+            try:
+                self._ponder(board, generation)
+            except Exception as error:
+                # pondering is only a head start, the explicit request searches again
+                logger.warning("Pondering failed: %s", error)
+                with self._condition:
+                    self._failed = generation
+                    self._condition.notify_all()
+
+    def _is_current(self, generation, speculative=False):
+        """
+        Check if a search is still wanted
+
+        :param generation: generation of the board being searched
+        :param speculative: True if the search is speculative
+        :return: True if the search should go on, False otherwise
+        """
+
+        if self._closed or self._generation != generation:
+            return False
+        return self._speculate or not speculative
+
+    def _search(self, board, limits, generation, speculative=False):
+        """
+        Search a board unless it is already in the cache, stopping if the search is not wanted anymore
+
+        :param board: board to be searched
+        :param limits: SearchLimits of the search
+        :param generation: generation of the pondered board
+        :param speculative: True if the search is speculative
+        :return: cached search of the board, None if it was stopped
+        """
+
+        if board.is_game_over():
+            return None
+
+        cached = self.stockfish.cached(board, limits)
+        if cached is not None:
+            return cached
+
+        stream = self.stockfish.analysis_stream(limits, board)
+        with self._condition:
+            if not self._is_current(generation, speculative):
+                return None
+            self._stream = stream
+
+        try:
+            for _ in stream:
+                if not self._is_current(generation, speculative):
+                    stream.stop()
+        finally:
+            with self._condition:
+                self._stream = None
+
+        return self.stockfish.cached(board, limits)
+
+    def _ponder(self, board, generation):
+        """
+        Search a board, the position after its best move and the position after the expected reply
+
+        :param board: board to be searched
+        :param generation: generation of the board
+        :return: None
+        """
+
+        after_reply = None
+
+        # the explanation needs the board and the position after the best move
+        entry = self._search(board, self.stockfish.limits["best_move"], generation)
+        if entry is not None and entry["best_move"] is not None:
+            after_move = board.copy()
+            after_move.push(entry["best_move"])
+
+            reply = self._search(after_move, self.stockfish.limits["sequence"], generation)
+            if reply is not None and reply["best_move"] is not None:
+                after_reply = after_move.copy()
+                after_reply.push(reply["best_move"])
+
+        with self._condition:
+            if self._generation != generation:
+                return
+            self._ready = generation
+            self._condition.notify_all()
+
+        # prepare the next best move request, if the opponent plays the expected reply
+        if after_reply is not None:
+            self._search(after_reply, self.stockfish.limits["best_move"], generation, speculative=True)
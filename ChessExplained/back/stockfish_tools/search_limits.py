@@ -0,0 +1,84 @@
+import chess.engine
+
+
+class SearchLimits:
+    """
+    Class used to describe how long the engine searches a position
+
+    """
+
+    def __init__(self, time=None, depth=None, nodes=None, mate=None, adaptive=False, stable_iterations=5,
+                 min_depth=10):
+        """
+        Constructor for SearchLimits class
+        The search stops as soon as any of the given limits is reached
+
+        :param time: time limit in seconds
+        :param depth: depth limit in plies
+        :param nodes: limit of searched nodes
+        :param mate: search for a mate in at most this many moves
+        :param adaptive: stop early once the best move stays the same over several iterations. Default is False
+        :param stable_iterations: number of iterations the best move must stay the same for an adaptive search
+        :param min_depth: minimum depth reached before an adaptive search may stop early
+        """
+
+        if time is None and depth is None and nodes is None and mate is None:
+            raise ValueError("At least one search limit must be given")
+
+        self.time = time
+        self.depth = depth
+        self.nodes = nodes
+        self.mate = mate
+        self.adaptive = adaptive
+        self.stable_iterations = stable_iterations
+        self.min_depth = min_depth
+
+    @classmethod
+    def from_dict(cls, config):
+        """
+        Build search limits from a configuration dictionary
+
+        :param config: dictionary with any of the constructor parameters as keys
+        :return: SearchLimits instance
+        """
+
+        return cls(**config)
+
+    @classmethod
+    def of(cls, limits):
+        """
+        Build search limits from a time limit in seconds, a configuration dictionary or search limits
+
+        :param limits: time limit, dictionary or SearchLimits instance
+        :return: SearchLimits instance
+        """
+
+        if isinstance(limits, cls):
+            return limits
+        if isinstance(limits, dict):
+            return cls.from_dict(limits)
+        return cls(time=limits)
+
+    def engine_limit(self):
+        """
+        Get the limit passed to the engine
+
+        :return: chess.engine.Limit instance
+        """
+
+        return chess.engine.Limit(time=self.time, depth=self.depth, nodes=self.nodes, mate=self.mate)
+
+    def completed_time(self):
+        """
+        Get the time limit remembered for a search that ran until its limits
+        An adaptive search may stop before its time limit, only the time it actually spent is known then
+
+        :return: time limit in seconds, None for an adaptive search
+        """
+
+        return None if self.adaptive else self.time
+
+    def __repr__(self):
+        limits = ", ".join(f"{name}={getattr(self, name)}" for name in ("time", "depth", "nodes", "mate")
+                           if getattr(self, name) is not None)
+        return f"SearchLimits({limits}{', adaptive' if self.adaptive else ''})"
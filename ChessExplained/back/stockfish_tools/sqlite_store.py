@@ -0,0 +1,165 @@
+import sqlite3
+import threading
+import time
+
+
+class SQLiteStore:
+    """
+    Base class of the stores keeping entries on disk in a SQLite table, with the least recently used entries dropped
+    above a maximum number of entries
+    Lookups never write: the time an entry was used is remembered in memory and written with the next write, or once
+    enough lookups are pending, so readers are not serialized behind a commit.
+
+    """
+
+    # name of the table of the entries
+    TABLE = None
+
+    # columns of the primary key of the table
+    KEY_COLUMNS = ()
+
+    # number of pending lookups written at once
+    FLUSH_SIZE = 100
+
+    def __init__(self, path, max_entries):
+        """
+        Constructor for SQLiteStore class
+        The database is opened lazily, the first time it is needed
+
+        :param path: path to the SQLite database file
+        :param max_entries: maximum number of entries kept. The least recently used entries are dropped first
+        """
+
+        self.path = path
+        self.max_entries = max_entries
+
+        # sqlite connections cannot be shared between threads, each thread opens its own
+        self._local = threading.local()
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        # key -> time of the lookups not written yet
+        self._used = {}
+
+    def _connection(self):
+        """
+        Get the connection of the calling thread, opening the database if needed
+
+        :return: sqlite3 connection
+        """
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None or connection not in self._connections:
+            # the connection is only used by this thread, close may be called from another one
+            connection = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+
+            # write-ahead logging lets readers work while another connection writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._create(connection)
+            connection.commit()
+
+            with self._lock:
+                self._connections.add(connection)
+            self._local.connection = connection
+        return connection
+
+    def _create(self, connection):
+        """
+        Create the table of the entries if needed
+
+        :param connection: sqlite3 connection
+        :return: None
+        """
+
+        raise NotImplementedError
+
+    def _touch(self, key):
+        """
+        Mark an entry as recently used, the time is written later
+
+        :param key: primary key of the entry
+        :return: None
+        """
+
+        connection = self._connection()
+        with self._lock:
+            self._used[key] = time.time()
+            if len(self._used) >= self.FLUSH_SIZE:
+                self._flush(connection)
+                connection.commit()
+
+    def _flush(self, connection):
+        """
+        Write the pending lookups, the caller holds the lock and commits
+
+        :param connection: sqlite3 connection
+        :return: None
+        """
+
+        if not self._used:
+            return
+
+        condition = " AND ".join(f"{column} = ?" for column in self.KEY_COLUMNS)
+        connection.executemany(f"UPDATE {self.TABLE} SET used = ? WHERE {condition}",
+                               [(used,) + key for key, used in self._used.items()])
+        self._used.clear()
+
+    def _write(self, statement, parameters):
+        """
+        Write an entry, together with the pending lookups, and drop old entries every few writes
+
+        :param statement: SQL statement writing the entry
+        :param parameters: parameters of the statement
+        :return: None
+        """
+
+        connection = self._connection()
+        with self._lock:
+            self._flush(connection)
+            connection.execute(statement, parameters)
+            connection.commit()
+
+            # check the size of the store every few writes
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(connection)
+
+    def _evict(self, connection):
+        """
+        Drop the least recently used entries above the maximum number of entries
+
+        :param connection: sqlite3 connection
+        :return: None
+        """
+
+        count = connection.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        # drop a tenth more than needed, so eviction does not run on every write
+        excess = count - self.max_entries + self.max_entries // 10
+        connection.execute(
+            f"DELETE FROM {self.TABLE} WHERE rowid IN (SELECT rowid FROM {self.TABLE} ORDER BY used LIMIT ?)",
+            (excess,))
+        connection.commit()
+
+    def close(self):
+        """
+        Write the pending lookups and close the connections of all the threads
+
+        :return: None
+        """
+
+        # the lock is not held while opening a connection, opening one takes it
+        connection = self._connection() if self._used else None
+        with self._lock:
+            if connection is not None:
+                self._flush(connection)
+                connection.commit()
+
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local.connection = None
@@ -1,8 +1,25 @@
+import logging
 import math
 
 import chess
 import chess.engine
 
+from back.detectors.opening_tracker import OpeningTracker
+from back.stockfish_tools.analysis_cache import AnalysisCache
+from back.stockfish_tools.analysis_store import AnalysisStore
+from back.stockfish_tools.analysis_stream import AnalysisStream, AsyncAnalysisStream
+from back.stockfish_tools.engine_pool import AsyncEnginePool, EnginePool
+from back.stockfish_tools.engine_profiles import EngineProfile
+from back.stockfish_tools.evaluation import Evaluation
+from back.stockfish_tools.explanation_cache import ExplanationCache
+from back.stockfish_tools.opening_book import OpeningBook
+from back.stockfish_tools.ponderer import Ponderer
+from back.stockfish_tools.search_limits import SearchLimits
+from back.utils.metrics import MetricsRegistry
+from back.utils.timing import Timing
+
+logger = logging.getLogger(__name__)
+
 
 class Stockfish:
     """
@@ -10,33 +27,162 @@ class Stockfish:
 
     """
 
-    def __init__(self, engine_path):
+    # upper bounds of the buckets of the searched nodes metric
+    NODE_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7, 1e8)
+
+    def __init__(self, engine_path, pool_size=1, cache_size=4096, store_path=None, limits=None,
+                 profile="interactive", explanation_cache_size=256, metrics_path=None, book_path=None,
+                 book_min_weight=1):
         """
         Constructor for Stockfish class
-        Initializes board and engine path
+        Initializes board, engine path, the pool of engine processes and the cache of searched positions
 
         :param engine_path: path to Stockfish engine on personal computer
+        :param pool_size: maximum number of engine processes kept alive. Default is 1
+        :param cache_size: maximum number of searched positions remembered. Default is 4096
+        :param store_path: path to a SQLite file keeping searched positions and explanations between sessions.
+                           Default is none
+        :param limits: dictionary overriding the default search limits, with keys 'best_move', 'sequence' and
+                       'evaluation' and values given as seconds, dictionaries or SearchLimits
+        :param profile: name of the engine profile ('interactive', 'batch', 'low_memory' or 'auto') or
+                        EngineProfile setting the Threads, Hash and Skill Level options. Default is 'interactive'
+        :param explanation_cache_size: maximum number of explanations remembered in memory. Default is 256
+        :param metrics_path: path of a file the metrics are written to when the instance is closed, as JSON if it
+                             ends with '.json' and as Prometheus text otherwise. Default is none
+        :param book_path: path to a Polyglot .bin opening book. The best move of a book position is taken from the
+                          book without searching it. Default is none
+        :param book_min_weight: minimum weight of a book move, positions whose book moves are all lighter are
+                                searched. Default is 1
         """
 
         self.engine_path = engine_path
         self.board = chess.Board()
+        # opening of the game played on the board, updated by move, undo and setup
+        self.openings = OpeningTracker(self.board)
+        self.profile = EngineProfile.of(profile)
+
+        # the explanations and the pondering searches only use the blocking pool. The async pool starts its engines
+        # the first time an async search method is called, the engines of both pools then stay alive side by side
+        options = self.profile.options(pool_size, pools=2)
+        self.pool = EnginePool(engine_path, size=pool_size, options=options)
+        self.async_pool = AsyncEnginePool(engine_path, size=pool_size, options=options)
+        self.cache = AnalysisCache(max_size=cache_size)
+        self.store = AnalysisStore(store_path) if store_path else None
+        self.explanations = ExplanationCache(max_size=explanation_cache_size, store_path=store_path)
+        self.book = OpeningBook(book_path, book_min_weight) if book_path else None
+
+        # searches made with different engines or settings are stored separately
+        self.engine_settings = f"{engine_path}|{self.profile.settings_key()}"
+
+        # default search limits of each kind of search
+        self.limits = {
+            "best_move": SearchLimits(time=2.0, adaptive=True),
+            "sequence": SearchLimits(time=0.2),
+            "evaluation": SearchLimits(time=0.1),
+        }
+        for name, value in (limits or {}).items():
+            self.limits[name] = SearchLimits.of(value)
+
+        # background searches, started on the first call to ponder
+        self.ponderer = None
+
+        # the metrics are shared by every instance, so they add up over the whole application
+        self.metrics = MetricsRegistry.default
+        self.metrics_path = metrics_path
+        search_seconds = self.metrics.histogram("engine_search_seconds", "Duration of the engine searches", ("kind",))
+        search_nodes = self.metrics.histogram("engine_search_nodes", "Nodes visited by the engine searches", ("kind",),
+                                              buckets=self.NODE_BUCKETS)
+        self._search_metrics = {kind: (search_seconds.labels(kind), search_nodes.labels(kind))
+                                for kind in ("search", "multipv", "extension", "async")}
+        lookups = self.metrics.counter("analysis_cache_lookups_total", "Lookups of previous searches, by result",
+                                       ("result",))
+        self._lookups = {result: lookups.labels(result) for result in ("hit", "store_hit", "miss")}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stop the engine processes
+        Must be called before exiting, otherwise the engine threads keep the interpreter alive
+
+        :return: None
+        """
+
+        if self.ponderer is not None:
+            self.ponderer.close()
+        self.pool.close()
+        if self.store is not None:
+            self.store.close()
+        self.explanations.close()
+        if self.book is not None:
+            self.book.close()
+        if self.metrics_path is not None:
+            self.metrics.write(self.metrics_path)
 
-    def setup(self, fen):
+    async def close_async(self):
+        """
+        Stop the engine processes, including the ones used by the async methods
+
+        :return: None
+        """
+
+        self.close()
+        await self.async_pool.close()
+
+    def setup(self, fen, keep_history=False):
         """
         Set the board to the given FEN
 
         :param fen: FEN to set the board to
+        :param keep_history: True to continue the game when the FEN is the current board or is reached by one legal
+                             move from it, so the moves played before are kept. Default is starting from the FEN
         :return: True if FEN is valid, False otherwise
         """
 
         try:
-            # set the board to the given FEN
-            self.board.set_fen(fen)
-            return True
+            board = chess.Board(fen)
         except ValueError:
-            print(f"Invalid FEN: {fen}")
+            logger.warning("Invalid FEN: %s", fen)
             return False
 
+        if keep_history:
+            if board.fen() == self.board.fen():
+                return True
+
+            move = self._move_to(board)
+            if move is not None:
+                self.openings.push(move)
+                return True
+
+        # set the board to the given FEN
+        self.board.set_fen(fen)
+        self.openings.reset()
+        return True
+
+    def _move_to(self, board):
+        """
+        Find the legal move of the current board reaching another board
+
+        :param board: board to be reached
+        :return: chess.Move, None if no single move reaches the board
+        """
+
+        for move in self.board.legal_moves:
+            # the moved piece must stand on its target square, which rules out nearly every other move
+            if board.piece_type_at(move.to_square) != (move.promotion or self.board.piece_type_at(move.from_square)):
+                continue
+
+            self.board.push(move)
+            reached = self.board.fen() == board.fen()
+            self.board.pop()
+            if reached:
+                return move
+        return None
+
     def move(self, move):
         """
         Make a move on the current board
@@ -47,10 +193,10 @@ class Stockfish:
 
         try:
             # make the move on the board
-            self.board.push_san(move)
+            self.openings.push(self.board.parse_san(move))
             return True
         except ValueError:
-            print(f"Invalid move: {move}")
+            logger.warning("Invalid move: %s", move)
             return False
 
     def undo(self):
@@ -62,10 +208,24 @@ class Stockfish:
 
         # if there are moves on the stack, pop the last move
         if len(self.board.move_stack) > 0:
-            self.board.pop()
+            self.openings.pop()
             return True
         return False
 
+    def opening(self):
+        """
+        Get the deepest named opening of the game played on the board, including openings reached by transposition
+
+        :return: dictionary with keys 'eco', 'name', 'variation', 'ply' (half moves played when it was reached) and
+                 'left_theory' (half moves played when the game left theory, None while it is in theory), None if no
+                 position of the game is a known opening
+        """
+
+        opening = self.openings.opening()
+        if opening is None:
+            return None
+        return dict(opening, left_theory=self.openings.left_theory())
+
     def turn(self):
         """
         Get the turn of the board
@@ -85,6 +245,18 @@ class Stockfish:
 
         # change the turn of the board
         self.board.turn = not self.board.turn
+        self._edited()
+
+    def _edited(self):
+        """
+        Start the game from the board after it was edited, the moves played before do not lead to it anymore
+
+        :return: None
+        """
+
+        # the opening is followed from the root of the move stack, which is now the edited board
+        self.board.clear_stack()
+        self.openings.reset()
 
     def display(self):
         """
@@ -427,100 +599,467 @@ class Stockfish:
                 attacked_squares += self.captures_by_index_position(current_square)
         return attacked_squares
 
-    def best_move(self, time_limit=2.0):
+    def cached(self, board, limits):
+        """
+        Get a previous search of a board that covers the given limits
+
+        :param board: board to be searched
+        :param limits: SearchLimits of the requested search
+        :return: dictionary with keys 'score', 'best_move', 'pv', 'depth', 'nodes' and 'time', or None
+        """
+
+        # a mate search answers a different question than the other searches
+        if limits.mate is not None:
+            return None
+
+        # an adaptive search may stop before its time limit, a search reaching its minimum depth answers it as well
+        depth = limits.depth
+        if limits.adaptive:
+            depth = limits.min_depth if depth is None else min(depth, limits.min_depth)
+
+        cached = self.cache.get(board, limits.time, depth, limits.nodes)
+        if cached is not None:
+            Timing.count("engine.cache_hit")
+            self._lookups["hit"].inc()
+            return cached
+
+        # look for a search made in a previous session
+        if self.store is not None:
+            with Timing.span("engine.store"):
+                stored = self.store.get(board, self.engine_settings, limits.time, depth, limits.nodes)
+            if stored is not None:
+                Timing.count("engine.store_hit")
+                self._lookups["store_hit"].inc()
+                return self.cache.put(board, stored)
+
+        Timing.count("engine.cache_miss")
+        self._lookups["miss"].inc()
+        return None
+
+    def remember(self, board, info, time_limit=None):
+        """
+        Remember an engine search in the cache and the store
+
+        :param board: searched board
+        :param info: engine information about the board
+        :param time_limit: time limit the search ran with, None if it was stopped before
+        :return: the remembered entry
+        """
+
+        entry = self.cache.put(board, info, time_limit)
+        if self.store is not None:
+            self.store.put(board, entry, self.engine_settings)
+        return entry
+
+    def book_entry(self, board=None):
+        """
+        Get the main book move of a board
+
+        :param board: board to be looked up. Default is the current board
+        :return: dictionary with keys 'move' (SAN notation), 'weight' and 'share', None without a book or if the board
+                 is out of the book
+        """
+
+        if self.book is None:
+            return None
+        return self.book.probe(self.board if board is None else board)
+
+    @staticmethod
+    def is_stable(info, history, limits):
+        """
+        Check if an adaptive search can stop, because the best move did not change for several iterations
+
+        :param info: engine information about the latest iteration
+        :param history: best moves of the previous iterations, the latest one is appended
+        :param limits: SearchLimits of the search
+        :return: True if the search can stop, False otherwise
+        """
+
+        # only complete iterations report a depth together with a line
+        if "depth" not in info or not info.get("pv"):
+            return False
+
+        history.append(info["pv"][0])
+        recent = history[-limits.stable_iterations:]
+
+        return (info["depth"] >= limits.min_depth and len(recent) == limits.stable_iterations
+                and all(move == recent[0] for move in recent))
+
+    def _search(self, engine, board, limits):
+        """
+        Search a board with a leased engine
+
+        :param engine: leased engine
+        :param board: board to be searched
+        :param limits: SearchLimits of the search
+        :return: engine information about the board
+        """
+
+        seconds, nodes = self._search_metrics["search"]
+        with Timing.span("engine.search", seconds):
+            if not limits.adaptive:
+                info = engine.analyse(board, limits.engine_limit())
+            else:
+                history = []
+                with engine.analysis(board, limits.engine_limit()) as analysis:
+                    for info in analysis:
+                        if self.is_stable(info, history, limits):
+                            break
+                    info = dict(analysis.info)
+
+        nodes.observe(info.get("nodes", 0))
+        return info
+
+    def analyse(self, limits=None, board=None, engine=None):
+        """
+        Search a board, reusing a previous search of the same position if it ran at least as long
+
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the evaluation limits
+        :param board: board to be searched. Default is the current board
+        :param engine: engine leased by the caller, e.g. to search consecutive positions with the same hash. Default
+                       is leasing one from the pool
+        :return: dictionary with keys 'score', 'best_move', 'pv', 'depth' (the depth actually reached), 'nodes'
+                 and 'time'
+        """
+
+        if board is None:
+            board = self.board
+        limits = self.limits["evaluation"] if limits is None else SearchLimits.of(limits)
+
+        cached = self.cached(board, limits)
+        if cached is not None:
+            return cached
+
+        if engine is not None:
+            info = self._search(engine, board, limits)
+        else:
+            with self.pool.lease() as engine:
+                info = self._search(engine, board, limits)
+
+        return self.remember(board, info, limits.completed_time())
+
+    def best_move(self, limits=None, board=None):
         """
-        Get the best move for the current board
+        Get the best move for a board
+        A position of the opening book is answered by the book without searching it
 
-        :param time_limit: time limit for the engine to find the best move. Default is 2 seconds
-        :return: best move for the current board
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the best move limits
+                       (up to 2 seconds, stopping early once the best move is stable)
+        :param board: board to be searched. Default is the current board
+        :return: best move for the board
         """
 
-        with chess.engine.SimpleEngine.popen_uci(self.engine_path) as engine:
+        if board is None:
+            board = self.board
+
+        # check if the game is over
+        if board.is_game_over():
+            return None
+
+        # a book position is answered by the book, the engine is only needed once the game leaves it
+        entry = self.book_entry(board)
+        if entry is not None:
+            return entry["move"]
 
-            # check if the game is over
-            if self.board.is_game_over():
-                return None
+        limits = self.limits["best_move"] if limits is None else SearchLimits.of(limits)
 
-            # get the best move for the current board
-            result = engine.play(self.board, chess.engine.Limit(time=time_limit))
+        # get the best move for the board
+        move = self.analyse(limits, board)["best_move"]
 
-            # convert the move to SAN notation and return it
-            return self.board.san(result.move)
+        # the engine may stop before reporting a line, ask for a move then
+        if move is None:
+            with self.pool.lease() as engine:
+                move = engine.play(board, limits.engine_limit()).move
 
-    def best_move_sequence(self, num_moves, time_limit=2.0):
+        # convert the move to SAN notation and return it
+        return board.san(move)
+
+    def principal_variation(self, min_length=1, limits=None, board=None):
+        """
+        Get the principal variation of a board from a single engine search
+
+        :param min_length: minimum number of moves of the line. If the search returns a shorter line, it is
+                           extended by searching the position at its end. Default is 1
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the sequence limits
+        :param board: board to be searched. Default is the current board
+        :return: dictionary with keys 'pv' (list of moves in SAN notation), 'moves' (the same moves as chess.Move),
+                 'score' (Evaluation for the player to move) and 'depth'
+        """
+
+        if board is None:
+            board = self.board
+
+        variation = {"pv": [], "moves": [], "score": None, "depth": 0}
+
+        if board.outcome():
+            return variation
+
+        limits = self.limits["sequence"] if limits is None else SearchLimits.of(limits)
+
+        # make a copy of the board, so we don't modify the original board
+        temp_board = board.copy()
+
+        info = self.analyse(limits, temp_board)
+        variation["score"] = Evaluation.from_entry(info, temp_board.turn) if info["score"] is not None else None
+        variation["depth"] = info["depth"]
+        self._add_to_variation(variation, temp_board, info["pv"])
+
+        # the line was cut short, continue it from the position it ends in. The engine is only leased then, a line
+        # that is long enough does not wait for one
+        if len(variation["pv"]) < min_length and not temp_board.is_game_over():
+            with self.pool.lease() as engine:
+                while len(variation["pv"]) < min_length and not temp_board.is_game_over():
+                    seconds, nodes = self._search_metrics["extension"]
+                    with Timing.span("engine.search", seconds):
+                        info = engine.analyse(temp_board, limits.engine_limit())
+                    nodes.observe(info.get("nodes", 0))
+                    moves = info.get("pv", [])[:1]
+                    if not moves:
+                        break
+                    self._add_to_variation(variation, temp_board, moves)
+
+        return variation
+
+    @staticmethod
+    def _add_to_variation(variation, board, moves):
+        """
+        Add moves to a principal variation, playing them on the board at its end
+
+        :param variation: dictionary with keys 'pv' and 'moves' of the line
+        :param board: board at the end of the line, the moves are pushed on it
+        :param moves: moves to be added
+        :return: None
+        """
+
+        for move in moves:
+            # convert the move to SAN notation and add it to the line
+            variation["pv"].append(board.san(move))
+            variation["moves"].append(move)
+            board.push(move)
+
+    def best_move_sequence(self, num_moves, limits=None):
         """
         Get the best sequence of moves for the current board
 
         :param num_moves: Number of moves to be returned
-        :param time_limit: time limit for the engine to find the best move. Default is 2 seconds
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the sequence limits
         :return: best sequence of moves for the current board
         """
 
-        # initialize the sequence of moves
-        sequence = []
+        # the whole sequence comes from the principal variation of one search
+        return self.principal_variation(num_moves, limits)["pv"][:num_moves]
 
-        # make a copy of the board, so we don't modify the original board
-        temp_board = self.board.copy()
+    def candidate_moves(self, num_moves=None, limits=None, board=None):
+        """
+        Get the best moves of a board from a single MultiPV search
+        The search also answers later requests for the positions after each candidate move
 
-        if self.board.outcome():
-            return sequence
+        :param num_moves: number of candidate moves. Default is the multipv of the engine profile
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the best move limits
+        :param board: board to be searched. Default is the current board
+        :return: List of dictionaries with keys 'move' (SAN notation), 'pv' (list of chess.Move), 'score' (Evaluation
+                 for the player to move) and 'depth', best move first
+        """
+
+        if board is None:
+            board = self.board
+        if board.is_game_over():
+            return []
 
-        with chess.engine.SimpleEngine.popen_uci(self.engine_path) as engine:
-            for _ in range(num_moves):
-                # get the best move for the current board
-                result = engine.play(temp_board, chess.engine.Limit(time=time_limit))
+        num_moves = self.profile.multipv if num_moves is None else num_moves
+        limits = self.limits["best_move"] if limits is None else SearchLimits.of(limits)
 
-                # check if the game is over
-                if temp_board.is_game_over():
-                    break
+        seconds, nodes = self._search_metrics["multipv"]
+        with self.pool.lease() as engine, Timing.span("engine.multipv", seconds):
+            if not limits.adaptive:
+                lines = engine.analyse(board, limits.engine_limit(), multipv=num_moves)
+            else:
+                # the search is stable once the first line is
+                history = []
+                with engine.analysis(board, limits.engine_limit(), multipv=num_moves) as analysis:
+                    for info in analysis:
+                        if info.get("multipv", 1) == 1 and self.is_stable(info, history, limits):
+                            break
+                    lines = [dict(info) for info in analysis.multipv]
 
-                # convert the move to SAN notation
-                move = temp_board.san(result.move)
+        # the nodes of the search are reported with every line
+        nodes.observe(max((info.get("nodes", 0) for info in lines), default=0))
+        lines = [info for info in lines if info.get("pv") and info.get("score") is not None]
+        if lines:
+            self.remember(board, lines[0], limits.completed_time())
 
-                # add the move to the sequence
-                sequence.append(move)
+        candidates = []
+        for info in lines:
+            move = info["pv"][0]
+            candidates.append({"move": board.san(move), "pv": list(info["pv"]),
+                               "score": Evaluation.from_score(info["score"], board.turn, info.get("depth", 0),
+                                                              info.get("nodes", 0), info["pv"]),
+                               "depth": info.get("depth", 0)})
 
-                # make the move on the board
-                temp_board.push(result.move)
+            # the rest of the line is a search of the position after the move, one ply shallower
+            if len(info["pv"]) > 1:
+                after_move = board.copy(stack=False)
+                after_move.push(move)
+                self.remember(after_move, {"score": info["score"], "pv": info["pv"][1:],
+                                           "depth": max(info.get("depth", 1) - 1, 0), "nodes": info.get("nodes", 0),
+                                           "time": info.get("time", 0.0)})
 
-        # return the sequence of moves
-        return sequence
+        return candidates
 
-    def evaluation(self):
+    def evaluation(self, limits=None, board=None):
         """
-        Evaluate the current board
+        Evaluate a board
 
-        :return: evaluation of the current board
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the evaluation limits
+        :param board: board to be evaluated. Default is the current board
+        :return: Evaluation of the board for the player to move
         """
-        with chess.engine.SimpleEngine.popen_uci(self.engine_path) as engine:
-            info = engine.analyse(self.board, chess.engine.Limit(time=0.1))
-            return info["score"]
 
-    def first_item_evaluation(self):
+        if board is None:
+            board = self.board
+        return Evaluation.from_entry(self.analyse(limits, board), board.turn)
+
+    def ponder(self, board=None):
         """
-           Evaluate the current board
+        Start searching a board in the background, so its best move is ready when it is requested
 
-           :return: first item of evaluation
+        :param board: board to be searched. Default is the current board
+        :return: None
         """
-        eval_result = str(self.evaluation())
-        eval_result = eval_result[eval_result.find('('):]
-        eval_result = eval_result.strip('()')
-        eval_result = eval_result[:eval_result.find(',')]
 
-        return eval_result
+        # the best move of a book position does not need a search
+        if self.book_entry(board) is not None:
+            return
 
-    def get_color_eval_score(self, eval_first_item):
+        if self.ponderer is None:
+            self.ponderer = Ponderer(self)
+        self.ponderer.ponder(board or self.board)
+
+    def wait_for_ponder(self, board=None, timeout=None):
         """
-            Evaluate the current board
+        Wait until the background searches needed by the best move of a board are done
 
-           :return: color of player in advantage
+        :param board: board whose best move is about to be requested. Default is the current board
+        :param timeout: maximum number of seconds to wait
+        :return: True if the searches are done, False if the board is not being pondered
         """
-        eval_first_item = eval_first_item[eval_first_item.find('('):]
-        eval_first_item = eval_first_item.strip('()')
-        if eval_first_item[0] == '+':
-            return self.board.turn
-        else:
-            return not self.board.turn
+
+        if self.ponderer is None:
+            return False
+        return self.ponderer.wait(board or self.board, timeout)
+
+    def analysis_stream(self, limits=None, board=None):
+        """
+        Follow the search of a board depth by depth
+
+        for evaluation in stockfish.analysis_stream():
+            show(evaluation)
+
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the best move limits
+        :param board: board to be searched. Default is a copy of the current board
+        :return: AnalysisStream yielding an Evaluation for each completed depth, with a stop method
+        """
+
+        limits = self.limits["best_move"] if limits is None else SearchLimits.of(limits)
+        return AnalysisStream(self, (board or self.board).copy(), limits)
+
+    def analysis_stream_async(self, limits=None, board=None):
+        """
+        Follow the search of a board depth by depth without blocking the event loop
+
+        async for evaluation in stockfish.analysis_stream_async():
+            show(evaluation)
+
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the best move limits
+        :param board: board to be searched. Default is a copy of the current board
+        :return: AsyncAnalysisStream yielding an Evaluation for each completed depth, with a stop method
+        """
+
+        limits = self.limits["best_move"] if limits is None else SearchLimits.of(limits)
+        return AsyncAnalysisStream(self, (board or self.board).copy(), limits)
+
+    async def _search_async(self, board, limits):
+        """
+        Search a board with an engine leased from the async pool
+
+        :param board: board to be searched
+        :param limits: SearchLimits of the search
+        :return: engine information about the board
+        """
+
+        seconds, nodes = self._search_metrics["async"]
+        async with self.async_pool.lease() as engine:
+            with Timing.span("engine.search", seconds):
+                if not limits.adaptive:
+                    info = await engine.analyse(board, limits.engine_limit())
+                else:
+                    history = []
+                    with await engine.analysis(board, limits.engine_limit()) as analysis:
+                        async for info in analysis:
+                            if self.is_stable(info, history, limits):
+                                break
+                        info = dict(analysis.info)
+
+        nodes.observe(info.get("nodes", 0))
+        return info
+
+    async def best_move_async(self, limits=None, board=None):
+        """
+        Get the best move for a board without blocking the event loop
+        A position of the opening book is answered by the book without searching it
+
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the best move limits
+        :param board: board to be searched. Default is a copy of the current board
+        :return: best move for the board in SAN notation
+        """
+
+        # copy the board, so it may change while the engine is searching
+        board = (board or self.board).copy()
+
+        # check if the game is over
+        if board.is_game_over():
+            return None
+
+        entry = self.book_entry(board)
+        if entry is not None:
+            return entry["move"]
+
+        limits = self.limits["best_move"] if limits is None else SearchLimits.of(limits)
+
+        entry = self.cached(board, limits)
+        if entry is None:
+            entry = self.remember(board, await self._search_async(board, limits), limits.completed_time())
+        move = entry["best_move"]
+
+        # the engine may stop before reporting a line, ask for a move then
+        if move is None:
+            async with self.async_pool.lease() as engine:
+                move = (await engine.play(board, limits.engine_limit())).move
+
+        # convert the move to SAN notation and return it
+        return board.san(move)
+
+    async def analyse_async(self, limits=None, board=None):
+        """
+        Analyse a board without blocking the event loop
+        Several boards can be analysed concurrently, up to the size of the engine pool
+
+        :param limits: time limit in seconds, dictionary or SearchLimits. Default is the evaluation limits
+        :param board: board to be analysed. Default is a copy of the current board
+        :return: dictionary with keys 'score', 'best_move', 'pv', 'depth', 'nodes' and 'time'
+        """
+
+        # copy the board, so it may change while the engine is searching
+        board = (board or self.board).copy()
+
+        limits = self.limits["evaluation"] if limits is None else SearchLimits.of(limits)
+
+        cached = self.cached(board, limits)
+        if cached is not None:
+            return cached
+
+        # remember the search for the blocking methods
+        return self.remember(board, await self._search_async(board, limits), limits.completed_time())
 
     def piece_at_index(self, index):
         """
@@ -604,9 +1143,11 @@ class Stockfish:
 
     def remove_piece_at(self, poz):
         self.board.remove_piece_at(poz)
+        self._edited()
 
     def add_piece_at(self, piece, poz):
         self.board.set_piece_at(poz, piece)
+        self._edited()
 
     def make_reverse_san_move(self, move):
         """
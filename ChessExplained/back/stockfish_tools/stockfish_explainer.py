@@ -1,8 +1,21 @@
+import asyncio
+import contextvars
+import logging
+
+import chess
+
+from back.detectors import MoveContext
 from back.detectors import OpeningsDetector
 from back.detectors import TechniquesDetector
+from back.detectors.detector_registry import CHEAP
+from back.stockfish_tools.evaluation import Evaluation
 from back.stockfish_tools.explanation_builder import ExplanationBuilder
+from back.stockfish_tools.game_annotator import GameAnnotator
 from back.OpenAI import OpenAI
-from back.utils import BoardUtils
+from back.utils.metrics import MetricsRegistry
+from back.utils.timing import Timing
+
+logger = logging.getLogger(__name__)
 
 
 class StockfishExplainer:
@@ -10,14 +23,27 @@ class StockfishExplainer:
     Class used to provide explanations for moves suggested by Stockfish
     """
 
-    def __init__(self, stockfish):
+    # version of the explanation text, remembered explanations of other versions are not used
+    VERSION = 2
+
+    latency = MetricsRegistry.default.histogram("explain_seconds", "Duration of the explanations of the best move",
+                                                ("mode",))
+
+    def __init__(self, stockfish, openai=None, reword_deadline=10.0):
         """
         Constructor for StockfishExplainer class
 
         :param stockfish: Instance of Stockfish class
+        :param openai: Instance of OpenAI class rewording the explanations, e.g. OpenAI.from_environment(). Default
+                       is the shared instance without an api key, the explanations are not reworded
+        :param reword_deadline: time in seconds to wait for a rewording before keeping the explanation as it is
         """
 
         self.stockfish = stockfish
+        self.openai = OpenAI.shared() if openai is None else openai
+        self.reword_deadline = reword_deadline
+        # timing of the latest explanation
+        self.last_report = None
         self.openings_detector = OpeningsDetector(stockfish)
         self.techniques_detector = TechniquesDetector(stockfish)
         self.piece_value = {
@@ -29,49 +55,240 @@ class StockfishExplainer:
             'P': 1,
         }
 
-    def explain(self):
+    def explain(self, best_move=None, board=None):
         """
         Explain the next best move
+        A move of the opening book is explained without the engine
+
+        :param best_move: best move in SAN notation, if it was already found. Default is searching for it
+        :param board: board to be explained. Default is the current board
+        :return: tuple (copy of the explained board, Explanation as a string)
+        """
+        # every step works on the same copy, so the board of the Stockfish instance may change meanwhile
+        board = (self.stockfish.board if board is None else board).copy()
+        if board.outcome():
+            return board, "The game is already over!"
+
+        with Timing.report("explain", self.latency.labels("sync")) as self.last_report:
+            # Get the best move, from the book while the game is in it
+            book_entry = self._book_entry(board, best_move)
+            if best_move is None:
+                best_move = book_entry["move"] if book_entry is not None else self.stockfish.best_move(board=board)
+            # the same move of the same position with the same engine settings is explained the same way
+            settings = self._cache_settings(book_entry is not None)
+            cached = self.stockfish.explanations.get(board, best_move, settings)
+            if cached is not None:
+                Timing.count("explanation.cache_hit")
+                return board, cached
+
+            if book_entry is not None:
+                template = self._explain_book_move(book_entry, board)
+            else:
+                template = self._explain_move(best_move, board)
+            explanation = self.openai.reword(template, self.reword_deadline)
+
+            logger.debug("Explanation of %s: %s", best_move, explanation)
+            self._remember(board, best_move, settings, template, explanation)
+            return board, explanation
+
+    def _explain_move(self, best_move, board):
+        """
+        Build the explanation of the best move, before it is reworded
 
+        :param best_move: best move in SAN notation
+        :param board: board before the move
         :return: Explanation as a string
         """
-        if self.stockfish.board.outcome():
-            return "The game is already over!"
+        explanation = f"The best move is {best_move}. "
+
+        techniques = self.techniques_detector.get_techniques(best_move, board=board)
+        explanation += self._build_explanation(best_move, techniques, board=board)
+        return explanation
+
+    def _book_entry(self, board, best_move=None):
+        """
+        Get the book entry of the best move of a board
+
+        :param board: board before the move
+        :param best_move: best move in SAN notation, if it was already found. Default is the main book move
+        :return: dictionary with keys 'move', 'weight' and 'share', None if the move is not a book move
+        """
+        if best_move is None:
+            return self.stockfish.book_entry(board)
+        if self.stockfish.book is None:
+            return None
 
-        # Get the best move
-        best_move = self.stockfish.best_move()
+        for entry in self.stockfish.book.entries(board):
+            if entry["move"] == best_move:
+                return entry
+        return None
+
+    def _explain_book_move(self, book_entry, board):
+        """
+        Build the explanation of a book move, before it is reworded
+        Only the detectors inspecting the board run, the position is neither searched nor evaluated
+
+        :param book_entry: book entry of the move, as returned by Stockfish.book_entry
+        :param board: board before the move
+        :return: Explanation as a string
+        """
+        best_move = book_entry["move"]
         explanation = f"The best move is {best_move}. "
 
-        # Make the move
-        self.stockfish.move(best_move)
-
-        # Print the board
-        print("Board after move: ")
-        self.stockfish.display()
-
-        # Undo the move
-        self.stockfish.undo()
-
-        # Get the opening and the techniques
-        opening = self.openings_detector.get_opening(best_move)
-        techniques = self.techniques_detector.get_techniques(best_move)
-
-        print("is_pin: ", techniques['pin']['enable'])
-        print("is_fork: ", techniques['fork']['enable'])
-        print("is_checkmate: ", techniques['checkmate']['enable'])
-        print("is_check: ", techniques['check']['enable'])
-        print("is_check_forced: ", techniques['check_forced']['enable'])
-        print("is_capture: ", techniques['capture']['enable'])
-        print("is_en_passant: ", techniques['en_passant']['enable'])
-        print("is_stalemate: ", techniques['stalemate']['enable'])
-        print("is_insufficient_material: ", techniques['insufficient_material']['enable'])
-        print("is_battery: ", techniques['battery']['enable'])
-        print("is_sacrifice: ", techniques['sacrifice']['enable'])
-        print("is_discovered_attack: ", techniques['discovered_attack']['enable'])
-        print("is_castling: ", techniques['castling']['enable'])
-        print("is_pawn_promotion: ", techniques['pawn_promotion']['enable'])
-        print("is_skewer: ", techniques['skewer']['enable'])
-        print("is_forced_checkmate: ", techniques['forced_checkmate']['enable'])
+        opening = self.openings_detector.get_opening(best_move, board)
+        if opening:
+            explanation += f"This move is a book move from the {opening}. "
+        else:
+            explanation += "This move is a book move. "
+        explanation += f"It is played in {round(book_entry['share'] * 100)}% of the book games from this position. "
+        explanation += self._statistics_explanation(best_move, board)
+
+        techniques = self.techniques_detector.get_techniques(best_move, max_tier=CHEAP, board=board)
+        explainer = ExplanationBuilder(techniques)
+        explanation += explainer.build_explanation()
+        return explanation
+
+    def _remember(self, board, best_move, settings, template, explanation):
+        """
+        Remember the explanation of the best move, unless its rewording failed and may succeed later
+
+        :param board: board before the move
+        :param best_move: best move in SAN notation
+        :param settings: settings the explanation depends on
+        :param template: explanation before rewording
+        :param explanation: reworded explanation
+        :return: None
+        """
+        if explanation != template or not self.openai.enabled:
+            self.stockfish.explanations.put(board, best_move, settings, explanation)
+
+    def explain_candidates(self, num_moves=None, reword=False, board=None):
+        """
+        Explain the best candidate moves, all found by a single engine search
+
+        :param num_moves: number of candidate moves. Default is the multipv of the engine profile
+        :param reword: True to reword the explanations, all of them with a single request
+        :param board: board to be explained. Default is the current board
+        :return: List of dictionaries with keys 'move' (SAN notation), 'evaluation' (Evaluation for the player to
+                 move), 'delta' (centipawns lost compared to the best move) and 'explanation', best move first
+        """
+        # every step works on the same copy, so the board of the Stockfish instance may change meanwhile
+        board = (self.stockfish.board if board is None else board).copy()
+        if board.outcome():
+            return []
+
+        candidates = self.stockfish.candidate_moves(num_moves, board=board)
+        if not candidates:
+            return []
+
+        # the board before the moves is analysed once for all the candidates
+        contexts = MoveContext.for_moves(board, [candidate["move"] for candidate in candidates])
+        best_score = candidates[0]["score"].score()
+
+        explanations = []
+        for candidate, context in zip(candidates, contexts):
+            techniques = self.techniques_detector.detect(context)
+            explanation = f"The move {candidate['move']} is ranked {len(explanations) + 1}. "
+            explanation += self._build_explanation(candidate["move"], techniques, candidate["score"], board)
+
+            explanations.append({"move": candidate["move"], "evaluation": candidate["score"],
+                                 "delta": best_score - candidate["score"].score(), "explanation": explanation})
+
+        if reword:
+            reworded = self.openai.reword_batch([entry["explanation"] for entry in explanations], self.reword_deadline)
+            for entry, explanation in zip(explanations, reworded):
+                entry["explanation"] = explanation
+
+        return explanations
+
+    def _cache_settings(self, book=False):
+        """
+        Get the settings an explanation depends on, besides the position and the move
+
+        :param book: True for the explanation of a book move, which depends on the book instead of the engine
+        :return: string describing the engine or the book, the profile and the explanation version
+        """
+        if book:
+            return f"book:{self.stockfish.book.path}|{self.stockfish.book.min_weight}|v{self.VERSION}"
+        return f"{self.stockfish.engine_settings}|{self.stockfish.profile.name}|v{self.VERSION}"
+
+    def explain_game(self, game, parallel=False, reword=True, pgn=None):
+        """
+        Explain every move of a game, rewording the explanations of up to max_batch moves with a single request
+
+        :param game: chess.pgn.Game, PGN text or moves in SAN notation separated by spaces
+        :param parallel: True to search the moves with all the pooled engines
+        :param reword: True to reword the explanations
+        :param pgn: True if the text is PGN, False if it is moves in SAN notation. Default is guessing it
+        :return: generator of the annotated moves of GameAnnotator.annotate, with the key 'explanation' added
+        """
+        annotator = GameAnnotator(self.stockfish)
+
+        batch = []
+        for record in annotator.annotate(game, parallel, pgn):
+            record["explanation"] = self._explain_record(record)
+            batch.append(record)
+
+            if len(batch) == self.openai.max_batch:
+                yield from self._reword_records(batch, reword)
+                batch = []
+
+        yield from self._reword_records(batch, reword)
+
+    def _explain_record(self, record):
+        """
+        Build the explanation of a move annotated by GameAnnotator
+
+        :param record: annotated move
+        :return: Explanation as a string
+        """
+        board = chess.Board(record["fen"])
+        explanation = f"{record['move']} was played. "
+        if record["best_move"] is not None and record["best_move"] != record["move"]:
+            explanation += f"The best move was {record['best_move']}. "
+
+        # the evaluation after the move, for the player making it
+        evaluation = record["evaluation"]
+        if evaluation is None:
+            evaluation = Evaluation(cp=0, pov=board.turn)
+        elif record["loss"] is not None:
+            evaluation = Evaluation(cp=evaluation.score() - record["loss"], pov=evaluation.pov)
+
+        return explanation + self._build_explanation(record["move"], record["techniques"], evaluation, board)
+
+    def _reword_records(self, records, reword):
+        """
+        Reword the explanations of annotated moves with a single request
+
+        :param records: annotated moves with their explanation
+        :param reword: True to reword the explanations
+        :return: List of the annotated moves
+        """
+        if reword and records:
+            reworded = self.openai.reword_batch([record["explanation"] for record in records], self.reword_deadline)
+            for record, explanation in zip(records, reworded):
+                record["explanation"] = explanation
+        return records
+
+    def _build_explanation(self, move_san, techniques, evaluation=None, board=None):
+        """
+        Describe the techniques, the opening and the winning probability of a move
+
+        :param move_san: move in SAN notation
+        :param techniques: techniques of the move, as returned by the techniques detector
+        :param evaluation: Evaluation of the board after the move, for the player making it. Default is searching
+                           the current board
+        :param board: board before the move. Default is the current board
+        :return: Explanation as a string
+        """
+        explanation = ""
+
+        # Get the opening
+        opening = self.openings_detector.get_opening(move_san, board)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Techniques of %s: %s", move_san,
+                         [name for name, technique in techniques.items() if technique['enable']])
 
         #  EXPLANATIONS
         """ 
@@ -95,50 +312,122 @@ class StockfishExplainer:
         if techniques['pawn_promotion']['enable']:
             explanation += f"Pawn promoted to {techniques['pawn_promotion']['piece']}. "
 
-        if techniques['forced_checkmate']['enable']:
+        # the engine detectors are only read when no cheap technique fired, so a move ending the game needs neither
+        # the forced checkmate search nor the evaluation of the board
+        explainer = ExplanationBuilder(techniques)
+        checkmate = techniques['checkmate']['enable']
+        draw = techniques['stalemate']['enable'] or techniques['insufficient_material']['enable']
+        forced_checkmate = explainer.consult_engine and techniques['forced_checkmate']['enable']
+
+        if forced_checkmate:
             explanation += f"{techniques['forced_checkmate']['piece']} move generated a safe way that follows to win. "
 
         if opening:
             explanation += f"This move is a book move from the {opening}. "
+        explanation += self._statistics_explanation(move_san, board)
 
-        print("---------------------------------------------------")
-        advantage_color, probability = self._calculate_winning_prob()
-        print("WAt")
-        # check checkmate, forced checkmate
-        if techniques['checkmate']['enable'] or techniques['forced_checkmate']['enable']:
-            probability = 1
-        elif techniques['stalemate']['enable'] or techniques['insufficient_material']['enable']:
-            probability = 0
+        if checkmate or forced_checkmate or draw:
+            # the player making the move wins, or nobody does
+            advantage_color = (self.stockfish.board if board is None else board).turn
+            if evaluation is not None:
+                advantage_color = evaluation.advantage()
+            probability = 0 if draw else 1
+        else:
+            advantage_color, probability = self._calculate_winning_prob(evaluation, board)
 
         advantage_color = "white" if advantage_color else "black"
         probability = round(probability, 2)
 
-        print("Player that has advantage: " + str(advantage_color))
-        print("Winning probability: " + str(probability * 100) + "%.")
+        logger.debug("Player that has advantage: %s, winning probability: %s%%", advantage_color, probability * 100)
 
-        print("HEEEEEEERE2")
-        explainer = ExplanationBuilder(techniques)
         explanation += explainer.build_explanation()
 
         explanation += f" The current player has a winning probability of {probability * 100}%"
         explanation += "The player that has advantage is " + advantage_color + ". "
-        print("HEEEEEEERE")
 
-        if not any(techniques.values()):
+        if not explainer.any_technique():
             explanation += "This move improves the position of the current player."
 
-        print("HEEEEEEERE")
-        # OpenAI
-        openai = OpenAI()
-        explanation = openai.reword(explanation)
+        return explanation
+
+    def _statistics_explanation(self, move_san, board=None):
+        """
+        Describe how often a move was played in the games database and how it scored
+
+        :param move_san: move in SAN notation
+        :param board: board before the move. Default is the current board
+        :return: Explanation as a string, empty without an opening tree or if the move was never played there
+        """
+        tree = self.openings_detector.opening_tree()
+        if tree is None:
+            return ""
+
+        statistics = tree.statistics(self.stockfish.board if board is None else board, move_san)
+        if statistics is None or statistics["score"] is None:
+            return ""
+        return (f"In the games database it was played {statistics['games']} times from this position, scoring "
+                f"{round(statistics['score'] * 100)}% for the player making it. ")
+
+    def popular_moves(self, limit=3, board=None):
+        """
+        Describe what is usually played from a board and how it scores, from the games database
+
+        :param limit: maximum number of moves described. Default is 3
+        :param board: board to be described. Default is the current board
+        :return: Explanation as a string, None without an opening tree or if the position is not in it
+        """
+        tree = self.openings_detector.opening_tree()
+        if tree is None:
+            return None
+        return tree.describe(self.stockfish.board if board is None else board, limit)
+
+    async def explain_async(self, board=None):
+        """
+        Explain the next best move without blocking the event loop
+        The engine search and the detectors run in worker threads with the engines of the blocking pool, the same
+        engines the pondering searches use, and the rewording waits at most reword_deadline seconds.
+
+        :param board: board to be explained, it is copied so it may change meanwhile. Default is the current board
+        :return: tuple (copy of the explained board, Explanation as a string)
+        """
+        board = (self.stockfish.board if board is None else board).copy()
+        if board.outcome():
+            return board, "The game is already over!"
+
+        with Timing.report("explain_async", self.latency.labels("async")) as self.last_report:
+            # the worker threads add their spans to the report of this request
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+
+            # a book move is known without searching
+            book_entry = self._book_entry(board)
+            if book_entry is not None:
+                best_move = book_entry["move"]
+            else:
+                best_move = await loop.run_in_executor(None, context.run, self.stockfish.best_move, None, board)
+
+            settings = self._cache_settings(book_entry is not None)
+            cached = self.stockfish.explanations.get(board, best_move, settings)
+            if cached is not None:
+                Timing.count("explanation.cache_hit")
+                return board, cached
+
+            if book_entry is not None:
+                template = await loop.run_in_executor(None, context.run, self._explain_book_move, book_entry, board)
+            else:
+                template = await loop.run_in_executor(None, context.run, self._explain_move, best_move, board)
+
+            # past the deadline the explanation is shown as it is, a late rewording is kept for the next time
+            explanation = await self.openai.reword_async(template, self.reword_deadline)
 
-        print("EXPLANATION: ", explanation)
-        return self.stockfish.board, explanation
+            logger.debug("Explanation of %s: %s", best_move, explanation)
+            self._remember(board, best_move, settings, template, explanation)
+            return board, explanation
 
-    def _calculate_winning_prob(self):
-        eval_first_item = self.stockfish.first_item_evaluation()
-        score_cp = BoardUtils.get_evaluation_score(eval_first_item)
-        color = self.stockfish.get_color_eval_score(eval_first_item)
-        probability = self.stockfish.winning_probability(score_cp)
+    def _calculate_winning_prob(self, evaluation=None, board=None):
+        if evaluation is None:
+            evaluation = self.stockfish.evaluation(board=board)
+        color = evaluation.advantage()
+        probability = self.stockfish.winning_probability(evaluation.score())
 
         return color, probability
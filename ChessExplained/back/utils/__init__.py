@@ -1,6 +1,7 @@
 from .board_utils import BoardUtils
 from .chatterbot_util import Util
+from .metrics import Counter, Histogram, MetricsRegistry
+from .static_exchange import StaticExchange
+from .timing import Timing, TimingReport
 
-__all__ = ['BoardUtils', 'Util']
-
-
+__all__ = ['BoardUtils', 'Counter', 'Histogram', 'MetricsRegistry', 'StaticExchange', 'Timing', 'TimingReport', 'Util']
@@ -17,6 +17,61 @@ class BoardUtils:
             return True
         return False
 
+    @staticmethod
+    def is_sliding_piece(piece):
+        return piece is not None and piece.piece_type in (chess.BISHOP, chess.ROOK, chess.QUEEN)
+
+    @staticmethod
+    def moves_along(piece_type, square1, square2):
+        """
+        Check if a sliding piece moves along the line joining two squares
+
+        :param piece_type: type of the sliding piece
+        :param square1: first square
+        :param square2: second square
+        :return: True if the squares are on a line the piece moves along, False otherwise
+        """
+        if square1 == square2 or not chess.ray(square1, square2):
+            return False
+        if BoardUtils.is_same_rank(square1, square2) or BoardUtils.is_same_file(square1, square2):
+            return piece_type in (chess.ROOK, chess.QUEEN)
+        return piece_type in (chess.BISHOP, chess.QUEEN)
+
+    @staticmethod
+    def slides_to(piece_type, from_square, to_square, occupied):
+        """
+        Check if a sliding piece attacks a square, given the occupied squares
+
+        :param piece_type: type of the sliding piece
+        :param from_square: square of the piece
+        :param to_square: attacked square
+        :param occupied: bitboard of the occupied squares
+        :return: True if the piece attacks the square, False otherwise
+        """
+        return BoardUtils.moves_along(piece_type, from_square, to_square) and not (
+                chess.between(from_square, to_square) & occupied)
+
+    @staticmethod
+    def x_ray_target(from_square, blocker_square, occupied):
+        """
+        Get the first occupied square behind a blocker, on the line from a sliding piece through the blocker
+
+        :param from_square: square of the sliding piece
+        :param blocker_square: square of the blocking piece
+        :param occupied: bitboard of the occupied squares
+        :return: square index, None if there is no piece behind the blocker
+        """
+        # squares on the far side of the blocker have it between them and the sliding piece
+        behind = 0
+        for square in chess.scan_forward(chess.ray(from_square, blocker_square) & occupied):
+            if chess.between(from_square, square) & chess.BB_SQUARES[blocker_square]:
+                behind |= chess.BB_SQUARES[square]
+
+        for square in chess.scan_forward(behind):
+            if not chess.between(blocker_square, square) & behind:
+                return square
+        return None
+
     @staticmethod
     def get_attackers_at_square(board, square):
         attackers = board.attackers(board.turn, square)
@@ -72,20 +127,6 @@ class BoardUtils:
             return 'King'
         raise Exception("Invalid Piece Type")
 
-    @staticmethod
-    def get_evaluation_score(eval_first_item):
-        """
-            Evaluate the current board
-
-            :return: evaluation score
-        """
-        if eval_first_item[0] == 'M':
-            return -100000 if eval_first_item[5] == '-' else 100000
-
-        eval_first_item = eval_first_item[eval_first_item.find('('):]
-        eval_first_item = eval_first_item.strip('()')
-        return int(eval_first_item)
-
     @staticmethod
     def is_valid_fen(fen_str):
         # Split the FEN string into its components
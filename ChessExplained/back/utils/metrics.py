@@ -0,0 +1,405 @@
+import bisect
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Counter:
+    """
+    Class used to count events, e.g. engine spawns or cache hits
+
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        """
+        Constructor for Counter class
+
+        :param name: name of the metric, e.g. 'engine_spawns_total'
+        :param documentation: description of the metric
+        :param label_names: names of the labels telling apart the values of the metric
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+        # label values -> count
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Get the counter of some label values, so it can be incremented without naming them again
+
+        :param values: values of the labels, in the order of the label names
+        :return: LabeledMetric instance
+        """
+
+        return LabeledMetric(self, tuple(str(value) for value in values))
+
+    def inc(self, amount=1, labels=()):
+        """
+        Increment the counter
+
+        :param amount: non negative amount added to the counter
+        :param labels: values of the labels
+        :return: None
+        """
+
+        if amount < 0:
+            raise ValueError("A counter can only be incremented")
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        """
+        Get the value of the counter
+
+        :param labels: values of the labels
+        :return: value of the counter
+        """
+
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def snapshot(self):
+        """
+        Get the values of the counter as plain values
+
+        :return: List of dictionaries with keys 'labels' and 'value'
+        """
+
+        with self._lock:
+            values = list(self._values.items())
+        return [{"labels": dict(zip(self.label_names, labels)), "value": value} for labels, value in values]
+
+    def samples(self):
+        """
+        Get the samples of the counter in the Prometheus text format
+
+        :return: generator of tuples (sample name, labels dictionary, value)
+        """
+
+        for entry in self.snapshot():
+            yield self.name, entry["labels"], entry["value"]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """
+    Class used to count observations, e.g. durations, into buckets and estimate their quantiles
+
+    """
+
+    kind = "histogram"
+
+    # upper bounds in seconds, from a fast detector to a long engine search
+    DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                       1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name, documentation, label_names=(), buckets=None):
+        """
+        Constructor for Histogram class
+
+        :param name: name of the metric, e.g. 'engine_search_seconds'
+        :param documentation: description of the metric
+        :param label_names: names of the labels telling apart the values of the metric
+        :param buckets: increasing upper bounds of the buckets. Default is DEFAULT_BUCKETS
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+
+        # label values -> [count of each bucket and of +Inf, sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Get the histogram of some label values, so it can be observed without naming them again
+
+        :param values: values of the labels, in the order of the label names
+        :return: LabeledMetric instance
+        """
+
+        return LabeledMetric(self, tuple(str(value) for value in values))
+
+    def observe(self, value, labels=()):
+        """
+        Add an observation
+
+        :param value: observed value
+        :param labels: values of the labels
+        :return: None
+        """
+
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, labels=()):
+        """
+        Observe the duration of a with block, in seconds
+
+        :param labels: values of the labels
+        :return: context manager
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+    def quantile(self, q, labels=()):
+        """
+        Estimate a quantile of the observations, interpolating inside the bucket holding it
+
+        :param q: quantile between 0 and 1, e.g. 0.99
+        :param labels: values of the labels
+        :return: estimated quantile, None without observations
+        """
+
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None or state[2] == 0:
+                return None
+            counts, total = list(state[0]), state[2]
+
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                # observations above the last bound are reported at the last bound
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        """
+        Get the values of the histogram as plain values
+
+        :return: List of dictionaries with keys 'labels', 'count', 'sum', 'buckets' (upper bound -> cumulative count),
+                 'p50', 'p90' and 'p99'
+        """
+
+        with self._lock:
+            values = [(labels, list(state[0]), state[1], state[2]) for labels, state in self._values.items()]
+
+        snapshot = []
+        for labels, counts, total, count in values:
+            cumulative, buckets = 0, {}
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                buckets["+Inf" if bound == math.inf else repr(bound)] = cumulative
+
+            snapshot.append({"labels": dict(zip(self.label_names, labels)), "count": count, "sum": total,
+                             "buckets": buckets, "p50": self.quantile(0.5, labels), "p90": self.quantile(0.9, labels),
+                             "p99": self.quantile(0.99, labels)})
+        return snapshot
+
+    def samples(self):
+        """
+        Get the samples of the histogram in the Prometheus text format
+
+        :return: generator of tuples (sample name, labels dictionary, value)
+        """
+
+        for entry in self.snapshot():
+            for bound, count in entry["buckets"].items():
+                yield self.name + "_bucket", dict(entry["labels"], le=bound), count
+            yield self.name + "_sum", entry["labels"], entry["sum"]
+            yield self.name + "_count", entry["labels"], entry["count"]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class LabeledMetric:
+    """
+    Class used to update a metric for fixed label values
+
+    """
+
+    __slots__ = ("metric", "label_values")
+
+    def __init__(self, metric, label_values):
+        """
+        Constructor for LabeledMetric class
+
+        :param metric: Counter or Histogram
+        :param label_values: values of the labels of the metric
+        """
+
+        if len(label_values) != len(metric.label_names):
+            raise ValueError(f"{metric.name} expects the labels {metric.label_names}")
+        self.metric = metric
+        self.label_values = label_values
+
+    def inc(self, amount=1):
+        self.metric.inc(amount, self.label_values)
+
+    def observe(self, value):
+        self.metric.observe(value, self.label_values)
+
+    def time(self):
+        return self.metric.time(self.label_values)
+
+    def value(self):
+        return self.metric.value(self.label_values)
+
+    def quantile(self, q):
+        return self.metric.quantile(q, self.label_values)
+
+
+class MetricsRegistry:
+    """
+    Class used to keep the metrics of the application and export them
+    MetricsRegistry.default is shared by the engine, the detectors and the explainer
+
+    """
+
+    default = None
+
+    def __init__(self, prefix="chess_explained_"):
+        """
+        Constructor for MetricsRegistry class
+
+        :param prefix: prefix of the names of the exported metrics
+        """
+
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, label_names, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(label_names):
+                raise ValueError(f"Metric {name} is already registered with another type or labels")
+            return metric
+
+    def counter(self, name, documentation, label_names=()):
+        """
+        Get a counter, registering it the first time
+
+        :param name: name of the metric
+        :param documentation: description of the metric
+        :param label_names: names of the labels of the metric
+        :return: Counter instance
+        """
+
+        return self._register(Counter, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=None):
+        """
+        Get a histogram, registering it the first time
+
+        :param name: name of the metric
+        :param documentation: description of the metric
+        :param label_names: names of the labels of the metric
+        :param buckets: increasing upper bounds of the buckets. Default is Histogram.DEFAULT_BUCKETS
+        :return: Histogram instance
+        """
+
+        return self._register(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def get(self, name):
+        """
+        Get a registered metric
+
+        :param name: name of the metric
+        :return: Counter or Histogram, None if no metric has the name
+        """
+
+        with self._lock:
+            return self._metrics.get(name)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def to_prometheus(self):
+        """
+        Export the metrics in the Prometheus text exposition format
+
+        :return: text snapshot of the metrics
+        """
+
+        lines = []
+        for metric in self.metrics():
+            name = self.prefix + metric.name
+            lines.append(f"# HELP {name} {self._escape(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+
+            for sample, labels, value in metric.samples():
+                labels = ",".join(f'{label}="{self._escape(label_value)}"' for label, label_value in labels.items())
+                lines.append(f"{self.prefix}{sample}{{{labels}}} {value}" if labels else
+                             f"{self.prefix}{sample} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """
+        Export the metrics as plain values
+
+        :return: dictionary with key 'time' and a key for each metric, holding its type, description and values
+        """
+
+        snapshot = {"time": time.time()}
+        for metric in self.metrics():
+            snapshot[self.prefix + metric.name] = {"type": metric.kind, "help": metric.documentation,
+                                                   "values": metric.snapshot()}
+        return snapshot
+
+    def write(self, path):
+        """
+        Write a snapshot of the metrics to a file, as JSON if the path ends with '.json' and as Prometheus text otherwise
+
+        :param path: path of the file
+        :return: None
+        """
+
+        with open(path, "w") as file:
+            if path.lower().endswith(".json"):
+                json.dump(self.to_json(), file, indent=2)
+            else:
+                file.write(self.to_prometheus())
+
+    def reset(self):
+        """
+        Reset the values of every metric, the metrics stay registered
+
+        :return: None
+        """
+
+        for metric in self.metrics():
+            metric.reset()
+
+
+MetricsRegistry.default = MetricsRegistry()
@@ -0,0 +1,116 @@
+import chess
+
+
+class StaticExchange:
+    """
+    Class used to resolve the captures on a square without searching, to know if a move loses material
+    Pins and checks are not taken into account
+
+    """
+
+    # piece values in centipawns, the king can never be exchanged
+    PIECE_VALUES = {
+        chess.PAWN: 100,
+        chess.KNIGHT: 300,
+        chess.BISHOP: 300,
+        chess.ROOK: 500,
+        chess.QUEEN: 900,
+        chess.KING: 100000,
+    }
+
+    @staticmethod
+    def attackers(board, square, occupied):
+        """
+        Get the pieces of both players attacking a square, as if only the occupied squares held pieces
+
+        :param board: board holding the pieces
+        :param square: attacked square
+        :param occupied: bitboard of the squares still occupied
+        :return: bitboard of the attacking pieces
+        """
+
+        rooks_and_queens = board.rooks | board.queens
+        bishops_and_queens = board.bishops | board.queens
+
+        attackers = (chess.BB_KING_ATTACKS[square] & board.kings) | (chess.BB_KNIGHT_ATTACKS[square] & board.knights)
+        attackers |= chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] & rooks_and_queens
+        attackers |= chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied] & rooks_and_queens
+        attackers |= chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & bishops_and_queens
+
+        # a pawn attacks the square that a pawn of the other color on the square would attack
+        attackers |= chess.BB_PAWN_ATTACKS[chess.WHITE][square] & board.pawns & board.occupied_co[chess.BLACK]
+        attackers |= chess.BB_PAWN_ATTACKS[chess.BLACK][square] & board.pawns & board.occupied_co[chess.WHITE]
+
+        return attackers & occupied
+
+    @classmethod
+    def _least_valuable(cls, board, attackers, color):
+        """
+        Get the least valuable piece of a player among some attackers
+
+        :param board: board holding the pieces
+        :param attackers: bitboard of the attacking pieces
+        :param color: color of the player
+        :return: tuple of (square, piece type), (None, None) if the player has no attacker
+        """
+
+        for piece_type in cls.PIECE_VALUES:
+            pieces = attackers & board.pieces_mask(piece_type, color)
+            if pieces:
+                return chess.lsb(pieces), piece_type
+        return None, None
+
+    @classmethod
+    def evaluate(cls, board, move):
+        """
+        Get the material won by a move once both players made all the profitable captures on its square
+        The move is made by the piece on its starting square, it does not need to be the player's turn
+
+        :param board: board before the move
+        :param move: move to be evaluated
+        :return: material won in centipawns, negative if the move loses material
+        """
+
+        from_square, to_square = move.from_square, move.to_square
+        piece_type = board.piece_type_at(from_square)
+        color = board.color_at(from_square)
+
+        if piece_type is None or board.is_castling(move):
+            return 0
+
+        occupied = board.occupied & ~chess.BB_SQUARES[from_square]
+
+        if board.is_en_passant(move):
+            captured_square = to_square + (-8 if color == chess.WHITE else 8)
+            occupied &= ~chess.BB_SQUARES[captured_square]
+            captured_value = cls.PIECE_VALUES[chess.PAWN]
+        else:
+            captured_type = board.piece_type_at(to_square)
+            captured_value = cls.PIECE_VALUES[captured_type] if captured_type else 0
+
+        # the value standing on the square, which the next capture wins
+        on_square = cls.PIECE_VALUES[move.promotion or piece_type]
+        gains = [captured_value + on_square - cls.PIECE_VALUES[piece_type]]
+
+        side = not color
+        while True:
+            attackers = cls.attackers(board, to_square, occupied)
+            square, attacker_type = cls._least_valuable(board, attackers, side)
+            if square is None:
+                break
+
+            # the king cannot capture on a defended square
+            if attacker_type == chess.KING and attackers & board.occupied_co[not side]:
+                break
+
+            gains.append(on_square - gains[-1])
+            on_square = cls.PIECE_VALUES[attacker_type]
+            occupied &= ~chess.BB_SQUARES[square]
+            side = not side
+
+        # each player may stop capturing when going on would lose material
+        while len(gains) > 1:
+            last = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
+
+        return gains[0]
@@ -0,0 +1,223 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class TimingReport:
+    """
+    Class used to add up the durations and counts of the spans of one request
+
+    """
+
+    def __init__(self, name):
+        """
+        Constructor for TimingReport class
+
+        :param name: name of the request
+        """
+
+        self.name = name
+        self.elapsed = None
+        self.started = time.perf_counter()
+
+        # span name -> [count, total seconds, longest seconds]
+        self.spans = {}
+        # event name -> count, for events without a duration
+        self.events = {}
+        self._lock = threading.Lock()
+
+    def add(self, span, seconds=None):
+        """
+        Add a span to the report
+
+        :param span: name of the span
+        :param seconds: duration of the span, None for an event without a duration
+        :return: None
+        """
+
+        with self._lock:
+            if seconds is None:
+                self.events[span] = self.events.get(span, 0) + 1
+                return
+
+            totals = self.spans.get(span)
+            if totals is None:
+                totals = self.spans[span] = [0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+
+    def finish(self):
+        """
+        Stop the clock of the request
+
+        :return: duration of the request in seconds
+        """
+
+        self.elapsed = time.perf_counter() - self.started
+        return self.elapsed
+
+    def count(self, span):
+        """
+        Get the number of times a span or an event happened
+
+        :param span: name of the span or of the event
+        :return: number of spans or events
+        """
+
+        with self._lock:
+            return self.spans[span][0] if span in self.spans else self.events.get(span, 0)
+
+    def total(self, span):
+        """
+        Get the time spent in a span
+
+        :param span: name of the span
+        :return: total duration in seconds
+        """
+
+        with self._lock:
+            return self.spans[span][1] if span in self.spans else 0.0
+
+    def as_dict(self):
+        """
+        Get the report as plain values, e.g. for a JSON log record
+
+        :return: dictionary with keys 'name', 'elapsed_ms', 'spans' (span name -> dictionary with keys 'count',
+                 'total_ms' and 'max_ms') and 'events' (event name -> count)
+        """
+
+        with self._lock:
+            spans = {span: {"count": count, "total_ms": round(total * 1000, 3), "max_ms": round(longest * 1000, 3)}
+                     for span, (count, total, longest) in self.spans.items()}
+            events = dict(self.events)
+
+        elapsed = None if self.elapsed is None else round(self.elapsed * 1000, 3)
+        return {"name": self.name, "elapsed_ms": elapsed, "spans": spans, "events": events}
+
+    def __str__(self):
+        report = self.as_dict()
+        # the slowest spans first
+        spans = sorted(report["spans"].items(), key=lambda item: -item[1]["total_ms"])
+        details = [f"{span} {values['count']}x {values['total_ms']:.2f} ms" for span, values in spans]
+        details += [f"{event} {count}x" for event, count in report["events"].items()]
+        return f"{self.name} {report['elapsed_ms']} ms: {', '.join(details)}"
+
+
+class Timing:
+    """
+    Class used to time named spans of work and log them
+    Spans are added to the report of the request running in the current context, if any
+
+    with Timing.report("explain") as report:
+        with Timing.span("engine.search"):
+            search()
+    print(report)
+
+    """
+
+    # level of the log record of each span and of each report
+    span_level = logging.DEBUG
+    report_level = logging.INFO
+
+    _current = contextvars.ContextVar("timing_report", default=None)
+
+    @classmethod
+    def configure(cls, span_level=None, report_level=None):
+        """
+        Change the levels the spans and the reports are logged at
+
+        :param span_level: logging level of the spans
+        :param report_level: logging level of the reports
+        :return: None
+        """
+
+        if span_level is not None:
+            cls.span_level = span_level
+        if report_level is not None:
+            cls.report_level = report_level
+
+    @classmethod
+    def current(cls):
+        """
+        Get the report of the request running in the current context
+
+        :return: TimingReport instance, None outside of a request
+        """
+
+        return cls._current.get()
+
+    @classmethod
+    @contextmanager
+    def span(cls, name, metric=None):
+        """
+        Time a span of work
+
+        :param name: name of the span, e.g. 'engine.search'
+        :param metric: histogram observing the duration in seconds, e.g. a labeled metric of MetricsRegistry
+        :return: context manager
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if metric is not None:
+                metric.observe(seconds)
+
+            report = cls._current.get()
+            if report is not None:
+                report.add(name, seconds)
+
+            if logger.isEnabledFor(cls.span_level):
+                logger.log(cls.span_level, "%s took %.3f ms", name, seconds * 1000,
+                           extra={"span": name, "duration_ms": seconds * 1000})
+
+    @classmethod
+    def count(cls, name):
+        """
+        Count an event without a duration, e.g. a cache hit
+
+        :param name: name of the event
+        :return: None
+        """
+
+        report = cls._current.get()
+        if report is not None:
+            report.add(name)
+
+    @classmethod
+    @contextmanager
+    def report(cls, name, metric=None):
+        """
+        Collect the spans of a request into a report, logged when the request ends
+        A request inside another request adds its spans to the outer report
+
+        :param name: name of the request
+        :param metric: histogram observing the duration of the request in seconds
+        :return: context manager giving the TimingReport
+        """
+
+        outer = cls._current.get()
+        if outer is not None:
+            with cls.span(name, metric):
+                yield outer
+            return
+
+        report = TimingReport(name)
+        token = cls._current.set(report)
+        try:
+            yield report
+        finally:
+            cls._current.reset(token)
+            report.finish()
+            if metric is not None:
+                metric.observe(report.elapsed)
+
+            if logger.isEnabledFor(cls.report_level):
+                logger.log(cls.report_level, "%s", report, extra={"timing": report.as_dict()})
@@ -1,3 +1,5 @@
+import asyncio
+
 import customtkinter
 
 from back.stockfish_tools import StockfishExplainer
@@ -8,6 +10,9 @@ import chess
 
 class Board(customtkinter.CTkFrame):
 
+    # maximum number of seconds the best move waits for the background search of the position
+    PONDER_TIMEOUT = 5.0
+
     def __init__(self, master, stockfish, **kwargs):
 
         super().__init__(master, **kwargs)
@@ -36,10 +41,11 @@ class Board(customtkinter.CTkFrame):
                 square.bind("<Button-1>", lambda event, f=file, r=rank: self.on_board_click(event, f, r))
             self.squares.append(squares_file)
 
-    def load_from_fen(self, fen):
+    def load_from_fen(self, fen, keep_history=False):
         """
         Load the board from a fen.
         :param fen:
+        :param keep_history: True if the fen continues the game on the board, so its moves are kept
         :return:
         """
         self.fen = fen
@@ -47,7 +53,7 @@ class Board(customtkinter.CTkFrame):
         self.clean_board()
 
         # Set up the board with the fen
-        self.stockfish.setup(fen)
+        self.stockfish.setup(fen, keep_history)
 
         for piece, square_rank, square_file in self.stockfish.get_occupied_squares():
             # Get the piece type and color
@@ -62,6 +68,9 @@ class Board(customtkinter.CTkFrame):
             square.place_piece(piece)
         self.print_board()
 
+        # start searching the new position before its best move is requested
+        self.stockfish.ponder()
+
     def initial_board(self):
         """
         Create the initial board.
@@ -117,7 +126,7 @@ class Board(customtkinter.CTkFrame):
                     self.stockfish.move(move)
                     fen = self.stockfish.get_fen()
                     self.stockfish.undo()
-                    self.load_from_fen(fen)
+                    self.load_from_fen(fen, keep_history=True)
                     break
 
                 # check for castling
@@ -129,7 +138,7 @@ class Board(customtkinter.CTkFrame):
                     self.stockfish.move("O-O")
                     fen = self.stockfish.get_fen()
                     self.stockfish.undo()
-                    self.load_from_fen(fen)
+                    self.load_from_fen(fen, keep_history=True)
                     break
 
                 if (
@@ -140,7 +149,7 @@ class Board(customtkinter.CTkFrame):
                     self.stockfish.move("O-O-O")
                     fen = self.stockfish.get_fen()
                     self.stockfish.undo()
-                    self.load_from_fen(fen)
+                    self.load_from_fen(fen, keep_history=True)
                     break
 
 
@@ -153,7 +162,29 @@ class Board(customtkinter.CTkFrame):
             starting_fen = chess.STARTING_FEN
             self.stockfish.setup(starting_fen)
         else:
-            self.stockfish.setup(fen)
+            self.stockfish.setup(fen, keep_history=True)
         board, explain = explainer.explain()
         # print(explain)
         return board, explain
+
+    def get_best_move_async(self, fen):
+        """
+        Get the best move of a position and its explanation without blocking the interface
+        The board is copied right away, on the calling thread, so later clicks do not change the explained position.
+
+        :param fen: fen of the position, None for the starting position
+        :return: coroutine returning a tuple (explained board, explanation), to be run on the event loop
+        """
+        board = self.stockfish.board.copy()
+        if board.fen() != (fen or chess.STARTING_FEN):
+            board = chess.Board(fen or chess.STARTING_FEN)
+        return self._explain_async(board)
+
+    async def _explain_async(self, board):
+        explainer = StockfishExplainer(self.stockfish)
+
+        # let the background search of the position finish, it fills the cache the explanation reads
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.stockfish.wait_for_ponder, board, self.PONDER_TIMEOUT)
+
+        return await explainer.explain_async(board)
@@ -11,7 +11,7 @@ class App(CTk):
     def __init__(self, engine_path, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.engine_path = engine_path
-        self.stockfish = Stockfish(engine_path=self.engine_path)
+        self.stockfish = Stockfish(engine_path=self.engine_path, store_path="./resources/analysis.sqlite3")
         self.title("Chess Explained")
         self.geometry("680x680")
         self.minsize(1080, 680)
@@ -51,6 +51,9 @@ class App(CTk):
 
         self.mainloop()
 
+        # stop the engine processes once the window is closed
+        self.stockfish.close()
+
     def dialog_event(self, event):
         if event == "show":
             self.dialog.grid(row=0, column=2,
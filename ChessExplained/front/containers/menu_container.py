@@ -1,8 +1,14 @@
+import asyncio
+import logging
+import threading
+
 import chess
 import customtkinter
 from front.popup_windows import PopupWindow
 from back.utils import BoardUtils
 
+logger = logging.getLogger(__name__)
+
 
 class MenuContainer(customtkinter.CTkFrame):
     def __init__(self, master, dialog_event, add_dialog, **kwargs):
@@ -21,6 +27,11 @@ class MenuContainer(customtkinter.CTkFrame):
         self.add_dialog = add_dialog
         self.dialog_is_displayed = False
 
+        # event loop running the engine searches, so the window stays responsive
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.pending_best_move = None
+
     def add_board(self, board):
         self.board = board
 
@@ -56,11 +67,33 @@ class MenuContainer(customtkinter.CTkFrame):
     def get_best_move(self):
         if not self.dialog_is_displayed:
             self.show_chat_window()
-        print("before")
-        print(self.board.fen)
-        _, explain = self.board.get_best_move(self.board.fen)
-        print(explain)
+
+        # ignore the button while an explanation is being computed
+        if self.pending_best_move is not None:
+            return
+
         self.add_dialog("What's the best move?", 1)
+        self.best_move_button.configure(state="disabled")
+        self.pending_best_move = asyncio.run_coroutine_threadsafe(self.board.get_best_move_async(self.board.fen),
+                                                                  self.loop)
+        self.after(100, self.show_best_move)
+
+    def show_best_move(self):
+        # poll until the explanation is ready
+        if not self.pending_best_move.done():
+            self.after(100, self.show_best_move)
+            return
+
+        try:
+            _, explain = self.pending_best_move.result()
+        except Exception as error:
+            logger.warning("Best move failed: %s", error)
+            explain = "Sorry, the best move could not be found."
+        finally:
+            # the button works again whatever happened to the explanation
+            self.pending_best_move = None
+            self.best_move_button.configure(state="normal")
+
         self.add_dialog(explain)
 
     def create_buttons(self):
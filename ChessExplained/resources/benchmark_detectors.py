@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+import time
+
+# the script runs from any directory, the back package is next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chess
+
+from back.detectors import MoveContext, TechniquesDetector
+from back.detectors.detector_registry import CHEAP
+from back.detectors.opening_tree import OpeningTree
+
+BACK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "back")
+
+
+def fixture_boards():
+    """
+    Get the boards of the test fixtures, one FEN per line, the lines that are notes are skipped
+
+    :return: generator of chess.Board
+    """
+
+    tests = os.path.join(BACK, "Tests")
+    for directory, _, files in sorted(os.walk(tests)):
+        for name in sorted(files):
+            with open(os.path.join(directory, name)) as file:
+                for line in file:
+                    try:
+                        yield chess.Board(line.strip())
+                    except ValueError:
+                        continue
+
+
+def game_boards(source, games):
+    """
+    Get every position of the first games of a games file
+
+    :param source: path to the games file
+    :param games: number of games
+    :return: generator of chess.Board, with the moves played before
+    """
+
+    for index, (moves, _) in enumerate(OpeningTree.read_games(source)):
+        if index == games:
+            return
+        board = chess.Board()
+        for move_san in moves:
+            yield board.copy()
+            try:
+                board.push_san(move_san)
+            except ValueError:
+                break
+
+
+def measure(boards, repeat):
+    """
+    Time the cheap detectors on every legal move of the boards, the fastest of several runs
+
+    :param boards: List of chess.Board
+    :param repeat: number of runs
+    :return: tuple (number of moves, seconds per move building the contexts, seconds per move detecting)
+    """
+
+    detector = TechniquesDetector(None)
+    moves = [(board, board.san(move)) for board in boards for move in board.legal_moves]
+
+    best_context = best_detect = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        contexts = [MoveContext(board, move_san) for board, move_san in moves]
+        built = time.perf_counter()
+        for context in contexts:
+            detector.detect(context, max_tier=CHEAP)
+        done = time.perf_counter()
+
+        best_context = min(best_context, built - start)
+        best_detect = min(best_detect, done - built)
+
+    return len(moves), best_context / len(moves), best_detect / len(moves)
+
+
+parser = argparse.ArgumentParser(description="Measure the cost per move of the cheap technique detectors")
+parser.add_argument("--games", type=int, default=40, help="number of games of the games file whose positions are used")
+parser.add_argument("--source", default=os.path.join(BACK, "datasets", "games.txt"), help="games file")
+parser.add_argument("--repeat", type=int, default=3, help="number of runs, the fastest one is reported")
+arguments = parser.parse_args()
+
+for label, boards in (("fixtures", list(fixture_boards())),
+                      (f"{arguments.games} games", list(game_boards(arguments.source, arguments.games)))):
+    count, context, detect = measure(boards, arguments.repeat)
+    print(f"{label}: {count} moves, context {context * 1e6:.0f} us/move, detectors {detect * 1e6:.0f} us/move, "
+          f"total {(context + detect) * 1e6:.0f} us/move")
@@ -0,0 +1,23 @@
+import argparse
+import logging
+import os
+import sys
+
+# the script runs from any directory, the back package is next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from back.detectors import OpeningsDetector, OpeningTree
+
+DATASETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "back", "datasets")
+
+parser = argparse.ArgumentParser(description="Build the opening tree of a games file")
+parser.add_argument("source", nargs="?", default=os.path.join(DATASETS, "games.txt"),
+                    help="games file, one game per line in SAN notation")
+parser.add_argument("--output", default=OpeningsDetector.TREE_PATH, help="SQLite file of the tree")
+parser.add_argument("--max-plies", type=int, default=OpeningTree.MAX_PLIES,
+                    help="number of half moves of each game added to the tree")
+parser.add_argument("--min-games", type=int, default=1, help="minimum number of games of a continuation")
+arguments = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO)
+OpeningTree.build(arguments.source, arguments.output, arguments.max_plies, arguments.min_games)